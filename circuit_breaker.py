@@ -0,0 +1,253 @@
+"""
+Circuit breakers and cached health checks for remote endpoints
+Lets callers fail fast while an SMTP/IMAP server or registrar API is down
+"""
+import time
+import logging
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple, Type
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an endpoint whose circuit is open"""
+    
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"{name} unavailable, retry in {retry_after:.0f}s")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Closed/open/half-open circuit breaker for one remote endpoint
+    After failure_threshold consecutive failures calls are refused for
+    reset_timeout seconds, then a single trial call decides whether to close
+    """
+    
+    def __init__(self, name: str, failure_threshold: int = 3, reset_timeout: float = 30.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.last_error: Optional[str] = None
+        self._trial_running = False
+    
+    def allow(self) -> bool:
+        """
+        Check whether a call may go ahead
+        In half-open state only one trial call is let through at a time
+        """
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN:
+                if self._clock() - self.opened_at < self.reset_timeout:
+                    return False
+                self.state = HALF_OPEN
+                self._trial_running = False
+            if self._trial_running:
+                return False
+            self._trial_running = True
+            return True
+    
+    def retry_after(self) -> float:
+        """Seconds until the next trial call is allowed"""
+        with self._lock:
+            if self.state != OPEN:
+                return 0.0
+            return max(0.0, self.reset_timeout - (self._clock() - self.opened_at))
+    
+    def record_success(self) -> None:
+        with self._lock:
+            if self.state != CLOSED:
+                logger.info(f"Circuit {self.name} closed")
+            self.state = CLOSED
+            self.failures = 0
+            self.last_error = None
+            self._trial_running = False
+    
+    def record_failure(self, error: Any = None) -> None:
+        with self._lock:
+            self.failures += 1
+            self.last_error = str(error) if error is not None else None
+            self._trial_running = False
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    logger.warning(f"Circuit {self.name} opened: {self.last_error}")
+                self.state = OPEN
+                self.opened_at = self._clock()
+    
+    def release(self) -> None:
+        """End a call that neither proved nor disproved the endpoint's health"""
+        with self._lock:
+            self._trial_running = False
+    
+    def call(self, func: Callable, *args,
+             failure_types: Tuple[Type[BaseException], ...] = (Exception,),
+             ignore_types: Tuple[Type[BaseException], ...] = (), **kwargs) -> Any:
+        """
+        Call func through the breaker
+        Exceptions of failure_types count against the endpoint unless they are
+        also ignore_types; anything else means the endpoint answered
+        """
+        if not self.allow():
+            raise CircuitOpenError(self.name, self.retry_after())
+        try:
+            result = func(*args, **kwargs)
+        except failure_types as e:
+            if isinstance(e, ignore_types):
+                self.release()
+            else:
+                self.record_failure(e)
+            raise
+        except BaseException:
+            self.release()
+            raise
+        self.record_success()
+        return result
+    
+    def get_status(self) -> Dict[str, Any]:
+        with self._lock:
+            state = self.state
+            failures = self.failures
+            last_error = self.last_error
+        return {
+            'state': state,
+            'failures': failures,
+            'last_error': last_error,
+            'retry_after': round(self.retry_after(), 1),
+        }
+
+
+class HealthMonitor:
+    """
+    Cached health state for registered endpoints
+    A background thread probes each endpoint every interval seconds, and
+    open circuits as soon as their reset timeout allows a trial
+    """
+    
+    def __init__(self, interval: float = 60.0, tick: float = 1.0):
+        self.interval = interval
+        self.tick = tick
+        self._endpoints: Dict[str, Dict[str, Any]] = {}
+        self._results: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+    
+    def register(self, name: str, probe: Callable[[], bool],
+                 breaker: Optional[CircuitBreaker] = None) -> None:
+        """Register an endpoint probe and start background probing"""
+        with self._lock:
+            self._endpoints[name] = {'probe': probe, 'breaker': breaker}
+            self._results.pop(name, None)
+        self.start()
+    
+    def unregister(self, name: str) -> None:
+        with self._lock:
+            self._endpoints.pop(name, None)
+            self._results.pop(name, None)
+    
+    def check(self, name: str) -> Optional[Dict[str, Any]]:
+        """Probe an endpoint now, feed the result to its breaker and cache it"""
+        with self._lock:
+            endpoint = self._endpoints.get(name)
+        if endpoint is None:
+            return None
+        
+        error = None
+        start = time.perf_counter()
+        try:
+            healthy = bool(endpoint['probe']())
+        except Exception as e:
+            healthy = False
+            error = str(e)
+        latency = time.perf_counter() - start
+        
+        breaker = endpoint['breaker']
+        if breaker:
+            if healthy:
+                breaker.record_success()
+            else:
+                breaker.record_failure(error or "probe failed")
+        
+        result = {
+            'healthy': healthy,
+            'error': error,
+            'latency_ms': round(latency * 1000, 1),
+            'checked_at': time.time(),
+            '_checked': time.monotonic(),
+        }
+        with self._lock:
+            if name in self._endpoints:
+                self._results[name] = result
+        return self._public(name, result)
+    
+    def get_health(self) -> Dict[str, Dict[str, Any]]:
+        """Last known health of every endpoint, without probing"""
+        with self._lock:
+            names = list(self._endpoints)
+            results = {name: self._results.get(name) for name in names}
+        return {name: self._public(name, result) for name, result in results.items()}
+    
+    def _public(self, name: str, result: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        status = {key: value for key, value in (result or {'healthy': None}).items()
+                  if not key.startswith('_')}
+        with self._lock:
+            endpoint = self._endpoints.get(name)
+        if endpoint and endpoint['breaker']:
+            status['circuit'] = endpoint['breaker'].get_status()
+        return status
+    
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True, name="health-monitor")
+        self._thread.start()
+    
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+    
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            for name in self._due():
+                if self._stop.is_set():
+                    break
+                self.check(name)
+            self._stop.wait(self.tick)
+    
+    def _due(self) -> List[str]:
+        """Endpoints whose cached result is stale"""
+        now = time.monotonic()
+        due = []
+        with self._lock:
+            for name, endpoint in self._endpoints.items():
+                result = self._results.get(name)
+                breaker = endpoint['breaker']
+                if result is None:
+                    due.append(name)
+                elif breaker and breaker.state == OPEN:
+                    if breaker.retry_after() <= 0:
+                        due.append(name)
+                elif now - result['_checked'] >= self.interval:
+                    due.append(name)
+        return due
+
+
+# Global health monitor
+health_monitor = HealthMonitor()
@@ -3,14 +3,77 @@ Domain management and API integration
 Supports automated domain purchasing for burner email rotation
 """
 import requests
+import time
+import uuid
 import random
 import string
 import logging
-from typing import Dict, List, Optional
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional
 from datetime import datetime, timedelta
 
+from circuit_breaker import CircuitBreaker, health_monitor
+from tor_pool import tor_pool
+
 logger = logging.getLogger(__name__)
 
+# Errors that mean the registrar is unreachable rather than refusing a request
+REGISTRAR_ERRORS = (requests.ConnectionError, requests.Timeout)
+CHEAP_TLDS = ["xyz", "club", "online", "site", "website"]
+SEARCH_WORKERS = 5  # Concurrent availability checks; stays under the session's pool size
+PRICING_TTL = 6 * 3600  # TLD pricing changes rarely
+TAKEN_TTL = 24 * 3600  # A registered name stays registered
+AVAILABLE_TTL = 300  # Anyone may register an available name at any time
+REPLENISH_INTERVAL = 300  # Seconds between reserve top-ups when nothing wakes the replenisher
+MAX_ROTATION_JOBS = 100  # Finished rotation jobs kept for status lookups
+
+
+class TTLCache:
+    """
+    Bounded LRU whose entries expire after a per-entry TTL
+    Used to avoid re-asking the registrar what it has already told us
+    """
+    
+    def __init__(self, max_entries: int = 1024, clock: Callable[[], float] = time.monotonic):
+        self.max_entries = max_entries
+        self._clock = clock
+        self._entries: OrderedDict = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0}
+    
+    def get(self, key: Any) -> Optional[Any]:
+        """Cached value, or None if missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > self._clock():
+                    self._entries.move_to_end(key)
+                    self.stats['hits'] += 1
+                    return entry[1]
+                del self._entries[key]
+            self.stats['misses'] += 1
+            return None
+    
+    def set(self, key: Any, value: Any, ttl: float) -> None:
+        with self._lock:
+            self._entries[key] = (self._clock() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {'entries': len(self._entries), **self.stats}
+
 
 class DomainAPIClient:
     """
@@ -45,9 +108,15 @@ class PorkbunAPIClient(DomainAPIClient):
     def __init__(self, api_key: str, api_secret: str):
         super().__init__(api_key, api_secret)
         self.session = requests.Session()
+        self.breaker = CircuitBreaker("registrar:porkbun")
+        self.pricing_cache = TTLCache(max_entries=1024)
+        self.availability_cache = TTLCache(max_entries=4096)
+        if tor_pool.enabled:
+            self.session.mount("https://", tor_pool.http_adapter('registrar'))
+            tor_pool.keep_warm('registrar', "porkbun.com", 443)
     
-    def _make_request(self, endpoint: str, data: Optional[Dict] = None) -> Dict:
-        """Make API request"""
+    def _post(self, endpoint: str, data: Optional[Dict] = None) -> Dict:
+        """POST to the API and decode the JSON reply"""
         url = f"{self.BASE_URL}/{endpoint}"
         
         payload = {
@@ -58,24 +127,42 @@ class PorkbunAPIClient(DomainAPIClient):
         if data:
             payload.update(data)
         
+        response = self.session.post(url, json=payload, timeout=30)
+        response.raise_for_status()
+        return response.json()
+    
+    def _make_request(self, endpoint: str, data: Optional[Dict] = None) -> Dict:
+        """Make API request; fails fast while the API is unreachable"""
         try:
-            response = self.session.post(url, json=payload, timeout=30)
-            response.raise_for_status()
-            return response.json()
+            return self.breaker.call(self._post, endpoint, data,
+                                     failure_types=REGISTRAR_ERRORS)
         except Exception as e:
             logger.error(f"Porkbun API request failed: {e}")
             return {"status": "ERROR", "message": str(e)}
     
+    def ping(self) -> bool:
+        """Check API reachability and credentials, bypassing the breaker"""
+        return self._post("ping").get("status") == "SUCCESS"
+    
     def search_domain(self, domain: str) -> Dict:
-        """Check if domain is available"""
+        """Check if domain is available; answers from the registrar are cached"""
+        key = domain.lower()
+        cached = self.availability_cache.get(key)
+        if cached is not None:
+            return dict(cached)
+        
         result = self._make_request("domain/check", {"domain": domain})
         
-        return {
+        info = {
             "domain": domain,
             "available": result.get("status") == "SUCCESS" and result.get("isAvailable", False),
             "price": result.get("price"),
             "currency": result.get("currency", "USD")
         }
+        # Errors are not answers, so only successful checks are remembered
+        if result.get("status") == "SUCCESS":
+            self.availability_cache.set(key, info, AVAILABLE_TTL if info["available"] else TAKEN_TTL)
+        return dict(info)
     
     def purchase_domain(self, domain: str, years: int = 1) -> Dict:
         """
@@ -87,6 +174,11 @@ class PorkbunAPIClient(DomainAPIClient):
             "years": years
         })
         
+        if result.get("status") == "SUCCESS":
+            self.availability_cache.set(domain.lower(), {
+                "domain": domain, "available": False, "price": None, "currency": "USD"
+            }, TAKEN_TTL)
+        
         return {
             "success": result.get("status") == "SUCCESS",
             "domain": domain,
@@ -96,19 +188,55 @@ class PorkbunAPIClient(DomainAPIClient):
     
     def get_pricing(self, tld: str = "com") -> Dict:
         """Get pricing for TLD"""
+        cached = self.pricing_cache.get(tld)
+        if cached is not None:
+            return dict(cached)
+        
         result = self._make_request("pricing/get", {"tld": tld})
         
         if result.get("status") == "SUCCESS":
             pricing = result.get("pricing", {})
-            return {
+            if isinstance(pricing.get(tld), dict):
+                # The registrar answered with every TLD; keep them all
+                self._cache_pricing(pricing)
+                return dict(self.pricing_cache.get(tld) or {})
+            return dict(self._cache_pricing({tld: pricing})[tld])
+        
+        return {}
+    
+    def seed_pricing(self) -> int:
+        """
+        Pre-fill the pricing cache from one bulk pricing call
+        
+        Returns:
+            Number of TLDs cached
+        """
+        result = self._make_request("pricing/get")
+        if result.get("status") != "SUCCESS":
+            return 0
+        pricing = {tld: entry for tld, entry in result.get("pricing", {}).items()
+                   if isinstance(entry, dict)}
+        self._cache_pricing(pricing)
+        return len(pricing)
+    
+    def _cache_pricing(self, pricing: Dict[str, Dict]) -> Dict[str, Dict]:
+        entries = {}
+        for tld, entry in pricing.items():
+            entries[tld] = {
                 "tld": tld,
-                "registration": pricing.get("registration"),
-                "renewal": pricing.get("renewal"),
-                "transfer": pricing.get("transfer"),
+                "registration": entry.get("registration"),
+                "renewal": entry.get("renewal"),
+                "transfer": entry.get("transfer"),
                 "currency": "USD"
             }
-        
-        return {}
+            self.pricing_cache.set(tld, entries[tld], PRICING_TTL)
+        return entries
+    
+    def get_cache_stats(self) -> Dict[str, Dict[str, int]]:
+        return {
+            "pricing": self.pricing_cache.get_stats(),
+            "availability": self.availability_cache.get_stats(),
+        }
     
     def list_domains(self) -> List[str]:
         """List owned domains"""
@@ -125,19 +253,65 @@ class DomainRotationManager:
     """
     Manage domain rotation for burner emails
     Automatically purchase cheap domains and rotate them
+    
+    With a reserve configured, a background thread keeps that many purchased
+    domains ready so a rotation is a swap instead of a search and purchase
+    
+    Rotations requested over HTTP run as jobs on a single background worker;
+    a request while one is pending joins it instead of starting another
     """
     
     def __init__(self, api_client: Optional[DomainAPIClient] = None, 
-                 monthly_budget: float = 50.0):
-        self.api_client = api_client
+                 monthly_budget: float = 50.0, search_workers: int = SEARCH_WORKERS,
+                 replenish_interval: float = REPLENISH_INTERVAL):
+        self.api_client = None
         self.monthly_budget = monthly_budget
         self.current_spending = 0.0
         self.owned_domains: List[Dict] = []
         self.active_domain: Optional[str] = None
+        # Threads are only started on the first search
+        self._search_pool = ThreadPoolExecutor(max_workers=search_workers,
+                                               thread_name_prefix="domain-search")
+        self.reserve: deque = deque()  # Purchased domains waiting to become active
+        self.reserve_size = 0
+        self.reserve_low_watermark = 0
+        self.replenish_interval = replenish_interval
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.rotation_jobs: OrderedDict = OrderedDict()  # job_id -> job record
+        self._pending_job: Optional[str] = None
+        self._rotation_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="domain-rotate")
+        if api_client:
+            self.set_api_client(api_client)
     
     def set_api_client(self, api_client: DomainAPIClient):
         """Set the domain API client"""
         self.api_client = api_client
+        # Registrar health is probed in the background once a client can be pinged
+        if isinstance(getattr(api_client, 'breaker', None), CircuitBreaker):
+            health_monitor.register("registrar", api_client.ping, api_client.breaker)
+        if self.reserve_size:
+            self.start_replenisher()
+    
+    def configure_reserve(self, size: int, low_watermark: Optional[int] = None) -> None:
+        """
+        Keep purchased domains ready for rotation
+        
+        Args:
+            size: Domains to hold in reserve (0 disables the reserve)
+            low_watermark: Top up once the reserve drops below this (default size)
+        """
+        with self._lock:
+            self.reserve_size = max(0, size)
+            self.reserve_low_watermark = min(self.reserve_size,
+                                             size if low_watermark is None else low_watermark)
+        if self.reserve_size and self.api_client:
+            self.start_replenisher()
+            self._wake.set()
+        elif not self.reserve_size:
+            self.stop_replenisher()
     
     def generate_random_domain(self, tld: str = "xyz", length: int = 8) -> str:
         """
@@ -152,37 +326,64 @@ class DomainRotationManager:
                                    max_attempts: int = 10) -> Optional[Dict]:
         """
         Find a cheap available domain
+        Candidates are checked concurrently; the first acceptable one wins
+        and checks that have not started yet are cancelled
         Returns domain info or None
         """
         if not self.api_client:
             logger.error("No API client configured")
             return None
         
-        # Try cheap TLDs
-        cheap_tlds = ["xyz", "club", "online", "site", "website"]
+        found = threading.Event()
         
-        for attempt in range(max_attempts):
-            tld = random.choice(cheap_tlds)
+        def check(tld: str) -> Optional[Dict]:
+            if found.is_set():
+                return None
             domain = self.generate_random_domain(tld)
-            
             result = self.api_client.search_domain(domain)
-            
-            if result.get("available"):
-                price = result.get("price", 999)
-                
-                if isinstance(price, str):
-                    # Remove currency symbols
-                    price = float(price.replace("$", "").replace("€", ""))
-                
-                if price <= max_price:
-                    return {
-                        "domain": domain,
-                        "price": price,
-                        "tld": tld
-                    }
+            if not result.get("available"):
+                return None
+            price = self._parse_price(result.get("price"))
+            if price is None or price > max_price:
+                return None
+            return {
+                "domain": domain,
+                "price": price,
+                "tld": tld
+            }
+        
+        # Try cheap TLDs
+        pending = {self._search_pool.submit(check, random.choice(CHEAP_TLDS))
+                   for _ in range(max_attempts)}
+        try:
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    try:
+                        domain_info = future.result()
+                    except Exception as e:
+                        logger.warning(f"Domain availability check failed: {e}")
+                        continue
+                    if domain_info:
+                        return domain_info
+        finally:
+            found.set()
+            for future in pending:
+                future.cancel()
         
         return None
     
+    @staticmethod
+    def _parse_price(price) -> Optional[float]:
+        """Registrar price as a float, or None if missing or malformed"""
+        if isinstance(price, str):
+            # Remove currency symbols
+            price = price.replace("$", "").replace("€", "")
+        try:
+            return float(price)
+        except (TypeError, ValueError):
+            return None
+    
     def purchase_domain_if_budget_allows(self, domain: str, price: float) -> bool:
         """
         Purchase domain if within budget
@@ -192,39 +393,132 @@ class DomainRotationManager:
             logger.error("No API client configured")
             return False
         
-        # Check budget
-        if self.current_spending + price > self.monthly_budget:
-            logger.warning(f"Budget exceeded. Current: ${self.current_spending}, "
-                          f"Requested: ${price}, Budget: ${self.monthly_budget}")
+        record = self._purchase(domain, price)
+        if record is None:
             return False
         
+        with self._lock:
+            # Set as active if no active domain
+            if not self.active_domain:
+                self.active_domain = domain
+        return True
+    
+    def _purchase(self, domain: str, price: float) -> Optional[Dict]:
+        """Buy a domain within budget and record it as owned"""
+        # Check budget; the price is held while the purchase is in flight
+        with self._lock:
+            if self.current_spending + price > self.monthly_budget:
+                logger.warning(f"Budget exceeded. Current: ${self.current_spending}, "
+                              f"Requested: ${price}, Budget: ${self.monthly_budget}")
+                return None
+            self.current_spending += price
+        
         # Attempt purchase
-        result = self.api_client.purchase_domain(domain, years=1)
+        try:
+            result = self.api_client.purchase_domain(domain, years=1)
+        except Exception:
+            result = {"success": False, "message": "purchase raised"}
+            logger.exception(f"Purchase of {domain} failed")
         
-        if result.get("success"):
-            self.current_spending += price
-            self.owned_domains.append({
+        with self._lock:
+            if not result.get("success"):
+                self.current_spending -= price
+                logger.error(f"Failed to purchase domain: {result.get('message')}")
+                return None
+            
+            record = {
                 "domain": domain,
                 "price": price,
                 "purchased_at": datetime.now(),
                 "expires_at": datetime.now() + timedelta(days=365)
-            })
+            }
+            self.owned_domains.append(record)
+        
+        logger.info(f"Successfully purchased domain: {domain} for ${price}")
+        return record
+    
+    def replenish_reserve(self) -> int:
+        """
+        Buy domains until the reserve is full or the budget runs out
+        
+        Returns:
+            Number of domains added to the reserve
+        """
+        added = 0
+        while not self._stop.is_set():
+            with self._lock:
+                if not self.api_client or len(self.reserve) >= self.reserve_size:
+                    break
             
-            # Set as active if no active domain
-            if not self.active_domain:
-                self.active_domain = domain
+            domain_info = self.find_cheap_available_domain()
+            if not domain_info:
+                logger.warning("Reserve top-up found no available cheap domain")
+                break
+            record = self._purchase(domain_info["domain"], domain_info["price"])
+            if record is None:
+                break
             
-            logger.info(f"Successfully purchased domain: {domain} for ${price}")
-            return True
-        else:
-            logger.error(f"Failed to purchase domain: {result.get('message')}")
-            return False
+            with self._lock:
+                self.reserve.append(record)
+            added += 1
+        return added
+    
+    def start_replenisher(self) -> None:
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run_replenisher, daemon=True,
+                                            name="domain-reserve")
+            self._thread.start()
+    
+    def stop_replenisher(self) -> None:
+        self._stop.set()
+        self._wake.set()
+        thread = self._thread
+        if thread and thread is not threading.current_thread():
+            thread.join(timeout=5)
+        self._thread = None
+    
+    def _run_replenisher(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.replenish_reserve()
+            except Exception:
+                logger.exception("Domain reserve top-up failed")
+            self._wake.wait(self.replenish_interval)
+            self._wake.clear()
+    
+    def _take_reserved(self) -> Optional[str]:
+        """Swap the oldest reserved domain in as active"""
+        with self._lock:
+            if not self.reserve:
+                return None
+            self.active_domain = self.reserve.popleft()["domain"]
+            low = len(self.reserve) < self.reserve_low_watermark
+        if low:
+            self._wake.set()
+        return self.active_domain
     
-    def rotate_domain(self) -> Optional[str]:
+    def rotate_domain(self, cancel: Optional[threading.Event] = None) -> Optional[str]:
         """
         Rotate to a new domain
-        Finds and purchases a new cheap domain
+        Uses a reserved domain when one is ready, otherwise finds and
+        purchases a new cheap domain
+        
+        Args:
+            cancel: Optional event; once set, the rotation stops before buying
         """
+        if cancel is not None and cancel.is_set():
+            return None
+        
+        domain = self._take_reserved()
+        if domain:
+            return domain
+        if self.reserve_size:
+            # The reserve ran dry; refill it while this rotation buys inline
+            self._wake.set()
+        
         # Find cheap domain
         domain_info = self.find_cheap_available_domain()
         
@@ -232,6 +526,10 @@ class DomainRotationManager:
             logger.error("Could not find available cheap domain")
             return None
         
+        if cancel is not None and cancel.is_set():
+            logger.info("Domain rotation cancelled before purchase")
+            return None
+        
         # Purchase domain
         success = self.purchase_domain_if_budget_allows(
             domain_info["domain"], 
@@ -239,11 +537,112 @@ class DomainRotationManager:
         )
         
         if success:
-            self.active_domain = domain_info["domain"]
-            return self.active_domain
+            with self._lock:
+                self.active_domain = domain_info["domain"]
+            return domain_info["domain"]
         
         return None
     
+    def submit_rotation(self) -> Dict:
+        """
+        Queue a rotation on the background worker
+        Returns the pending job instead if a rotation is already queued or running
+        
+        Returns:
+            Job status dict
+        """
+        with self._lock:
+            if self._pending_job is not None:
+                return self._job_status(self.rotation_jobs[self._pending_job])
+            
+            job_id = uuid.uuid4().hex
+            now = time.time()
+            job = self.rotation_jobs[job_id] = {
+                'id': job_id,
+                'status': 'queued',
+                'domain': None,
+                'error': None,
+                'created_at': now,
+                'updated_at': now,
+                '_cancel': threading.Event(),
+                '_future': None,
+            }
+            self._pending_job = job_id
+            self._prune_jobs()
+            job['_future'] = self._rotation_pool.submit(self._run_rotation, job_id)
+            return self._job_status(job)
+    
+    def get_rotation_status(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            job = self.rotation_jobs.get(job_id)
+            return self._job_status(job) if job else None
+    
+    def cancel_rotation(self, job_id: str) -> Optional[Dict]:
+        """
+        Cancel a pending rotation
+        A queued job never runs; a running one stops before purchasing
+        
+        Returns:
+            Job status dict, or None for an unknown job
+        """
+        with self._lock:
+            job = self.rotation_jobs.get(job_id)
+            if job is None:
+                return None
+            if job['status'] in ('queued', 'running'):
+                job['_cancel'].set()
+                if job['_future'].cancel():
+                    self._finish_job(job, 'cancelled')
+                else:
+                    job['status'] = 'cancelling'
+                    job['updated_at'] = time.time()
+            return self._job_status(job)
+    
+    def _run_rotation(self, job_id: str) -> None:
+        with self._lock:
+            job = self.rotation_jobs[job_id]
+            if job['status'] == 'queued':
+                job['status'] = 'running'
+                job['updated_at'] = time.time()
+        
+        domain, error = None, None
+        try:
+            domain = self.rotate_domain(cancel=job['_cancel'])
+        except Exception as e:
+            logger.exception("Domain rotation job failed")
+            error = str(e)
+        
+        with self._lock:
+            job['domain'] = domain
+            if domain:
+                self._finish_job(job, 'done')
+            elif job['_cancel'].is_set():
+                self._finish_job(job, 'cancelled')
+            else:
+                job['error'] = error or "No affordable domain available"
+                self._finish_job(job, 'failed')
+    
+    def _finish_job(self, job: Dict, status: str) -> None:
+        """Mark a job finished; caller holds the lock"""
+        job['status'] = status
+        job['updated_at'] = time.time()
+        if self._pending_job == job['id']:
+            self._pending_job = None
+    
+    def _prune_jobs(self) -> None:
+        """Drop the oldest finished jobs beyond MAX_ROTATION_JOBS; caller holds the lock"""
+        excess = len(self.rotation_jobs) - MAX_ROTATION_JOBS
+        if excess <= 0:
+            return
+        finished = [job_id for job_id, job in self.rotation_jobs.items()
+                    if job['status'] in ('done', 'failed', 'cancelled')]
+        for job_id in finished[:excess]:
+            del self.rotation_jobs[job_id]
+    
+    @staticmethod
+    def _job_status(job: Dict) -> Dict:
+        return {key: value for key, value in job.items() if not key.startswith('_')}
+    
     def get_active_domain(self) -> Optional[str]:
         """Get currently active domain"""
         return self.active_domain
@@ -258,7 +657,8 @@ class DomainRotationManager:
             "monthly_budget": self.monthly_budget,
             "current_spending": self.current_spending,
             "remaining": self.monthly_budget - self.current_spending,
-            "domains_owned": len(self.owned_domains)
+            "domains_owned": len(self.owned_domains),
+            "domains_reserved": len(self.reserve)
         }
 
 
@@ -0,0 +1,167 @@
+"""
+Mailbox import/export for opsechat
+Streams inboxes in and out as mbox (mboxrd quoting) with constant memory
+"""
+import re
+import time
+import logging
+from email.parser import BytesFeedParser
+from email.policy import compat32
+from typing import BinaryIO, Callable, Dict, Iterator, List, Optional
+
+from email_system import EmailStorage, EmailValidator
+from email_transport import parse_email_message
+
+logger = logging.getLogger(__name__)
+
+FROM_LINE_PATTERN = re.compile(rb'^>*From ')
+ESCAPED_FROM_PATTERN = re.compile(rb'^>+From ')
+MAX_MESSAGE_SIZE = 25 * 1024 * 1024  # Messages larger than this are skipped on import
+PENDING_BODY_HEADER = "X-Opsechat-Body-Missing"  # Marks exports whose body never loaded
+
+# Describe the original MIME structure, which no longer matches the stored text body
+DROPPED_HEADERS = {'from', 'to', 'subject', 'date', 'content-type',
+                   'content-transfer-encoding', 'mime-version'}
+
+
+def format_mbox_message(email: Dict) -> bytes:
+    """Format one stored email as an mbox entry"""
+    timestamp = email.get('timestamp')
+    epoch = timestamp.timestamp() if timestamp else time.time()
+    
+    lines = [f"From MAILER-DAEMON {time.asctime(time.gmtime(epoch))}"]
+    lines.append(f"From: {EmailValidator.sanitize_header(email.get('from', ''))}")
+    lines.append(f"To: {EmailValidator.sanitize_header(email.get('to', ''))}")
+    lines.append(f"Subject: {EmailValidator.sanitize_header(email.get('subject', ''))}")
+    lines.append(f"Date: {time.strftime('%a, %d %b %Y %H:%M:%S +0000', time.gmtime(epoch))}")
+    
+    for key, value in (email.get('headers') or {}).items():
+        if key.lower() not in DROPPED_HEADERS:
+            lines.append(f"{EmailValidator.sanitize_header(key)}: "
+                         f"{EmailValidator.sanitize_header(str(value))}")
+    
+    if email.get('body_pending'):
+        lines.append(f"{PENDING_BODY_HEADER}: yes")
+    lines.append("MIME-Version: 1.0")
+    lines.append("Content-Type: text/plain; charset=utf-8")
+    lines.append("Content-Transfer-Encoding: 8bit")
+    lines.append("")
+    
+    head = '\n'.join(lines).encode('utf-8')
+    body = (email.get('body') or '').encode('utf-8')
+    body_lines = [
+        b'>' + line if FROM_LINE_PATTERN.match(line) else line
+        for line in body.split(b'\n')
+    ]
+    return head + b'\n' + b'\n'.join(body_lines) + b'\n\n'
+
+
+def export_mbox(storage: EmailStorage, user_id: str,
+                load_body: Optional[Callable[[Dict], Optional[str]]] = None) -> Iterator[bytes]:
+    """
+    Stream a user's inbox as mbox
+    Yields one message at a time so memory stays constant
+    
+    Args:
+        load_body: Fetches the body of a header-only synced email; bodies it
+            cannot load are exported with a PENDING_BODY_HEADER flag
+    """
+    for email in storage.get_emails(user_id):
+        if email.get('body_pending') and load_body is not None:
+            email = _load_pending_body(storage, user_id, email, load_body)
+        yield format_mbox_message(email)
+
+
+def _load_pending_body(storage: EmailStorage, user_id: str, email: Dict,
+                       load_body: Callable[[Dict], Optional[str]]) -> Dict:
+    try:
+        body = load_body(email)
+    except Exception as e:
+        logger.warning(f"Could not load body of email {email.get('id')} for export: {e}")
+        return email
+    if body is None:
+        return email
+    storage.set_body(user_id, email.get('id'), body)
+    return dict(email, body=body, body_pending=False)
+
+
+def iter_mbox_messages(stream: BinaryIO, max_message_size: int = MAX_MESSAGE_SIZE) -> Iterator:
+    """
+    Incrementally parse an mbox stream into email.message.Message objects
+    Lines are fed to the parser as they are read; oversized messages yield None
+    Reads are capped at max_message_size + 1 bytes, so input without newlines
+    never has to fit in memory
+    """
+    parser = None
+    size = 0
+    previous_blank = True
+    
+    while True:
+        line = stream.readline(max_message_size + 1)
+        if not line:
+            break
+        if previous_blank and line.startswith(b'From '):
+            if parser is not None:
+                yield _finish(parser, size, max_message_size)
+            parser = BytesFeedParser(policy=compat32)
+            size = 0
+            previous_blank = False
+            continue
+        
+        previous_blank = line in (b'\n', b'\r\n')
+        if parser is None:
+            continue
+        
+        size += len(line)
+        if size > max_message_size:
+            continue
+        
+        if ESCAPED_FROM_PATTERN.match(line):
+            line = line[1:]
+        parser.feed(line)
+    
+    if parser is not None:
+        yield _finish(parser, size, max_message_size)
+
+
+def _finish(parser: BytesFeedParser, size: int, max_message_size: int):
+    """Close the parser for one message, or drop it if it was oversized"""
+    message = parser.close()
+    if size > max_message_size:
+        logger.warning(f"Skipping mbox message of {size} bytes")
+        return None
+    return message
+
+
+def import_mbox(storage: EmailStorage, user_id: str, stream: BinaryIO,
+                batch_size: int = 100) -> Dict[str, int]:
+    """
+    Import an mbox stream into a user's inbox in batches
+    
+    Returns:
+        Dict with counts of imported and skipped (unparseable, oversized
+        or already present) messages
+    """
+    imported = 0
+    skipped = 0
+    batch: List[Dict] = []
+    
+    for message in iter_mbox_messages(stream):
+        email_dict = parse_email_message(message) if message is not None else None
+        if not email_dict:
+            skipped += 1
+            continue
+        
+        batch.append(email_dict)
+        if len(batch) >= batch_size:
+            added = storage.add_emails(user_id, batch)
+            imported += added
+            skipped += len(batch) - added
+            batch = []
+    
+    if batch:
+        added = storage.add_emails(user_id, batch)
+        imported += added
+        skipped += len(batch) - added
+    
+    return {"imported": imported, "skipped": skipped}
@@ -9,12 +9,17 @@ This module contains Flask routes for email functionality including:
 - Email configuration management
 """
 
-from flask import render_template, request, session, jsonify, redirect, url_for
-from email_system import email_storage, burner_manager, EmailComposer, EmailValidator
+import time
+from flask import render_template, request, session, jsonify, redirect, url_for, Response
+from email_system import (email_storage, burner_manager, EmailComposer, EmailValidator, MAX_BURNER_BATCH,
+                          DEFAULT_FOLDER, MAX_FOLDER_NAME)
+from email_mbox import export_mbox, import_mbox
 from email_security_tools import spoofing_tester, phishing_simulator
 from email_transport import transport_manager
 from domain_manager import domain_rotation_manager
 
+MAX_BULK_IDS = 1000
+
 
 def register_email_routes(app, id_generator, get_random_color):
     """Register all email-related routes with the Flask app"""
@@ -33,12 +38,14 @@ def register_email_routes(app, id_generator, get_random_color):
         email_storage.create_user_inbox(session["_id"])
         
         # Get emails
-        emails = email_storage.get_emails(session["_id"])
+        folder = request.args.get("folder", DEFAULT_FOLDER)[:MAX_FOLDER_NAME]
+        emails = email_storage.get_emails(session["_id"], folder=folder)
         
         return render_template("email_inbox.html",
                               hostname=app.config["hostname"],
                               path=app.config["path"],
                               emails=emails,
+                              folder=folder,
                               script_enabled=False)
 
     @app.route('/<string:url_addition>/email/yesscript', methods=["GET"])
@@ -52,14 +59,105 @@ def register_email_routes(app, id_generator, get_random_color):
             session["color"] = get_random_color()
         
         email_storage.create_user_inbox(session["_id"])
-        emails = email_storage.get_emails(session["_id"])
+        folder = request.args.get("folder", DEFAULT_FOLDER)[:MAX_FOLDER_NAME]
+        emails = email_storage.get_emails(session["_id"], folder=folder)
         
         return render_template("email_inbox.html",
                               hostname=app.config["hostname"],
                               path=app.config["path"],
                               emails=emails,
+                              folder=folder,
                               script_enabled=True)
 
+    @app.route('/<string:url_addition>/email/view/<string:email_id>', methods=["GET"])
+    def email_view(url_addition, email_id):
+        """View a single email, fetching its body from IMAP if not yet loaded"""
+        if url_addition != app.config["path"]:
+            return ('', 404)
+        
+        if "_id" not in session:
+            return ('Unauthorized', 401)
+        
+        email = email_storage.get_email(session["_id"], email_id)
+        if email is None:
+            return ('', 404)
+        
+        if email.get('body_pending'):
+            body = transport_manager.load_body(email)
+            if body is not None:
+                email_storage.set_body(session["_id"], email_id, body)
+        
+        return render_template("email_view.html",
+                              hostname=app.config["hostname"],
+                              path=app.config["path"],
+                              email=email)
+
+    @app.route('/<string:url_addition>/email/bulk', methods=["POST"])
+    def email_bulk_api(url_addition):
+        """Apply delete, mark-read, flag or move to many emails at once"""
+        if url_addition != app.config["path"]:
+            return ('', 404)
+        
+        if "_id" not in session:
+            return jsonify({"success": False, "error": "No session"}), 401
+        
+        data = request.get_json(silent=True) or {}
+        email_ids = data.get("ids")
+        if not isinstance(email_ids, list) or len(email_ids) > MAX_BULK_IDS:
+            return jsonify({"success": False, "error": f"ids must be a list of at most {MAX_BULK_IDS}"}), 400
+        
+        try:
+            results = email_storage.bulk_update(session["_id"], [str(i) for i in email_ids],
+                                                data.get("action", ""), data.get("folder"))
+        except ValueError as e:
+            return jsonify({"success": False, "error": str(e)}), 400
+        
+        return jsonify({
+            "success": True,
+            "results": results,
+            "applied": sum(results.values())
+        })
+
+    @app.route('/<string:url_addition>/email/export.mbox', methods=["GET"])
+    def email_export_mbox(url_addition):
+        """Stream the user's inbox as an mbox download"""
+        if url_addition != app.config["path"]:
+            return ('', 404)
+        
+        if "_id" not in session:
+            return ('Unauthorized', 401)
+        
+        return Response(export_mbox(email_storage, session["_id"], transport_manager.load_body),
+                        mimetype="application/mbox",
+                        headers={"Content-Disposition": "attachment; filename=inbox.mbox"})
+
+    @app.route('/<string:url_addition>/email/import', methods=["POST"])
+    def email_import_mbox(url_addition):
+        """Import an uploaded mbox file into the user's inbox"""
+        if url_addition != app.config["path"]:
+            return ('', 404)
+        
+        if "_id" not in session:
+            return jsonify({"success": False, "error": "No session"}), 401
+        
+        upload = request.files.get("mbox")
+        if upload is None:
+            return jsonify({"success": False, "error": "No mbox file uploaded"}), 400
+        
+        result = import_mbox(email_storage, session["_id"], upload.stream)
+        return jsonify({"success": True, **result})
+
+    @app.route('/<string:url_addition>/email/threads.json', methods=["GET"])
+    def email_threads_json(url_addition):
+        """JSON API for conversation threads"""
+        if url_addition != app.config["path"]:
+            return ('', 404)
+        
+        if "_id" not in session:
+            return jsonify({"error": "No session"}), 401
+        
+        return jsonify({"threads": email_storage.get_threads(session["_id"])})
+
     @app.route('/<string:url_addition>/email/burner', methods=["GET"])
     def email_burner(url_addition):
         """Burner email management page"""
@@ -112,6 +210,61 @@ def register_email_routes(app, id_generator, get_random_color):
             "stats": burner_manager.get_user_stats(session["_id"])
         })
 
+    @app.route('/<string:url_addition>/email/burner/compact.json', methods=["GET"])
+    def email_burner_compact_json(url_addition):
+        """Cheap burner listing for polling; clients compute countdowns from the epochs"""
+        if url_addition != app.config["path"]:
+            return ('', 404)
+        
+        if "_id" not in session:
+            return jsonify({"error": "No session"}), 401
+        
+        return jsonify({
+            "now": int(time.time()),
+            "burners": burner_manager.list_user_burners(session["_id"])
+        })
+
+    @app.route('/<string:url_addition>/email/burner/batch', methods=["POST"])
+    def email_burner_batch(url_addition):
+        """Generate several burners in one request"""
+        if url_addition != app.config["path"]:
+            return ('', 404)
+        
+        if "_id" not in session:
+            return jsonify({"success": False, "error": "No session"}), 401
+        
+        data = request.get_json(silent=True) or {}
+        entries = data.get("burners")
+        if entries is None:
+            # Shorthand: count addresses sharing one domain and lifetime
+            count = data.get("count", 1)
+            if not isinstance(count, int) or not 0 < count <= MAX_BURNER_BATCH:
+                return jsonify({"success": False, "error": f"count must be between 1 and {MAX_BURNER_BATCH}"}), 400
+            entries = [{"domain": data.get("domain"), "hours_valid": data.get("hours_valid", 24)}] * count
+        
+        if not isinstance(entries, list) or not entries or len(entries) > MAX_BURNER_BATCH:
+            return jsonify({"success": False, "error": f"burners must be a list of 1 to {MAX_BURNER_BATCH} entries"}), 400
+        
+        domains = burner_manager.burner_domains()
+        specs = []
+        for entry in entries:
+            if not isinstance(entry, dict):
+                return jsonify({"success": False, "error": "Each burner must be an object"}), 400
+            domain = entry.get("domain")
+            hours_valid = entry.get("hours_valid", 24)
+            if domain is not None and domain not in domains:
+                return jsonify({"success": False, "error": f"Unknown domain: {domain}"}), 400
+            if not isinstance(hours_valid, int):
+                return jsonify({"success": False, "error": "hours_valid must be an integer"}), 400
+            specs.append((domain, hours_valid))
+        
+        try:
+            burners = burner_manager.generate_burner_batch(session["_id"], specs)
+        except ValueError as e:
+            return jsonify({"success": False, "error": str(e)}), 400
+        
+        return jsonify({"success": True, "burners": burners})
+
     @app.route('/<string:url_addition>/email/config', methods=["GET", "POST"])
     def email_config(url_addition):
         """Email configuration page"""
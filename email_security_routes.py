@@ -3,7 +3,7 @@ from flask import Blueprint, render_template, jsonify, request, session
 from email_security_tools import spoofing_tester, phishing_simulator
 from email_transport import transport_manager
 from domain_manager import domain_rotation_manager
-from email_system import EmailComposer, email_storage
+from email_system import email_storage
 import logging
 
 def create_email_security_blueprint(id_generator, get_random_color):
@@ -151,20 +151,39 @@ def create_email_security_blueprint(id_generator, get_random_color):
         
         try:
             data = request.get_json()
-            composer = EmailComposer()
             
-            result = composer.send_email(
-                to_email=data.get("to"),
+            job_id = transport_manager.queue_email(
+                from_addr=data.get("from"),
+                to_addr=data.get("to"),
                 subject=data.get("subject"),
                 body=data.get("body"),
-                from_email=data.get("from")
+                owner=session["_id"]
             )
             
-            return jsonify(result)
+            if job_id is None:
+                return jsonify({"success": False, "error": "SMTP not configured"})
+            return jsonify({"success": True, "job_id": job_id, "status": "queued"})
         except Exception as e:
             logging.exception("Error in email_send_api")
             return jsonify({"success": False, "error": "Failed to send email"})
 
+    @email_security_bp.route('/<string:url_addition>/email/send/<string:job_id>', methods=["GET"])
+    def email_send_status(url_addition, job_id):
+        """API endpoint for queued send status"""
+        from flask import current_app as app
+        if url_addition != app.config["path"]:
+            return ('', 404)
+        
+        if "_id" not in session:
+            return jsonify({"success": False, "error": "No session"})
+        
+        status = transport_manager.get_send_status(job_id)
+        if status is None or status["owner"] != session["_id"]:
+            return jsonify({"success": False, "error": "Unknown job"}), 404
+        
+        status.pop("owner")
+        return jsonify({"success": True, "job": status})
+
     @email_security_bp.route('/<string:url_addition>/email/receive', methods=["POST"])
     def email_receive_api(url_addition):
         """API endpoint for receiving emails"""
@@ -176,18 +195,52 @@ def create_email_security_blueprint(id_generator, get_random_color):
             return jsonify({"success": False, "error": "No session"})
         
         try:
-            result = transport_manager.receive_emails()
+            results = transport_manager.sync_all(inbox=session["_id"])
+            emails = [email for account_emails in results.values() for email in account_emails]
             
-            # Store received emails
-            if result["success"] and result["emails"]:
-                for email_data in result["emails"]:
-                    email_storage.add_email(session["_id"], email_data)
+            # Store received emails; already stored Message-IDs are skipped
+            added = email_storage.add_emails(session["_id"], emails) if emails else 0
             
-            return jsonify(result)
+            return jsonify({"success": True, "fetched": len(emails), "added": added})
         except Exception as e:
             logging.exception("Error in email_receive_api")
             return jsonify({"success": False, "error": "Failed to receive emails"})
 
+    @email_security_bp.route('/<string:url_addition>/email/health', methods=["GET"])
+    def email_health_api(url_addition):
+        """API endpoint for cached SMTP/IMAP/registrar health"""
+        from flask import current_app as app
+        if url_addition != app.config["path"]:
+            return ('', 404)
+        
+        if "_id" not in session:
+            return jsonify({"success": False, "error": "No session"})
+        
+        return jsonify({"success": True, "endpoints": transport_manager.get_health()})
+
+    @email_security_bp.route('/<string:url_addition>/email/receive/push', methods=["POST"])
+    def email_receive_push_api(url_addition):
+        """API endpoint for starting/stopping IMAP IDLE push delivery"""
+        from flask import current_app as app
+        if url_addition != app.config["path"]:
+            return ('', 404)
+        
+        if "_id" not in session:
+            return jsonify({"success": False, "error": "No session"})
+        
+        data = request.get_json(silent=True) or {}
+        if data.get("action") == "stop":
+            transport_manager.stop_push()
+            return jsonify({"success": True, "running": False})
+        
+        user_id = session["_id"]
+        started = transport_manager.start_push(
+            lambda emails: email_storage.add_emails(user_id, emails), inbox=user_id
+        )
+        if not started:
+            return jsonify({"success": False, "error": "IMAP not configured"})
+        return jsonify({"success": True, "running": True})
+
     @email_security_bp.route('/<string:url_addition>/email/domain/rotate', methods=["POST"])
     def email_domain_rotate(url_addition):
         """API endpoint for domain rotation"""
@@ -199,10 +252,41 @@ def create_email_security_blueprint(id_generator, get_random_color):
             return jsonify({"success": False, "error": "No session"})
         
         try:
-            result = domain_rotation_manager.rotate_domain()
-            return jsonify(result)
+            # Runs in the background; poll the job for the new domain
+            job = domain_rotation_manager.submit_rotation()
+            return jsonify({"success": True, "job": job}), 202
         except Exception as e:
             logging.exception("Error in email_domain_rotate")
             return jsonify({"success": False, "error": "Failed to rotate domain"})
 
+    @email_security_bp.route('/<string:url_addition>/email/domain/rotate/<string:job_id>', methods=["GET"])
+    def email_domain_rotate_status(url_addition, job_id):
+        """API endpoint for domain rotation job status"""
+        from flask import current_app as app
+        if url_addition != app.config["path"]:
+            return ('', 404)
+        
+        if "_id" not in session:
+            return jsonify({"success": False, "error": "No session"})
+        
+        job = domain_rotation_manager.get_rotation_status(job_id)
+        if job is None:
+            return jsonify({"success": False, "error": "Unknown job"}), 404
+        return jsonify({"success": True, "job": job})
+
+    @email_security_bp.route('/<string:url_addition>/email/domain/rotate/<string:job_id>/cancel', methods=["POST"])
+    def email_domain_rotate_cancel(url_addition, job_id):
+        """API endpoint for cancelling a domain rotation job"""
+        from flask import current_app as app
+        if url_addition != app.config["path"]:
+            return ('', 404)
+        
+        if "_id" not in session:
+            return jsonify({"success": False, "error": "No session"})
+        
+        job = domain_rotation_manager.cancel_rotation(job_id)
+        if job is None:
+            return jsonify({"success": False, "error": "Unknown job"}), 404
+        return jsonify({"success": True, "job": job})
+
     return email_security_bp
\ No newline at end of file
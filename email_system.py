@@ -2,81 +2,626 @@
 Email system module for opsechat
 Provides encrypted email inbox functionality with PGP support
 """
+import base64
+import binascii
 import datetime
+import hmac
+import math
+import os
 import string
 import random
 import re
+import secrets
+import struct
+import threading
+import time
+import zlib
+from collections import OrderedDict, deque
 from hashlib import sha256
-from typing import Dict, List, Optional
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+class CompressedBody:
+    """Compressed email body as held in storage"""
+    
+    __slots__ = ('data', 'codec', 'raw_size')
+    
+    def __init__(self, data: bytes, codec: str, raw_size: int):
+        self.data = data
+        self.codec = codec
+        self.raw_size = raw_size
+
+
+class BodyCompressor:
+    """
+    Compress large email bodies held in memory
+    Keeps a small LRU of recently viewed decompressed bodies
+    """
+    
+    def __init__(self, threshold: int = 1024, cache_size: int = 32,
+                 codec: str = 'zlib', level: int = 6):
+        """
+        Args:
+            threshold: Bodies shorter than this (in bytes) are kept as str
+            cache_size: Number of decompressed bodies kept in the LRU
+            codec: 'zlib' or 'zstd' (falls back to zlib without zstandard)
+            level: Compression level passed to the codec
+        """
+        self.threshold = threshold
+        self.cache_size = cache_size
+        self.codec = 'zstd' if codec == 'zstd' and zstandard is not None else 'zlib'
+        self.level = level
+        self._cache: "OrderedDict[CompressedBody, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {
+            'compressed_bodies': 0,
+            'raw_bytes': 0,
+            'stored_bytes': 0,
+            'decompressions': 0,
+            'decompress_seconds': 0.0,
+            'max_decompress_seconds': 0.0,
+            'cache_hits': 0,
+            'cache_misses': 0,
+        }
+    
+    def pack(self, body: str) -> Union[str, CompressedBody]:
+        """Return body as stored: compressed if large enough to be worth it"""
+        if not isinstance(body, str):
+            return body
+        raw = body.encode('utf-8')
+        if len(raw) < self.threshold:
+            return body
+        
+        if self.codec == 'zstd':
+            data = zstandard.ZstdCompressor(level=self.level).compress(raw)
+        else:
+            data = zlib.compress(raw, self.level)
+        
+        # Not worth paying decompression on every view for a tiny saving
+        if len(data) > len(raw) * 0.9:
+            return body
+        
+        with self._lock:
+            self._stats['compressed_bodies'] += 1
+            self._stats['raw_bytes'] += len(raw)
+            self._stats['stored_bytes'] += len(data)
+        return CompressedBody(data, self.codec, len(raw))
+    
+    def unpack(self, value: Union[str, CompressedBody]) -> str:
+        """Return the plain body, decompressing through the LRU if needed"""
+        if not isinstance(value, CompressedBody):
+            return value
+        
+        with self._lock:
+            cached = self._cache.get(value)
+            if cached is not None:
+                self._cache.move_to_end(value)
+                self._stats['cache_hits'] += 1
+                return cached
+            self._stats['cache_misses'] += 1
+        
+        start = time.perf_counter()
+        if value.codec == 'zstd':
+            raw = zstandard.ZstdDecompressor().decompress(value.data)
+        else:
+            raw = zlib.decompress(value.data)
+        body = raw.decode('utf-8')
+        elapsed = time.perf_counter() - start
+        
+        with self._lock:
+            self._stats['decompressions'] += 1
+            self._stats['decompress_seconds'] += elapsed
+            self._stats['max_decompress_seconds'] = max(
+                self._stats['max_decompress_seconds'], elapsed)
+            self._cache[value] = body
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return body
+    
+    def discard(self, value: Union[str, CompressedBody]) -> None:
+        """Forget a body that is no longer stored"""
+        if not isinstance(value, CompressedBody):
+            return
+        with self._lock:
+            self._cache.pop(value, None)
+            self._stats['compressed_bodies'] -= 1
+            self._stats['raw_bytes'] -= value.raw_size
+            self._stats['stored_bytes'] -= len(value.data)
+    
+    def get_stats(self) -> Dict:
+        """Get compression ratio and access latency statistics"""
+        with self._lock:
+            stats = self._stats.copy()
+            stats['cached_bodies'] = len(self._cache)
+        stats['codec'] = self.codec
+        stats['compression_ratio'] = (
+            stats['raw_bytes'] / stats['stored_bytes'] if stats['stored_bytes'] else 1.0
+        )
+        stats['avg_decompress_ms'] = (
+            stats['decompress_seconds'] / stats['decompressions'] * 1000
+            if stats['decompressions'] else 0.0
+        )
+        lookups = stats['cache_hits'] + stats['cache_misses']
+        stats['cache_hit_rate'] = stats['cache_hits'] / lookups if lookups else 0.0
+        return stats
+
+
+class StoredEmail(dict):
+    """
+    Email dict as held by EmailStorage
+    Reading 'body' transparently decompresses a compressed body
+    """
+    
+    __slots__ = ('_compressor',)
+    
+    def __init__(self, email: Dict, compressor: BodyCompressor):
+        super().__init__(email)
+        self._compressor = compressor
+        if 'body' in email:
+            dict.__setitem__(self, 'body', compressor.pack(email['body']))
+    
+    def __getitem__(self, key):
+        value = dict.__getitem__(self, key)
+        if key == 'body':
+            return self._compressor.unpack(value)
+        return value
+    
+    def __setitem__(self, key, value):
+        if key == 'body':
+            self._compressor.discard(dict.get(self, 'body'))
+            value = self._compressor.pack(value)
+        dict.__setitem__(self, key, value)
+    
+    def get(self, key, default=None):
+        if key in self:
+            return self[key]
+        return default
+    
+    def items(self):
+        return [(key, self[key]) for key in self]
+    
+    def values(self):
+        return [self[key] for key in self]
+    
+    def copy(self) -> Dict:
+        """Plain dict copy with the body decompressed"""
+        return dict(self.items())
+    
+    def release(self) -> None:
+        """Drop the body from the compressor's cache and stats"""
+        self._compressor.discard(dict.get(self, 'body'))
+
+
+MESSAGE_ID_PATTERN = re.compile(r'<[^<>\s]+>')
+MAX_REFERENCES = 50  # Bounds thread depth added by a single crafted References header
+MAX_THREAD_DEPTH = 100  # Replies nested deeper are listed flat under the deepest shown message
+
+
+def get_header(email: Dict, name: str) -> str:
+    """Case-insensitive lookup of a header in an email's headers dict"""
+    headers = email.get('headers') or {}
+    value = headers.get(name)
+    if value is None:
+        lowered = name.lower()
+        for key, header_value in headers.items():
+            if key.lower() == lowered:
+                value = header_value
+                break
+    return str(value) if value is not None else ''
+
+
+class ThreadContainer:
+    """Node in the thread tree; email is None for messages only seen as references"""
+    
+    __slots__ = ('message_id', 'email', 'parent', 'children')
+    
+    def __init__(self, message_id: str):
+        self.message_id = message_id
+        self.email: Optional[Dict] = None
+        self.parent: Optional['ThreadContainer'] = None
+        self.children: List['ThreadContainer'] = []
+
+
+class ThreadIndex:
+    """
+    Incremental JWZ-style conversation threading for one inbox
+    Maintained at insert time from Message-ID / In-Reply-To / References
+    so that building a thread costs O(thread size)
+    """
+    
+    def __init__(self):
+        self.containers: Dict[str, ThreadContainer] = {}  # message_id -> container
+        self.by_email_id: Dict[str, ThreadContainer] = {}  # email id -> container
+        self.roots: Dict[ThreadContainer, None] = {}  # ordered by latest activity
+    
+    @staticmethod
+    def message_id_for(email: Dict) -> str:
+        """Message-ID of an email, or a local one if the header is missing"""
+        found = MESSAGE_ID_PATTERN.findall(get_header(email, 'Message-ID'))
+        if found:
+            return found[0]
+        return f"<{email.get('id')}@opsechat.local>"
+    
+    @staticmethod
+    def references_for(email: Dict) -> List[str]:
+        """Ancestor Message-IDs, oldest first, ending with the direct parent"""
+        references = MESSAGE_ID_PATTERN.findall(get_header(email, 'References'))
+        in_reply_to = MESSAGE_ID_PATTERN.findall(get_header(email, 'In-Reply-To'))
+        if in_reply_to and (not references or references[-1] != in_reply_to[0]):
+            references.append(in_reply_to[0])
+        return references[-MAX_REFERENCES:]
+    
+    def has_message(self, email: Dict) -> bool:
+        """Check whether an email with the same Message-ID is already indexed"""
+        container = self.containers.get(self.message_id_for(email))
+        return container is not None and container.email is not None
+    
+    def add(self, email: Dict) -> ThreadContainer:
+        """Index an email, linking it under its referenced ancestors"""
+        message_id = self.message_id_for(email)
+        container = self._container(message_id)
+        if container.email is not None and container.email is not email:
+            return self._add_duplicate(container, email)
+        container.email = email
+        self.by_email_id[email.get('id')] = container
+        
+        parent = None
+        for reference in self.references_for(email):
+            if reference == message_id:
+                break
+            ref_container = self._container(reference)
+            if (parent is not None and ref_container.parent is None
+                    and not self._is_ancestor(ref_container, parent)):
+                self._link(parent, ref_container)
+            parent = ref_container
+        
+        # The message's own References are authoritative for its parent
+        if parent is not None and not self._is_ancestor(container, parent):
+            if container.parent is not parent:
+                self._unlink(container)
+                self._link(parent, container)
+        
+        self._touch(self._root_of(container))
+        return container
+    
+    def _add_duplicate(self, original: ThreadContainer, email: Dict) -> ThreadContainer:
+        """
+        Index a second email reusing an indexed Message-ID
+        The first copy keeps the Message-ID; the duplicate hangs under it in a
+        container keyed by its storage id, so either can be deleted alone
+        """
+        container = self._container(f"<{email.get('id')}@opsechat.local>")
+        container.email = email
+        self.by_email_id[email.get('id')] = container
+        if container.parent is None:
+            self._link(original, container)
+        self._touch(self._root_of(container))
+        return container
+    
+    def remove(self, email_id: str) -> bool:
+        """Drop an email, keeping its container while replies still hang off it"""
+        container = self.by_email_id.pop(email_id, None)
+        if container is None:
+            return False
+        container.email = None
+        self._prune(container)
+        return True
+    
+    def get_thread(self, root: ThreadContainer) -> Optional[Dict]:
+        """Build one thread as nested dicts in O(thread size)"""
+        messages = self._build(root)
+        if not messages:
+            return None
+        
+        count = 0
+        latest = None
+        stack = list(messages)
+        while stack:
+            node = stack.pop()
+            count += 1
+            if node['timestamp'] and (latest is None or node['timestamp'] > latest):
+                latest = node['timestamp']
+            stack.extend(node['replies'])
+        
+        return {
+            'thread_id': root.message_id,
+            'subject': messages[0]['subject'],
+            'message_count': count,
+            'last_timestamp': latest,
+            'messages': messages,
+        }
+    
+    def get_threads(self) -> List[Dict]:
+        """All threads, most recently active first"""
+        threads = []
+        for root in reversed(list(self.roots)):
+            thread = self.get_thread(root)
+            if thread:
+                threads.append(thread)
+        return threads
+    
+    def _container(self, message_id: str) -> ThreadContainer:
+        container = self.containers.get(message_id)
+        if container is None:
+            container = ThreadContainer(message_id)
+            self.containers[message_id] = container
+            self.roots[container] = None
+        return container
+    
+    def _link(self, parent: ThreadContainer, child: ThreadContainer) -> None:
+        child.parent = parent
+        parent.children.append(child)
+        self.roots.pop(child, None)
+    
+    def _unlink(self, child: ThreadContainer) -> None:
+        if child.parent is not None:
+            child.parent.children.remove(child)
+            child.parent = None
+            self.roots[child] = None
+    
+    def _is_ancestor(self, candidate: ThreadContainer, node: ThreadContainer) -> bool:
+        while node is not None:
+            if node is candidate:
+                return True
+            node = node.parent
+        return False
+    
+    def _root_of(self, container: ThreadContainer) -> ThreadContainer:
+        while container.parent is not None:
+            container = container.parent
+        return container
+    
+    def _touch(self, root: ThreadContainer) -> None:
+        self.roots.pop(root, None)
+        self.roots[root] = None
+    
+    def _prune(self, container: Optional[ThreadContainer]) -> None:
+        """Delete empty leaf containers up the parent chain"""
+        while container is not None and container.email is None and not container.children:
+            parent = container.parent
+            self._unlink(container)
+            self.roots.pop(container, None)
+            del self.containers[container.message_id]
+            container = parent
+    
+    def _build(self, container: ThreadContainer) -> List[Dict]:
+        """
+        Nested message dicts; empty containers are replaced by their children
+        Walks with an explicit stack, since any sender can grow a reply chain
+        """
+        messages: List[Dict] = []
+        stack = [(container, messages, 0)]
+        while stack:
+            container, target, depth = stack.pop()
+            email = container.email
+            if email is not None:
+                timestamp = email.get('timestamp')
+                node = {
+                    'id': email.get('id'),
+                    'message_id': self.message_id_for(email),
+                    'from': email.get('from', ''),
+                    'subject': email.get('subject', ''),
+                    'timestamp': timestamp.isoformat() if timestamp else None,
+                    'replies': [],
+                }
+                target.append(node)
+                if depth + 1 < MAX_THREAD_DEPTH:
+                    target, depth = node['replies'], depth + 1
+            # Reversed so children are appended in their original order
+            stack.extend((child, target, depth) for child in reversed(container.children))
+        return messages
+
+
+LOCK_STRIPES = 64  # Per-user lock striping; users only contend on hash collisions
+DEFAULT_FOLDER = 'INBOX'  # Folder of emails never moved
+MAX_FOLDER_NAME = 64
+BULK_ACTIONS = {
+    'mark_read': ('read', True),
+    'mark_unread': ('read', False),
+    'flag': ('flagged', True),
+    'unflag': ('flagged', False),
+    'move': ('folder', None),
+    'delete': (None, None),
+}
 
 
 class EmailStorage:
     """
     In-memory email storage with optional encryption
     Nothing touches disk unless encrypted
+    Large bodies are held compressed and decompressed on access
+    Each inbox is guarded by a striped per-user lock
     """
     
-    def __init__(self):
+    def __init__(self, compressor: Optional[BodyCompressor] = None,
+                 lock_stripes: int = LOCK_STRIPES):
         self.emails: Dict[str, List[Dict]] = {}  # user_id -> list of emails
         self.user_keys: Dict[str, Dict] = {}  # user_id -> {master_key, email_key}
+        self.threads: Dict[str, ThreadIndex] = {}  # user_id -> thread index
+        self.compressor = compressor or BodyCompressor()
+        self._locks = [threading.RLock() for _ in range(lock_stripes)]
+    
+    def _lock_for(self, user_id: str) -> threading.RLock:
+        """Lock guarding a user's inbox and thread index"""
+        return self._locks[hash(user_id) % len(self._locks)]
         
     def create_user_inbox(self, user_id: str) -> None:
         """Initialize inbox for a user"""
-        if user_id not in self.emails:
-            self.emails[user_id] = []
+        with self._lock_for(user_id):
+            if user_id not in self.emails:
+                self.threads[user_id] = ThreadIndex()
+                self.emails[user_id] = []
             
-    def add_email(self, user_id: str, email: Dict) -> None:
-        """Add email to user's inbox"""
-        if user_id not in self.emails:
-            self.create_user_inbox(user_id)
-        
+    def add_email(self, user_id: str, email: Dict) -> bool:
+        """
+        Add email to user's inbox
+        Returns False if an email with the same Message-ID is already stored
+        """
         email['timestamp'] = datetime.datetime.now()
         email['id'] = self._generate_email_id()
-        self.emails[user_id].append(email)
+        stored = StoredEmail(email, self.compressor)
         
-    def get_emails(self, user_id: str, limit: Optional[int] = None) -> List[Dict]:
-        """Retrieve user's emails"""
-        if user_id not in self.emails:
-            return []
+        with self._lock_for(user_id):
+            if user_id not in self.emails:
+                self.create_user_inbox(user_id)
+            return self._insert(user_id, stored)
         
-        emails = self.emails[user_id]
-        if limit:
-            return emails[-limit:]
-        return emails
+    def add_emails(self, user_id: str, emails: List[Dict]) -> int:
+        """
+        Add a batch of emails under a single lock acquisition
+        Returns the number added after Message-ID deduplication
+        """
+        stored = []
+        for email in emails:
+            email.setdefault('timestamp', datetime.datetime.now())
+            email['id'] = self._generate_email_id()
+            stored.append(StoredEmail(email, self.compressor))
+        
+        with self._lock_for(user_id):
+            if user_id not in self.emails:
+                self.create_user_inbox(user_id)
+            return sum(self._insert(user_id, email) for email in stored)
+    
+    def _insert(self, user_id: str, stored: 'StoredEmail') -> bool:
+        """Append and thread an email unless its Message-ID is already stored"""
+        if self.threads[user_id].has_message(stored):
+            stored.release()
+            return False
+        self.emails[user_id].append(stored)
+        self.threads[user_id].add(stored)
+        return True
+        
+    def get_emails(self, user_id: str, limit: Optional[int] = None,
+                   folder: Optional[str] = None) -> List[Dict]:
+        """Retrieve a snapshot of user's emails, optionally only those in one folder"""
+        with self._lock_for(user_id):
+            if user_id not in self.emails:
+                return []
+            
+            emails = self.emails[user_id]
+            if folder is not None:
+                emails = [email for email in emails if email.get('folder', DEFAULT_FOLDER) == folder]
+            if limit:
+                return emails[-limit:]
+            return list(emails)
     
     def get_email(self, user_id: str, email_id: str) -> Optional[Dict]:
         """Get specific email by ID"""
-        if user_id not in self.emails:
+        with self._lock_for(user_id):
+            if user_id not in self.emails:
+                return None
+                
+            for email in self.emails[user_id]:
+                if email.get('id') == email_id:
+                    return email
             return None
-            
-        for email in self.emails[user_id]:
-            if email.get('id') == email_id:
-                return email
-        return None
     
     def delete_email(self, user_id: str, email_id: str) -> bool:
         """Delete specific email"""
-        if user_id not in self.emails:
+        with self._lock_for(user_id):
+            if user_id not in self.emails:
+                return False
+                
+            for i, email in enumerate(self.emails[user_id]):
+                if email.get('id') == email_id:
+                    self.emails[user_id].pop(i).release()
+                    self.threads[user_id].remove(email_id)
+                    return True
             return False
-            
-        for i, email in enumerate(self.emails[user_id]):
-            if email.get('id') == email_id:
-                self.emails[user_id].pop(i)
-                return True
-        return False
     
     def update_email(self, user_id: str, email_id: str, updated_email: Dict) -> bool:
         """Update email (for raw mode editing)"""
-        if user_id not in self.emails:
+        with self._lock_for(user_id):
+            if user_id not in self.emails:
+                return False
+                
+            for i, email in enumerate(self.emails[user_id]):
+                if email.get('id') == email_id:
+                    updated_email['id'] = email_id
+                    updated_email['timestamp'] = email.get('timestamp', datetime.datetime.now())
+                    email.release()
+                    stored = StoredEmail(updated_email, self.compressor)
+                    self.emails[user_id][i] = stored
+                    self.threads[user_id].remove(email_id)
+                    self.threads[user_id].add(stored)
+                    return True
             return False
+    
+    def bulk_update(self, user_id: str, email_ids: List[str], action: str,
+                    folder: Optional[str] = None) -> Dict[str, bool]:
+        """
+        Apply one action to many emails in a single pass over the inbox
+        
+        Args:
+            user_id: User identifier
+            email_ids: IDs of the emails to act on
+            action: One of BULK_ACTIONS
+            folder: Destination folder for 'move'
+        
+        Returns:
+            Dict of email ID -> whether it was found and updated
+        """
+        if action not in BULK_ACTIONS:
+            raise ValueError(f"Unknown bulk action: {action}")
+        if action == 'move' and not (isinstance(folder, str) and 0 < len(folder) <= MAX_FOLDER_NAME
+                                     and folder.isprintable()):
+            raise ValueError(f"Folder must be a name of 1 to {MAX_FOLDER_NAME} printable characters")
+        
+        field, value = BULK_ACTIONS[action]
+        if action == 'move':
+            value = folder
+        
+        results = {email_id: False for email_id in email_ids}
+        with self._lock_for(user_id):
+            emails = self.emails.get(user_id)
+            if not emails:
+                return results
             
-        for i, email in enumerate(self.emails[user_id]):
-            if email.get('id') == email_id:
-                updated_email['id'] = email_id
-                updated_email['timestamp'] = email.get('timestamp', datetime.datetime.now())
-                self.emails[user_id][i] = updated_email
-                return True
-        return False
+            if action == 'delete':
+                kept = []
+                for email in emails:
+                    email_id = email.get('id')
+                    if email_id in results:
+                        email.release()
+                        self.threads[user_id].remove(email_id)
+                        results[email_id] = True
+                    else:
+                        kept.append(email)
+                emails[:] = kept
+            else:
+                for email in emails:
+                    email_id = email.get('id')
+                    if email_id in results:
+                        email[field] = value
+                        results[email_id] = True
+        return results
+    
+    def set_body(self, user_id: str, email_id: str, body: str) -> bool:
+        """Fill in the body of an email that was synced headers-only"""
+        with self._lock_for(user_id):
+            for email in self.emails.get(user_id, ()):
+                if email.get('id') == email_id:
+                    email['body'] = body
+                    email['body_pending'] = False
+                    email['is_pgp'] = EmailValidator.is_pgp_message(body)
+                    return True
+            return False
+    
+    def get_threads(self, user_id: str) -> List[Dict]:
+        """Get user's conversations, most recently active first"""
+        with self._lock_for(user_id):
+            if user_id not in self.threads:
+                return []
+            return self.threads[user_id].get_threads()
+    
+    def get_compression_stats(self) -> Dict:
+        """Get body compression statistics"""
+        return self.compressor.get_stats()
     
     def _generate_email_id(self) -> str:
         """Generate unique email ID"""
@@ -179,18 +724,269 @@ class EmailComposer:
         return '\n'.join(lines)
 
 
+BURNER_ALPHABET = string.ascii_lowercase + string.digits
+BURNER_LOCAL_LENGTH = 12
+
+
+class BurnerAddressPool:
+    """
+    Pre-generated, collision-checked burner local parts per domain
+    Rotation pops an address in O(1); a background thread tops each active
+    domain up to a target that follows the observed take rate
+    """
+    
+    def __init__(self, is_taken: Callable[[str], bool], min_size: int = 16,
+                 max_size: int = 4096, refill_interval: float = 2.0,
+                 horizon: float = 10.0, idle_timeout: float = 600.0):
+        """
+        Args:
+            is_taken: Returns True if a full address is already in use
+            min_size: Addresses kept ready per active domain
+            max_size: Upper bound on addresses kept per domain
+            refill_interval: Seconds between refill passes
+            horizon: Seconds of demand (at the observed rate) kept ready
+            idle_timeout: Seconds without takes before a domain is dropped
+        """
+        self.is_taken = is_taken
+        self.min_size = min_size
+        self.max_size = max_size
+        self.refill_interval = refill_interval
+        self.horizon = horizon
+        self.idle_timeout = idle_timeout
+        self._domains: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+    
+    def _domain(self, domain: str) -> Dict:
+        state = self._domains.get(domain)
+        if state is None:
+            now = time.monotonic()
+            state = self._domains[domain] = {
+                'ready': deque(),
+                'queued': set(),
+                'target': self.min_size,
+                'rate': 0.0,  # Smoothed takes per second
+                'takes': 0,   # Takes since the last refill pass
+                'measured_at': now,
+                'last_take': now,
+                'hits': 0,
+                'misses': 0,
+                'primed': False,  # Filled at least once
+            }
+        return state
+    
+    def prepare(self, domain: str) -> None:
+        """Start filling a domain ahead of switching to it"""
+        with self._lock:
+            self._domain(domain)['last_take'] = time.monotonic()
+        self.start()
+        self._wake.set()
+    
+    def take(self, domain: str) -> str:
+        """Pop a ready local part, generating one inline if the pool is empty"""
+        with self._lock:
+            state = self._domain(domain)
+            state['takes'] += 1
+            state['last_take'] = time.monotonic()
+            while state['ready']:
+                local_part = state['ready'].popleft()
+                state['queued'].discard(local_part)
+                # Addresses handed out elsewhere since generation are skipped
+                if not self.is_taken(f"{local_part}@{domain}"):
+                    state['hits'] += 1
+                    low = len(state['ready']) < state['target'] // 2
+                    break
+            else:
+                state['misses'] += 1
+                if state['primed']:
+                    # Ran dry: demand outpaced the target
+                    state['target'] = min(self.max_size, state['target'] * 2)
+                local_part = None
+                low = True
+        
+        if low:
+            self.start()
+            self._wake.set()
+        return local_part or self._generate(domain)
+    
+    def _generate(self, domain: str) -> str:
+        while True:
+            local_part = ''.join(random.choices(BURNER_ALPHABET, k=BURNER_LOCAL_LENGTH))
+            if not self.is_taken(f"{local_part}@{domain}"):
+                return local_part
+    
+    def refill(self) -> int:
+        """Adapt targets to demand and top every active domain up; returns addresses added"""
+        now = time.monotonic()
+        plan = []
+        with self._lock:
+            for domain in list(self._domains):
+                state = self._domains[domain]
+                if now - state['last_take'] > self.idle_timeout:
+                    del self._domains[domain]
+                    continue
+                
+                elapsed = now - state['measured_at']
+                if elapsed > 0:
+                    rate = state['takes'] / elapsed
+                    state['rate'] = 0.3 * rate + 0.7 * state['rate']
+                    state['takes'] = 0
+                    state['measured_at'] = now
+                    # Decay towards the observed rate, but never below min_size
+                    wanted = int(state['rate'] * self.horizon) + 1
+                    state['target'] = max(self.min_size, min(self.max_size,
+                                                             max(wanted, state['target'] // 2)))
+                plan.append((domain, state['target'] - len(state['ready'])))
+        
+        # Generate outside the lock so takes are never held up by a refill
+        added = 0
+        for domain, missing in plan:
+            batch = [self._generate(domain) for _ in range(max(0, missing))]
+            with self._lock:
+                state = self._domains.get(domain)
+                if state is None:
+                    continue
+                for local_part in batch:
+                    if local_part not in state['queued']:
+                        state['ready'].append(local_part)
+                        state['queued'].add(local_part)
+                        added += 1
+                state['primed'] = True
+        return added
+    
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True, name="burner-pool")
+        self._thread.start()
+    
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+    
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self.refill()
+            self._wake.wait(self.refill_interval)
+            self._wake.clear()
+    
+    def get_stats(self) -> Dict[str, Dict]:
+        """Per-domain pool size, target, smoothed take rate and hit/miss counts"""
+        with self._lock:
+            return {domain: {
+                'ready': len(state['ready']),
+                'target': state['target'],
+                'rate_per_sec': round(state['rate'], 2),
+                'hits': state['hits'],
+                'misses': state['misses'],
+            } for domain, state in self._domains.items()}
+
+
+class CountingBloomFilter:
+    """
+    Counting Bloom filter over strings
+    Answers "definitely absent" without touching the structure it mirrors;
+    8-bit counters allow removal and stick at 255 rather than risk underflow
+    """
+    
+    def __init__(self, capacity: int = 100000, error_rate: float = 0.001):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.counters = bytearray(self.size)
+        self.count = 0
+    
+    def _positions(self, item: str) -> List[int]:
+        # Double hashing; str hashes are cached, so this costs no string scan
+        first = hash(item)
+        second = hash((item, 0x9E3779B9)) | 1
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+    
+    def add(self, item: str) -> None:
+        counters = self.counters
+        for position in self._positions(item):
+            if counters[position] < 255:
+                counters[position] += 1
+        self.count += 1
+    
+    def remove(self, item: str) -> None:
+        """Remove an item that was added; removing anything else corrupts the filter"""
+        counters = self.counters
+        for position in self._positions(item):
+            if 0 < counters[position] < 255:
+                counters[position] -= 1
+        self.count = max(0, self.count - 1)
+    
+    def __contains__(self, item: str) -> bool:
+        counters = self.counters
+        return all(counters[position] for position in self._positions(item))
+    
+    def __len__(self) -> int:
+        return self.count
+
+
+STATELESS_PATTERN = re.compile(r'[a-z2-7]+', re.IGNORECASE)
+STATELESS_MAC_BYTES = 10  # Truncated HMAC-SHA256 carried in stateless addresses
+STATELESS_NONCE_BYTES = 6  # Seeds the keystream hiding owner and lifetime
+STATELESS_HEADER = struct.Struct('>Ih')  # issued epoch, hours valid
+MAX_LOCAL_PART = 64
+DEFAULT_BURNER_DOMAIN = "opsecmail.onion"
+MAX_BURNER_BATCH = 100
+MAX_BURNER_HOURS = 24 * 7
+
+
 class BurnerEmailManager:
-    """Manage temporary burner email addresses"""
+    """
+    Manage temporary burner email addresses
+    Per-user burner lists are guarded by striped locks; the address map is
+    only read through snapshots so cleanup never races a listing
     
-    def __init__(self):
+    In stateless mode (enable_stateless) the local part of a new address
+    carries its owner, issue time and lifetime, encrypted and under a
+    truncated HMAC, so routing needs no per-address entry; only revocations
+    are remembered
+    """
+    
+    def __init__(self, lock_stripes: int = LOCK_STRIPES, secret_key: Optional[bytes] = None):
         self.burner_addresses: Dict[str, Dict] = {}  # email -> {user_id, expires_at}
         self.custom_domain: Optional[str] = None  # Custom domain from domain manager
         self.user_burners: Dict[str, List[str]] = {}  # user_id -> list of burner emails
+        self.secret_key = secret_key  # Set for stateless addresses
+        self.revoked: Dict[str, float] = {}  # stateless local part -> expiry epoch
+        self._locks = [threading.Lock() for _ in range(lock_stripes)]
+        self.address_pool = BurnerAddressPool(lambda email: email in self.burner_addresses)
+        # Mirrors burner_addresses keys so junk recipients skip the dict entirely
+        self.address_filter = CountingBloomFilter()
+        self._filter_lock = threading.Lock()
+    
+    def enable_stateless(self, secret_key: Optional[bytes] = None) -> None:
+        """
+        Derive new addresses from an HMAC instead of storing them
+        Addresses only validate while the same key is in use
+        """
+        self.secret_key = secret_key or secrets.token_bytes(32)
+    
+    def _lock_for(self, user_id: str) -> threading.Lock:
+        """Lock guarding a user's burner list"""
+        return self._locks[hash(user_id) % len(self._locks)]
     
     def set_custom_domain(self, domain: str) -> None:
         """Set custom domain for burner emails"""
+        self.prepare_domain(domain)
         self.custom_domain = domain
     
+    def prepare_domain(self, domain: str) -> None:
+        """Pre-generate addresses for a domain that is about to become active"""
+        if not self.secret_key:
+            self.address_pool.prepare(domain)
+    
     def generate_burner_email(self, user_id: str, domain: Optional[str] = None, 
                              hours_valid: int = 24) -> str:
         """
@@ -202,26 +998,70 @@ class BurnerEmailManager:
             domain: Optional custom domain (uses self.custom_domain if None)
             hours_valid: Hours before expiry (default 24)
         """
-        if domain is None:
-            domain = self.custom_domain or "opsecmail.onion"
-        
-        random_part = ''.join(random.choice(string.ascii_lowercase + string.digits) 
-                             for _ in range(12))
-        email = f"{random_part}@{domain}"
-        
-        self.burner_addresses[email] = {
-            'user_id': user_id,
-            'created_at': datetime.datetime.now(),
-            'expires_at': datetime.datetime.now() + datetime.timedelta(hours=hours_valid)
-        }
+        email = self._new_burner(user_id, domain, hours_valid)['email']
         
         # Track user's burners
-        if user_id not in self.user_burners:
-            self.user_burners[user_id] = []
-        self.user_burners[user_id].append(email)
+        with self._lock_for(user_id):
+            self.user_burners.setdefault(user_id, []).append(email)
         
         return email
     
+    def generate_burner_batch(self, user_id: str,
+                              specs: List[Tuple[Optional[str], int]]) -> List[Dict]:
+        """
+        Generate several burner addresses in one call
+        The user's list is locked once for the whole batch
+        
+        Args:
+            user_id: User identifier
+            specs: (domain, hours_valid) per address; None picks the active domain
+        
+        Returns:
+            List of dicts with email and expires (epoch seconds)
+        """
+        if len(specs) > MAX_BURNER_BATCH:
+            raise ValueError(f"At most {MAX_BURNER_BATCH} burners per batch")
+        for _, hours_valid in specs:
+            if not 0 < hours_valid <= MAX_BURNER_HOURS:
+                raise ValueError(f"hours_valid must be between 1 and {MAX_BURNER_HOURS}")
+        
+        burners = [self._new_burner(user_id, domain, hours_valid)
+                   for domain, hours_valid in specs]
+        
+        with self._lock_for(user_id):
+            self.user_burners.setdefault(user_id, []).extend(
+                burner['email'] for burner in burners)
+        
+        return burners
+    
+    def burner_domains(self) -> List[str]:
+        """Domains new burners may be issued on"""
+        if self.custom_domain and self.custom_domain != DEFAULT_BURNER_DOMAIN:
+            return [self.custom_domain, DEFAULT_BURNER_DOMAIN]
+        return [DEFAULT_BURNER_DOMAIN]
+    
+    def _new_burner(self, user_id: str, domain: Optional[str], hours_valid: int) -> Dict:
+        """Create and register one address without touching the user's list"""
+        if domain is None:
+            domain = self.custom_domain or DEFAULT_BURNER_DOMAIN
+        
+        issued = time.time()
+        expires = int(issued) + hours_valid * 3600
+        if self.secret_key:
+            email = f"{self._derive_local_part(user_id, domain, int(issued), hours_valid)}@{domain}"
+        else:
+            email = f"{self.address_pool.take(domain)}@{domain}"
+            
+            now = datetime.datetime.fromtimestamp(issued)
+            self._register_address(email, {
+                'user_id': user_id,
+                'created_at': now,
+                'expires_at': now + datetime.timedelta(hours=hours_valid),
+                'expires': expires,
+            })
+        
+        return {'email': email, 'expires': expires}
+    
     def get_user_burners(self, user_id: str) -> List[Dict]:
         """
         Get all active burner emails for a user
@@ -231,15 +1071,15 @@ class BurnerEmailManager:
         """
         self.cleanup_expired()
         
-        if user_id not in self.user_burners:
-            return []
+        with self._lock_for(user_id):
+            emails = list(self.user_burners.get(user_id, ()))
         
         now = datetime.datetime.now()
         active_burners = []
         
-        for email in self.user_burners[user_id]:
-            if email in self.burner_addresses:
-                info = self.burner_addresses[email]
+        for email in emails:
+            info = self.burner_addresses.get(email) or self._stateless_info(email)
+            if info:
                 time_remaining = info['expires_at'] - now
                 active_burners.append({
                     'email': email,
@@ -251,6 +1091,34 @@ class BurnerEmailManager:
         
         return active_burners
     
+    def list_user_burners(self, user_id: str) -> List[Dict]:
+        """
+        Compact listing of a user's live burners for polling clients
+        Skips the cleanup pass and server-side formatting; expired entries
+        are filtered against their stored expiry epoch
+        
+        Returns:
+            List of dicts with email and expires (epoch seconds)
+        """
+        with self._lock_for(user_id):
+            emails = list(self.user_burners.get(user_id, ()))
+        
+        now = time.time()
+        burners = []
+        for email in emails:
+            info = self.burner_addresses.get(email)
+            if info is not None:
+                expires = info.get('expires') or int(info['expires_at'].timestamp())
+            else:
+                decoded = self._decode_stateless(email)
+                if decoded is None or email.partition('@')[0].lower() in self.revoked:
+                    continue
+                expires = decoded[2]
+            if expires > now:
+                burners.append({'email': email, 'expires': expires})
+        
+        return burners
+    
     def rotate_burner(self, user_id: str, old_email: Optional[str] = None) -> str:
         """
         Rotate to a new burner email
@@ -270,30 +1138,155 @@ class BurnerEmailManager:
     
     def expire_burner(self, email: str) -> bool:
         """Immediately expire a burner email"""
-        if email in self.burner_addresses:
-            del self.burner_addresses[email]
-            return True
-        return False
+        info = self._unregister_address(email)
+        if info is None:
+            decoded = self._decode_stateless(email)
+            if decoded is None or decoded[2] <= time.time():
+                return False
+            # Stateless addresses stay valid by construction until they expire
+            self.revoked[email.partition('@')[0].lower()] = decoded[2]
+            info = {'user_id': decoded[0]}
+        self._forget_user_burner(info['user_id'], email)
+        return True
     
     def get_user_for_burner(self, email: str) -> Optional[str]:
         """Get user ID for burner email"""
-        burner_info = self.burner_addresses.get(email)
-        if burner_info and burner_info['expires_at'] > datetime.datetime.now():
-            return burner_info['user_id']
+        if email in self.address_filter:
+            burner_info = self.burner_addresses.get(email)
+            if burner_info and burner_info['expires_at'] > datetime.datetime.now():
+                return burner_info['user_id']
+        
+        decoded = self._decode_stateless(email)
+        if (decoded and decoded[2] > time.time()
+                and email.partition('@')[0].lower() not in self.revoked):
+            return decoded[0]
         return None
     
+    def _stateless_key(self, purpose: bytes) -> bytes:
+        """Subkey of secret_key for one purpose, so encryption and MAC keys differ"""
+        return hmac.new(self.secret_key, b"opsechat-burner-" + purpose, sha256).digest()
+    
+    def _keystream_xor(self, nonce: bytes, data: bytes) -> bytes:
+        """XOR data with an HMAC-SHA256 counter keystream seeded by the nonce"""
+        key = self._stateless_key(b"encrypt")
+        stream = b''.join(hmac.new(key, nonce + struct.pack('>I', block), sha256).digest()
+                          for block in range(len(data) // sha256().digest_size + 1))
+        return bytes(a ^ b for a, b in zip(data, stream))
+    
+    def _stateless_mac(self, domain: str, sealed: bytes) -> bytes:
+        """Truncated HMAC binding the sealed payload to the domain it was issued for"""
+        message = domain.lower().encode() + b'\x00' + sealed
+        return hmac.new(self._stateless_key(b"mac"), message, sha256).digest()[:STATELESS_MAC_BYTES]
+    
+    def _derive_local_part(self, user_id: str, domain: str, issued: int, hours_valid: int) -> str:
+        """Local part carrying the encrypted owner and lifetime under a truncated HMAC"""
+        nonce = secrets.token_bytes(STATELESS_NONCE_BYTES)
+        plaintext = STATELESS_HEADER.pack(issued, hours_valid) + user_id.encode()
+        sealed = nonce + self._keystream_xor(nonce, plaintext)
+        mac = self._stateless_mac(domain, sealed)
+        local_part = base64.b32encode(sealed + mac).decode().rstrip('=').lower()
+        if len(local_part) > MAX_LOCAL_PART:
+            raise ValueError("User ID too long for a stateless burner address")
+        return local_part
+    
+    def _decode_stateless(self, email: str) -> Optional[Tuple[str, int, int]]:
+        """
+        Validate a stateless address
+        
+        Returns:
+            (user_id, issued epoch, expiry epoch), or None if it is not one of ours
+        """
+        if not self.secret_key:
+            return None
+        local_part, _, domain = email.partition('@')
+        # Cheap shape check before any decoding or HMAC work
+        if len(local_part) > MAX_LOCAL_PART or not STATELESS_PATTERN.fullmatch(local_part):
+            return None
+        try:
+            raw = base64.b32decode(local_part.upper() + '=' * (-len(local_part) % 8))
+        except (binascii.Error, ValueError):
+            return None
+        if len(raw) <= STATELESS_NONCE_BYTES + STATELESS_HEADER.size + STATELESS_MAC_BYTES:
+            return None
+        # Stray padding bits would give one address several spellings, and
+        # a respelling would dodge the revocation denylist
+        if base64.b32encode(raw).decode().rstrip('=') != local_part.upper():
+            return None
+        
+        sealed, mac = raw[:-STATELESS_MAC_BYTES], raw[-STATELESS_MAC_BYTES:]
+        if not hmac.compare_digest(mac, self._stateless_mac(domain, sealed)):
+            return None
+        
+        nonce = sealed[:STATELESS_NONCE_BYTES]
+        payload = self._keystream_xor(nonce, sealed[STATELESS_NONCE_BYTES:])
+        issued, hours_valid = STATELESS_HEADER.unpack_from(payload)
+        try:
+            user_id = payload[STATELESS_HEADER.size:].decode()
+        except UnicodeDecodeError:
+            return None
+        return user_id, issued, issued + hours_valid * 3600
+    
+    def _stateless_info(self, email: str) -> Optional[Dict]:
+        """Burner info for a live, unrevoked stateless address"""
+        decoded = self._decode_stateless(email)
+        if (decoded is None or decoded[2] <= time.time()
+                or email.partition('@')[0].lower() in self.revoked):
+            return None
+        return {
+            'user_id': decoded[0],
+            'created_at': datetime.datetime.fromtimestamp(decoded[1]),
+            'expires_at': datetime.datetime.fromtimestamp(decoded[2]),
+        }
+    
     def cleanup_expired(self) -> None:
         """Remove expired burner addresses"""
         now = datetime.datetime.now()
-        expired = [email for email, info in self.burner_addresses.items() 
+        expired = [email for email, info in self.burner_addresses.copy().items()
                    if info['expires_at'] <= now]
         for email in expired:
-            del self.burner_addresses[email]
+            info = self._unregister_address(email)
             # Also remove from user_burners
-            user_id = self.burner_addresses.get(email, {}).get('user_id')
-            if user_id and user_id in self.user_burners:
-                if email in self.user_burners[user_id]:
-                    self.user_burners[user_id].remove(email)
+            if info:
+                self._forget_user_burner(info['user_id'], email)
+        
+        if self.secret_key:
+            # Stateless addresses only linger in their owners' lists and the denylist
+            epoch = time.time()
+            for local_part, expires in list(self.revoked.items()):
+                if expires <= epoch:
+                    self.revoked.pop(local_part, None)
+            for user_id, burners in list(self.user_burners.items()):
+                with self._lock_for(user_id):
+                    burners[:] = [email for email in burners
+                                  if email in self.burner_addresses or self._stateless_info(email)]
+    
+    def _register_address(self, email: str, info: Dict) -> None:
+        """Store an address, keeping the filter in step with the dict"""
+        with self._filter_lock:
+            if len(self.address_filter) >= self.address_filter.capacity:
+                # Past capacity the false positive rate climbs; rebuild twice as large
+                rebuilt = CountingBloomFilter(self.address_filter.capacity * 2,
+                                              self.address_filter.error_rate)
+                for address in self.burner_addresses:
+                    rebuilt.add(address)
+                self.address_filter = rebuilt
+            # In the filter before the dict, so a routable address is never filtered out
+            self.address_filter.add(email)
+            self.burner_addresses[email] = info
+    
+    def _unregister_address(self, email: str) -> Optional[Dict]:
+        with self._filter_lock:
+            info = self.burner_addresses.pop(email, None)
+            if info is not None:
+                self.address_filter.remove(email)
+        return info
+    
+    def _forget_user_burner(self, user_id: str, email: str) -> None:
+        """Drop an address from its owner's burner list"""
+        with self._lock_for(user_id):
+            burners = self.user_burners.get(user_id)
+            if burners and email in burners:
+                burners.remove(email)
     
     def _format_time_remaining(self, time_delta: datetime.timedelta) -> str:
         """Format time remaining in human-readable format"""
@@ -315,4 +1308,8 @@ class BurnerEmailManager:
 
 # Global instances
 email_storage = EmailStorage()
+# Stateless burners are off unless OPSECHAT_STATELESS_BURNERS=true; set
+# OPSECHAT_BURNER_KEY (hex) so their addresses stay valid across restarts
 burner_manager = BurnerEmailManager()
+if os.environ.get('OPSECHAT_STATELESS_BURNERS', 'false').lower() == 'true':
+    burner_manager.enable_stateless(bytes.fromhex(os.environ.get('OPSECHAT_BURNER_KEY', '')) or None)
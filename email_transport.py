@@ -5,16 +5,352 @@ Handles real email sending and receiving
 import smtplib
 import imaplib
 import email
+import base64
+import hashlib
+import quopri
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.header import Header
-from typing import Dict, List, Optional
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
 import logging
+import queue
+import re
+import select
+import ssl
+import threading
 import time
+import uuid
+import weakref
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
+from circuit_breaker import CircuitBreaker, health_monitor
+from tor_pool import tor_pool
+
 logger = logging.getLogger(__name__)
 
+# Errors meaning a pooled session was dropped by the server and is worth one retry
+STALE_SESSION_ERRORS = (smtplib.SMTPServerDisconnected, imaplib.IMAP4.abort, ConnectionError)
+
+
+class PoolExhaustedError(TimeoutError):
+    """No pooled session became free in time"""
+
+
+class DeliveryUncertainError(smtplib.SMTPException):
+    """The session dropped after DATA began, so the message may have been delivered"""
+
+
+def send_tracked(server: smtplib.SMTP, msg) -> None:
+    """
+    send_message that tells a stale session apart from an interrupted DATA
+    A drop before DATA is safe to retry; after it, resending could deliver twice
+    """
+    started = False
+    data = server.data
+    
+    def tracked_data(message):
+        nonlocal started
+        started = True
+        return data(message)
+    
+    server.data = tracked_data
+    try:
+        server.send_message(msg)
+    except STALE_SESSION_ERRORS as e:
+        if started:
+            raise DeliveryUncertainError(f"Connection lost during DATA: {e}") from e
+        raise
+    finally:
+        server.data = data
+
+
+# Errors that count against an endpoint's circuit breaker
+ENDPOINT_ERRORS = (OSError, imaplib.IMAP4.abort)
+# SMTP replies and local limits that do not say anything about endpoint health
+NEUTRAL_ERRORS = (PoolExhaustedError, smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused,
+                  smtplib.SMTPDataError, smtplib.SMTPAuthenticationError)
+
+
+class ConnectionPool:
+    """
+    Bounded pool of authenticated sessions for one account
+    Idle sessions are probed with NOOP before reuse and closed after idle_timeout;
+    the global pool_reaper does the same in the background between uses
+    """
+    
+    def __init__(self, connect: Callable[[], Any], noop: Callable[[Any], Any],
+                 close: Callable[[Any], Any], max_size: int = 4,
+                 idle_timeout: float = 300.0, keepalive_interval: float = 60.0,
+                 acquire_timeout: float = 30.0,
+                 active_slots: Optional[threading.BoundedSemaphore] = None,
+                 breaker: Optional[CircuitBreaker] = None):
+        """
+        Args:
+            connect: Opens and authenticates a new session
+            noop: Keepalive probe; raises if the session is dead
+            close: Closes a session, errors are ignored
+            max_size: Maximum sessions open at once (idle + in use)
+            idle_timeout: Seconds after which an idle session is closed
+            keepalive_interval: Seconds after which an idle session is probed again
+            acquire_timeout: Seconds to wait for a free slot
+            active_slots: Optional semaphore shared by pools to cap sessions in use globally
+            breaker: Optional circuit breaker making run fail fast while the server is down
+        """
+        self._connect = connect
+        self._noop = noop
+        self._close_session = close
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.keepalive_interval = keepalive_interval
+        self.acquire_timeout = acquire_timeout
+        self._active_slots = active_slots
+        self.breaker = breaker
+        self._idle: List[Tuple[Any, float, float]] = []  # (session, last used, last checked), most recent last
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._lock = threading.Lock()
+        self._stats = {
+            'opened': 0,
+            'reused': 0,
+            'closed': 0,
+            'keepalive_failures': 0,
+            'retries': 0,
+            'reaped': 0,
+        }
+        pool_reaper.register(self)
+    
+    def acquire(self) -> Any:
+        """Check out a live session, opening one if none are idle"""
+        if not self._slots.acquire(timeout=self.acquire_timeout):
+            raise PoolExhaustedError("Connection pool exhausted")
+        if self._active_slots and not self._active_slots.acquire(timeout=self.acquire_timeout):
+            self._slots.release()
+            raise PoolExhaustedError("Global connection limit reached")
+        
+        try:
+            while True:
+                with self._lock:
+                    if not self._idle:
+                        break
+                    session, last_used, last_checked = self._idle.pop()
+                
+                now = time.monotonic()
+                if now - last_used > self.idle_timeout:
+                    self._close(session)
+                    continue
+                if now - last_checked > self.keepalive_interval:
+                    try:
+                        self._noop(session)
+                    except Exception:
+                        self._count('keepalive_failures')
+                        self._close(session)
+                        continue
+                
+                self._count('reused')
+                return session
+            
+            session = self._connect()
+            self._count('opened')
+            return session
+        except Exception:
+            self._release_slots()
+            raise
+    
+    def release(self, session: Any) -> None:
+        """Return a healthy session to the pool"""
+        now = time.monotonic()
+        with self._lock:
+            self._idle.append((session, now, now))
+        self._release_slots()
+    
+    def discard(self, session: Any) -> None:
+        """Close a broken session instead of returning it"""
+        self._close(session)
+        self._release_slots()
+    
+    def _release_slots(self) -> None:
+        if self._active_slots:
+            self._active_slots.release()
+        self._slots.release()
+    
+    def maintain(self) -> None:
+        """Close idle sessions past idle_timeout and NOOP those due a keepalive"""
+        now = time.monotonic()
+        keep, expired, due = [], [], []
+        with self._lock:
+            for entry in self._idle:
+                if now - entry[1] > self.idle_timeout:
+                    expired.append(entry)
+                elif now - entry[2] > self.keepalive_interval:
+                    due.append(entry)
+                else:
+                    keep.append(entry)
+            self._idle = keep
+        
+        for session, _, _ in expired:
+            self._close(session)
+            self._count('reaped')
+        
+        for session, last_used, last_checked in due:
+            # A probed session counts against max_size like one in use;
+            # if the pool is busy, acquire will probe it before reuse instead
+            if not self._slots.acquire(blocking=False):
+                self._return_idle(session, last_used, last_checked)
+                continue
+            try:
+                self._noop(session)
+            except Exception:
+                self._count('keepalive_failures')
+                self._close(session)
+            else:
+                self._return_idle(session, last_used, time.monotonic())
+            finally:
+                self._slots.release()
+    
+    def _return_idle(self, session: Any, last_used: float, last_checked: float) -> None:
+        with self._lock:
+            self._idle.append((session, last_used, last_checked))
+            self._idle.sort(key=lambda entry: entry[1])
+    
+    def run(self, operation: Callable[[Any], Any]) -> Any:
+        """
+        Run operation on a pooled session
+        A session dropped by the server is replaced by a freshly
+        authenticated one and the operation is retried once
+        Raises CircuitOpenError without connecting while the breaker is open
+        """
+        if self.breaker is None:
+            return self._run(operation)
+        return self.breaker.call(self._run, operation, failure_types=ENDPOINT_ERRORS,
+                                 ignore_types=NEUTRAL_ERRORS)
+    
+    def probe(self) -> bool:
+        """
+        Check the server with NOOP, bypassing the breaker
+        An idle session is checked in place and keeps its last use time, so
+        probing never holds it open past idle_timeout; without one a fresh
+        session is opened and closed again
+        """
+        with self._lock:
+            entry = self._idle.pop() if self._idle else None
+        if entry is not None:
+            session, last_used, _ = entry
+            if not self._slots.acquire(timeout=self.acquire_timeout):
+                self._return_idle(session, last_used, entry[2])
+                raise PoolExhaustedError("Connection pool exhausted")
+            try:
+                self._noop(session)
+            except Exception:
+                self._count('keepalive_failures')
+                self._close(session)
+            else:
+                self._return_idle(session, last_used, time.monotonic())
+                return True
+            finally:
+                self._slots.release()
+        
+        session = self.acquire()
+        try:
+            self._noop(session)
+        finally:
+            self.discard(session)
+        return True
+    
+    def _run(self, operation: Callable[[Any], Any]) -> Any:
+        for attempt in (1, 2):
+            session = self.acquire()
+            try:
+                result = operation(session)
+            except STALE_SESSION_ERRORS:
+                self.discard(session)
+                if attempt == 2:
+                    raise
+                self._count('retries')
+                continue
+            except Exception:
+                self.discard(session)
+                raise
+            self.release(session)
+            return result
+    
+    def close_all(self) -> None:
+        """Close every idle session"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for session, _, _ in idle:
+            self._close(session)
+    
+    def get_stats(self) -> Dict[str, int]:
+        """Get pool usage statistics"""
+        with self._lock:
+            stats = self._stats.copy()
+            stats['idle'] = len(self._idle)
+        stats['max_size'] = self.max_size
+        return stats
+    
+    def _close(self, session: Any) -> None:
+        try:
+            self._close_session(session)
+        except Exception:
+            pass
+        self._count('closed')
+    
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self._stats[key] += 1
+
+
+class PoolReaper:
+    """
+    Background keepalive for every connection pool
+    Pools register themselves and are dropped once garbage collected
+    """
+    
+    def __init__(self, interval: float = 15.0):
+        self.interval = interval
+        self._pools: "weakref.WeakSet[ConnectionPool]" = weakref.WeakSet()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+    
+    def register(self, pool: ConnectionPool) -> None:
+        with self._lock:
+            self._pools.add(pool)
+        self.start()
+    
+    def unregister(self, pool: ConnectionPool) -> None:
+        with self._lock:
+            self._pools.discard(pool)
+    
+    def reap(self) -> None:
+        """Run one maintenance pass over all pools"""
+        with self._lock:
+            pools = list(self._pools)
+        for pool in pools:
+            try:
+                pool.maintain()
+            except Exception:
+                logger.exception("Connection pool maintenance failed")
+    
+    def start(self) -> None:
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, daemon=True, name="pool-reaper")
+            self._thread.start()
+    
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+    
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.reap()
+
 
 class SMTPTransport:
     """
@@ -23,12 +359,31 @@ class SMTPTransport:
     """
     
     def __init__(self, smtp_server: str, smtp_port: int, username: str, 
-                 password: str, use_tls: bool = True):
+                 password: str, use_tls: bool = True, timeout: float = 30.0,
+                 pool_size: int = 2,
+                 active_slots: Optional[threading.BoundedSemaphore] = None,
+                 breaker: Optional[CircuitBreaker] = None):
         self.smtp_server = smtp_server
         self.smtp_port = smtp_port
         self.username = username
         self.password = password
         self.use_tls = use_tls
+        self.timeout = timeout
+        self.breaker = breaker or CircuitBreaker(f"smtp:{smtp_server}:{smtp_port}")
+        self.pool = ConnectionPool(self._connect, lambda server: server.noop(),
+                                   lambda server: server.quit(), max_size=pool_size,
+                                   active_slots=active_slots, breaker=self.breaker)
+    
+    def _connect(self) -> smtplib.SMTP:
+        """Open, secure and authenticate a new SMTP session"""
+        if tor_pool.enabled:
+            server = tor_pool.open_smtp(self.smtp_server, self.smtp_port, self.timeout)
+        else:
+            server = smtplib.SMTP(self.smtp_server, self.smtp_port, timeout=self.timeout)
+        if self.use_tls:
+            server.starttls()
+        server.login(self.username, self.password)
+        return server
     
     def send_email(self, from_addr: str, to_addr: str, subject: str, 
                    body: str, headers: Optional[Dict] = None) -> bool:
@@ -37,54 +392,288 @@ class SMTPTransport:
         Returns True on success, False on failure
         """
         try:
-            # Create message
-            msg = MIMEMultipart()
-            msg['From'] = from_addr
-            msg['To'] = to_addr
-            msg['Subject'] = Header(subject, 'utf-8')
-            
-            # Add custom headers if provided
-            if headers:
-                for key, value in headers.items():
-                    if key.lower() not in ['from', 'to', 'subject']:
-                        msg[key] = value
-            
-            # Add body as plain text
-            msg.attach(MIMEText(body, 'plain', 'utf-8'))
-            
-            # Connect and send
-            if self.use_tls:
-                server = smtplib.SMTP(self.smtp_server, self.smtp_port)
-                server.starttls()
-            else:
-                server = smtplib.SMTP(self.smtp_server, self.smtp_port)
-            
-            server.login(self.username, self.password)
-            server.send_message(msg)
-            server.quit()
-            
-            logger.info(f"Email sent successfully to {to_addr}")
+            self.deliver(from_addr, to_addr, subject, body, headers)
             return True
-            
         except Exception as e:
             logger.error(f"Failed to send email: {e}")
             return False
     
+    def deliver(self, from_addr: str, to_addr: str, subject: str,
+                body: str, headers: Optional[Dict] = None) -> None:
+        """Send email via SMTP, raising the server's refusal or the connection error"""
+        # Create message
+        msg = MIMEMultipart()
+        msg['From'] = from_addr
+        msg['To'] = to_addr
+        msg['Subject'] = Header(subject, 'utf-8')
+        
+        # Add custom headers if provided
+        if headers:
+            for key, value in headers.items():
+                if key.lower() not in ['from', 'to', 'subject']:
+                    msg[key] = value
+        
+        # Add body as plain text
+        msg.attach(MIMEText(body, 'plain', 'utf-8'))
+        
+        # Send over a pooled session
+        self.pool.run(lambda server: send_tracked(server, msg))
+        
+        logger.info(f"Email sent successfully to {to_addr}")
+    
     def test_connection(self) -> bool:
-        """Test SMTP connection"""
+        """Test SMTP connection; the session is kept in the pool for reuse"""
         try:
-            if self.use_tls:
-                server = smtplib.SMTP(self.smtp_server, self.smtp_port, timeout=10)
-                server.starttls()
-            else:
-                server = smtplib.SMTP(self.smtp_server, self.smtp_port, timeout=10)
-            
-            server.login(self.username, self.password)
-            server.quit()
+            self.pool.run(lambda server: None)
             return True
         except Exception as e:
             logger.error(f"SMTP connection test failed: {e}")
             return False
+    
+    def close(self) -> None:
+        """Close pooled sessions"""
+        self.pool.close_all()
+
+
+FETCH_CHUNK_INITIAL = 50
+FETCH_CHUNK_MIN = 10
+FETCH_CHUNK_MAX = 500
+FETCH_TARGET_BYTES = 4 * 1024 * 1024  # Aim for ~4MB per FETCH response
+FETCH_UID_PATTERN = re.compile(rb'UID (\d+)')
+EXISTS_PATTERN = re.compile(rb'^\* \d+ EXISTS')
+BODYSTRUCTURE_PATTERN = re.compile(rb'BODYSTRUCTURE ')
+BODY_PART_PATTERN = re.compile(rb'BODY\[([\d.]+)\]')
+IMAP_TOKEN_PATTERN = re.compile(rb'\(|\)|"(?:[^"\\]|\\.)*"|[^\s()"]+')
+WHITESPACE_PATTERN = re.compile(rb'\s+')
+
+# Bounds on body extraction so a hostile message costs bounded CPU and memory
+MAX_PART_TEXT = 1024 * 1024      # Decoded bytes kept per MIME part
+MAX_BODY_TEXT = 4 * 1024 * 1024  # Decoded bytes kept per message
+MAX_MIME_PARTS = 500             # Parts walked before the rest are ignored
+TRUNCATED_NOTE = "\n[Message truncated]\n"
+MAX_SYNC_INBOXES = 1000  # Per-inbox sync cursors kept per account; evicted inboxes resync
+
+
+def uid_sequence_set(uids: List[int]) -> str:
+    """Compress sorted UIDs into an IMAP sequence set, e.g. 1:200,205"""
+    ranges = []
+    start = previous = None
+    for uid in uids:
+        if previous is not None and uid == previous + 1:
+            previous = uid
+            continue
+        if start is not None:
+            ranges.append(f"{start}:{previous}" if previous != start else str(start))
+        start = previous = uid
+    if start is not None:
+        ranges.append(f"{start}:{previous}" if previous != start else str(start))
+    return ','.join(ranges)
+
+
+def iter_fetch_response(msg_data: List) -> Iterator[Tuple[int, bytes, bytes]]:
+    """
+    Walk a multi-message FETCH response as (uid, literal, prefix) triples
+    imaplib returns each message as a (prefix, literal) tuple followed by
+    the rest of the line, where the UID ends up if the server sent it last
+    """
+    for index, item in enumerate(msg_data):
+        if not isinstance(item, tuple) or len(item) < 2:
+            continue
+        match = FETCH_UID_PATTERN.search(item[0])
+        if match is None and index + 1 < len(msg_data) and isinstance(msg_data[index + 1], bytes):
+            match = FETCH_UID_PATTERN.search(msg_data[index + 1])
+        if match:
+            yield int(match.group(1)), item[1], item[0]
+
+
+def parse_imap_list(data: bytes) -> Tuple[Any, int]:
+    """
+    Parse one parenthesized IMAP list (e.g. a BODYSTRUCTURE) into nested lists
+    Quoted strings are unescaped, NIL becomes None
+    
+    Returns:
+        Parsed value and the offset just past it
+    """
+    stack: List[List] = []
+    current: Optional[List] = None
+    for match in IMAP_TOKEN_PATTERN.finditer(data):
+        token = match.group(0)
+        if token == b'(':
+            if current is not None:
+                stack.append(current)
+            current = []
+        elif token == b')':
+            if current is None:
+                raise ValueError("Unbalanced IMAP list")
+            if not stack:
+                return current, match.end()
+            finished, current = current, stack.pop()
+            current.append(finished)
+        elif current is None:
+            raise ValueError("IMAP list expected")
+        elif token.startswith(b'"'):
+            current.append(re.sub(rb'\\(.)', rb'\1', token[1:-1]).decode('utf-8', 'replace'))
+        elif token.upper() == b'NIL':
+            current.append(None)
+        else:
+            current.append(token.decode('utf-8', 'replace'))
+    raise ValueError("Unterminated IMAP list")
+
+
+def flatten_bodystructure(structure: List, prefix: str = '') -> List[Dict]:
+    """
+    Flatten a parsed BODYSTRUCTURE into leaf parts with their part numbers
+    Nested message/rfc822 parts are treated as attachments
+    """
+    if structure and isinstance(structure[0], list):
+        parts = []
+        index = 0
+        while index < len(structure) and isinstance(structure[index], list):
+            parts.extend(flatten_bodystructure(structure[index], f"{prefix}{index + 1}."))
+            index += 1
+        return parts
+    
+    content_type = f"{structure[0]}/{structure[1]}".lower()
+    params = structure[2] if isinstance(structure[2], list) else []
+    params = {str(params[i]).lower(): params[i + 1] for i in range(0, len(params) - 1, 2)}
+    
+    # Extension data starts after lines (text/*) or envelope/body/lines (message/rfc822)
+    extension = 7
+    if content_type.startswith('text/'):
+        extension = 8
+    elif content_type == 'message/rfc822':
+        extension = 10
+    disposition = structure[extension + 1] if len(structure) > extension + 1 else None
+    disposition_type = ''
+    filename = params.get('name')
+    if isinstance(disposition, list) and disposition:
+        disposition_type = str(disposition[0]).lower()
+        if len(disposition) > 1 and isinstance(disposition[1], list):
+            disp_params = disposition[1]
+            for i in range(0, len(disp_params) - 1, 2):
+                if str(disp_params[i]).lower() == 'filename':
+                    filename = disp_params[i + 1]
+    
+    return [{
+        'part': prefix.rstrip('.') or '1',
+        'type': content_type,
+        'charset': params.get('charset') or 'utf-8',
+        'encoding': str(structure[5] or '7bit').lower(),
+        'size': int(structure[6]) if str(structure[6]).isdigit() else 0,
+        'filename': filename,
+        'disposition': disposition_type,
+    }]
+
+
+def encoded_limit(encoding: str, limit: int) -> int:
+    """Encoded bytes worth reading to decode at most limit bytes"""
+    if encoding == 'base64':
+        # 4 chars per 3 bytes plus a CRLF every 76 chars
+        return (limit + 2) // 3 * 4 * 78 // 76 + 4
+    if encoding == 'quoted-printable':
+        return limit * 3
+    return limit
+
+
+class DecodeCache:
+    """
+    LRU of decoded MIME parts keyed by a hash of the encoded content
+    Repeated parts (quoted replies, re-synced messages) are decoded once
+    """
+    
+    def __init__(self, max_chars: int = 16 * 1024 * 1024, min_size: int = 4096):
+        """
+        Args:
+            max_chars: Total decoded characters kept across entries
+            min_size: Parts smaller than this are cheaper to decode than to hash
+        """
+        self.max_chars = max_chars
+        self.min_size = min_size
+        self._entries: OrderedDict = OrderedDict()
+        self._chars = 0
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0}
+    
+    def decode(self, payload: bytes, encoding: str, charset: str, limit: int) -> str:
+        if len(payload) < self.min_size:
+            return self._decode(payload, encoding, charset, limit)
+        
+        key = (hashlib.sha256(payload).digest(), encoding, charset, limit)
+        with self._lock:
+            text = self._entries.get(key)
+            if text is not None:
+                self._entries.move_to_end(key)
+                self.stats['hits'] += 1
+                return text
+            self.stats['misses'] += 1
+        
+        text = self._decode(payload, encoding, charset, limit)
+        if len(text) <= self.max_chars:
+            with self._lock:
+                if key not in self._entries:
+                    self._entries[key] = text
+                    self._chars += len(text)
+                while self._chars > self.max_chars:
+                    _, evicted = self._entries.popitem(last=False)
+                    self._chars -= len(evicted)
+        return text
+    
+    @staticmethod
+    def _decode(payload: bytes, encoding: str, charset: str, limit: int) -> str:
+        try:
+            if encoding == 'base64':
+                payload = WHITESPACE_PATTERN.sub(b'', payload)
+                # A truncated payload must still decode in whole 4-char groups
+                payload = base64.b64decode(payload[:len(payload) // 4 * 4])
+            elif encoding == 'quoted-printable':
+                payload = quopri.decodestring(payload)
+        except (ValueError, TypeError):
+            pass
+        payload = payload[:limit]
+        try:
+            return payload.decode(charset, errors='ignore')
+        except LookupError:
+            return payload.decode('utf-8', errors='ignore')
+    
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self.stats, entries=len(self._entries), chars=self._chars)
+
+
+decode_cache = DecodeCache()
+
+
+def decode_part(payload: bytes, encoding: str, charset: str,
+                limit: int = MAX_PART_TEXT) -> str:
+    """
+    Decode a fetched MIME part body by transfer encoding and charset
+    Only enough of the payload to produce limit bytes is decoded
+    """
+    return decode_cache.decode(payload[:encoded_limit(encoding, limit)],
+                               encoding, charset, limit)
+
+
+def message_part_text(part: email.message.Message, limit: int) -> Tuple[str, bool]:
+    """
+    Decode a non-multipart text part of a parsed message up to limit bytes
+
+    Returns:
+        Tuple of (text, truncated)
+    """
+    encoding = str(part.get('Content-Transfer-Encoding', '7bit')).strip().lower()
+    if encoding in ('base64', 'quoted-printable'):
+        # Left encoded so only the capped prefix gets decoded
+        payload = part.get_payload()
+        if isinstance(payload, str):
+            payload = payload.encode('utf-8', 'surrogateescape')
+    else:
+        payload = part.get_payload(decode=True)
+    if not isinstance(payload, bytes):
+        return '', False
+    
+    charset = part.get_content_charset() or 'utf-8'
+    text = decode_part(payload, encoding, charset, limit)
+    return text, len(payload) > encoded_limit(encoding, limit)
 
 
 class IMAPTransport:
@@ -94,12 +683,38 @@ class IMAPTransport:
     """
     
     def __init__(self, imap_server: str, imap_port: int, username: str, 
-                 password: str, use_ssl: bool = True):
+                 password: str, use_ssl: bool = True, timeout: float = 30.0,
+                 pool_size: int = 2, lazy_bodies: bool = True,
+                 active_slots: Optional[threading.BoundedSemaphore] = None,
+                 breaker: Optional[CircuitBreaker] = None):
         self.imap_server = imap_server
         self.imap_port = imap_port
         self.username = username
         self.password = password
         self.use_ssl = use_ssl
+        self.timeout = timeout
+        self.fetch_chunk_size = FETCH_CHUNK_INITIAL
+        self.lazy_bodies = lazy_bodies  # Sync headers only, fetch text parts when opened
+        self.sync_state: Dict[str, Dict] = {}  # folder -> {uidvalidity, last_uid, highestmodseq}
+        # Each recipient inbox has its own cursors, so one inbox syncing
+        # never consumes messages another has not seen yet
+        self.inbox_sync_state: "OrderedDict[str, Dict[str, Dict]]" = OrderedDict()
+        self._sync_lock = threading.Lock()
+        self.breaker = breaker or CircuitBreaker(f"imap:{imap_server}:{imap_port}")
+        self.pool = ConnectionPool(self._connect, lambda mail: mail.noop(),
+                                   lambda mail: mail.logout(), max_size=pool_size,
+                                   active_slots=active_slots, breaker=self.breaker)
+    
+    def _connect(self) -> imaplib.IMAP4:
+        """Open and authenticate a new IMAP session"""
+        if tor_pool.enabled:
+            mail = tor_pool.open_imap(self.imap_server, self.imap_port, self.use_ssl, self.timeout)
+        elif self.use_ssl:
+            mail = imaplib.IMAP4_SSL(self.imap_server, self.imap_port, timeout=self.timeout)
+        else:
+            mail = imaplib.IMAP4(self.imap_server, self.imap_port, timeout=self.timeout)
+        mail.login(self.username, self.password)
+        return mail
     
     def fetch_emails(self, folder: str = 'INBOX', limit: Optional[int] = None, 
                      unread_only: bool = False) -> List[Dict]:
@@ -107,57 +722,282 @@ class IMAPTransport:
         Fetch emails from IMAP server
         Returns list of email dictionaries
         """
+        try:
+            return self.pool.run(lambda mail: self._fetch(mail, folder, limit, unread_only))
+        except Exception as e:
+            logger.error(f"Failed to fetch emails: {e}")
+            return []
+    
+    def _fetch(self, mail: imaplib.IMAP4, folder: str, limit: Optional[int],
+               unread_only: bool) -> List[Dict]:
+        """Fetch emails over an authenticated session"""
+        mail.select(folder)
+        
+        # Search for emails
+        search_criteria = 'UNSEEN' if unread_only else 'ALL'
+        status, messages = mail.uid('SEARCH', None, search_criteria)
+        
+        if status != 'OK':
+            logger.error("Failed to search emails")
+            return []
+        
+        uids = [int(uid) for uid in messages[0].split()]
+        
+        # Apply limit
+        if limit:
+            uids = uids[-limit:]
+        
+        emails, _ = self._fetch_uids(mail, uids)
+        return emails
+    
+    def _fetch_uids(self, mail: imaplib.IMAP4, uids: List[int],
+                    headers_only: bool = False, folder: str = 'INBOX',
+                    uidvalidity: Optional[int] = None) -> Tuple[List[Dict], int]:
+        """
+        Fetch messages in chunks over UID sequence sets
+        One round trip per chunk; chunk size adapts to observed message size
+        With headers_only, only headers and BODYSTRUCTURE are fetched and
+        the email records where to fetch its text parts from later
+        
+        Returns:
+            Parsed emails and the highest UID fetched without a failed chunk before it
+        """
+        items = "(UID BODYSTRUCTURE BODY.PEEK[HEADER])" if headers_only else "(UID RFC822)"
         emails = []
+        position = 0
+        fetched_through = 0
         
-        try:
-            # Connect to IMAP server
-            if self.use_ssl:
-                mail = imaplib.IMAP4_SSL(self.imap_server, self.imap_port)
-            else:
-                mail = imaplib.IMAP4(self.imap_server, self.imap_port)
-            
-            mail.login(self.username, self.password)
-            mail.select(folder)
-            
-            # Search for emails
-            search_criteria = 'UNSEEN' if unread_only else 'ALL'
-            status, messages = mail.search(None, search_criteria)
+        while position < len(uids):
+            chunk = uids[position:position + self.fetch_chunk_size]
+            position += len(chunk)
             
+            status, msg_data = mail.uid('FETCH', uid_sequence_set(chunk), items)
             if status != 'OK':
-                logger.error("Failed to search emails")
-                return emails
-            
-            email_ids = messages[0].split()
-            
-            # Apply limit
-            if limit:
-                email_ids = email_ids[-limit:]
+                logger.error(f"Failed to fetch UIDs {chunk[0]}-{chunk[-1]}")
+                break
+            fetched_through = chunk[-1]
             
-            # Fetch each email
-            for email_id in email_ids:
-                status, msg_data = mail.fetch(email_id, '(RFC822)')
-                
-                if status != 'OK':
-                    continue
+            fetched = 0
+            response_bytes = 0
+            for uid, email_body, prefix in iter_fetch_response(msg_data):
+                fetched += 1
+                response_bytes += len(email_body)
                 
                 # Parse email
-                email_body = msg_data[0][1]
                 email_message = email.message_from_bytes(email_body)
                 
                 # Extract email data
                 email_dict = self._parse_email_message(email_message)
                 if email_dict:
+                    email_dict['imap_uid'] = uid
+                    if headers_only:
+                        self._mark_body_pending(email_dict, prefix, folder, uid, uidvalidity)
                     emails.append(email_dict)
             
-            mail.close()
-            mail.logout()
-            
+            self._tune_chunk_size(fetched, response_bytes)
+        
+        return emails, fetched_through
+    
+    def _mark_body_pending(self, email_dict: Dict, prefix: bytes, folder: str,
+                           uid: int, uidvalidity: Optional[int]) -> None:
+        """Record where to fetch the text parts of a header-only email"""
+        parts = None
+        match = BODYSTRUCTURE_PATTERN.search(prefix)
+        if match:
+            try:
+                structure, _ = parse_imap_list(prefix[match.end():])
+                parts = flatten_bodystructure(structure)
+            except (ValueError, IndexError, TypeError):
+                logger.warning(f"Could not parse BODYSTRUCTURE of UID {uid}")
+        
+        email_dict['body'] = self._render_parts(parts or [], {})
+        email_dict['body_pending'] = True
+        email_dict['imap_ref'] = {
+            'folder': folder,
+            'uid': uid,
+            'uidvalidity': uidvalidity,
+            # None means the structure was unreadable and the whole message is fetched
+            'parts': parts,
+        }
+    
+    @staticmethod
+    def _render_parts(parts: List[Dict], texts: Dict[str, str], truncated: bool = False) -> str:
+        """Build a body from decoded text parts, noting images and attachments"""
+        body = []
+        for part in parts:
+            if part['part'] in texts:
+                if part['type'] == 'text/html':
+                    body.append(f"\n[HTML Content - shown as text]:\n{texts[part['part']]}\n")
+                else:
+                    body.append(texts[part['part']])
+            elif part['type'].startswith('image/'):
+                body.append(f"\n[Image: {part['filename'] or 'unknown'} - {part['type']}]\n")
+            elif part['disposition'] == 'attachment' or part['type'] == 'message/rfc822':
+                body.append(f"\n[Attachment: {part['filename'] or 'unknown'} - {part['type']}]\n")
+        if truncated:
+            body.append(TRUNCATED_NOTE)
+        return ''.join(body).strip()
+    
+    def fetch_body(self, imap_ref: Dict) -> Optional[str]:
+        """
+        Fetch the text of a header-only email on demand
+        Only text/plain and text/html parts are downloaded
+        """
+        try:
+            return self.pool.run(lambda mail: self._fetch_body(mail, imap_ref))
         except Exception as e:
-            logger.error(f"Failed to fetch emails: {e}")
+            logger.error(f"Failed to fetch body of UID {imap_ref.get('uid')}: {e}")
+            return None
+    
+    def _fetch_body(self, mail: imaplib.IMAP4, imap_ref: Dict) -> Optional[str]:
+        status, _ = mail.select(imap_ref['folder'], readonly=True)
+        if status != 'OK':
+            return None
+        uidvalidity = self._select_response(mail, 'UIDVALIDITY')
+        if imap_ref.get('uidvalidity') is not None and uidvalidity != imap_ref['uidvalidity']:
+            logger.warning(f"UIDVALIDITY of {imap_ref['folder']} changed, message is gone")
+            return None
+        
+        uid = str(imap_ref['uid'])
+        parts = imap_ref.get('parts')
+        if parts is None:
+            status, msg_data = mail.uid('FETCH', uid, '(UID BODY.PEEK[])')
+            for _, raw, _ in iter_fetch_response(msg_data if status == 'OK' else []):
+                return self._extract_plain_text(email.message_from_bytes(raw))
+            return None
+        
+        text_parts = {part['part']: part for part in parts
+                      if part['type'] in ('text/plain', 'text/html')
+                      and part['disposition'] != 'attachment'}
+        texts = {}
+        truncated = False
+        if text_parts:
+            # Partial fetches keep oversized parts from being downloaded in full
+            items = ' '.join(
+                f"BODY.PEEK[{number}]<0.{encoded_limit(part['encoding'], MAX_PART_TEXT)}>"
+                for number, part in text_parts.items()
+            )
+            status, msg_data = mail.uid('FETCH', uid, f"(UID {items})")
+            if status != 'OK':
+                return None
+            budget = MAX_BODY_TEXT
+            for item in msg_data:
+                if isinstance(item, tuple) and len(item) >= 2:
+                    match = BODY_PART_PATTERN.search(item[0])
+                    part = text_parts.get(match.group(1).decode()) if match else None
+                    if not part:
+                        continue
+                    limit = min(MAX_PART_TEXT, budget)
+                    if limit <= 0 or part['size'] > encoded_limit(part['encoding'], limit):
+                        truncated = True
+                    if limit > 0:
+                        texts[part['part']] = decode_part(item[1], part['encoding'],
+                                                          part['charset'], limit)
+                        budget -= len(texts[part['part']])
+        return self._render_parts(parts, texts, truncated)
+    
+    def sync_folder(self, folder: str = 'INBOX', limit: Optional[int] = None,
+                    inbox: Optional[str] = None) -> List[Dict]:
+        """
+        Fetch only messages that arrived since the last sync of this folder
+        Uses UIDVALIDITY/UIDNEXT so an unchanged mailbox costs just a SELECT
+        
+        Args:
+            inbox: Recipient inbox the messages are for; each inbox keeps its
+                own cursor, None uses the account-wide one
+        """
+        try:
+            return self.pool.run(lambda mail: self._sync(mail, folder, limit, inbox))
+        except Exception as e:
+            logger.error(f"Failed to sync {folder}: {e}")
+            return []
+    
+    def _sync(self, mail: imaplib.IMAP4, folder: str, limit: Optional[int],
+              inbox: Optional[str] = None) -> List[Dict]:
+        """Incremental sync over an authenticated session"""
+        # Pooled syncs and the IDLE listener share the sync cursors
+        with self._sync_lock:
+            return self._sync_locked(mail, folder, limit, self._cursors(inbox))
+    
+    def _cursors(self, inbox: Optional[str]) -> Dict[str, Dict]:
+        """Folder cursors of an inbox; call with _sync_lock held"""
+        if inbox is None:
+            return self.sync_state
+        cursors = self.inbox_sync_state.pop(inbox, None)
+        if cursors is None:
+            cursors = {}
+            if len(self.inbox_sync_state) >= MAX_SYNC_INBOXES:
+                self.inbox_sync_state.popitem(last=False)
+        self.inbox_sync_state[inbox] = cursors
+        return cursors
+    
+    def _sync_locked(self, mail: imaplib.IMAP4, folder: str, limit: Optional[int],
+                     sync_state: Dict[str, Dict]) -> List[Dict]:
+        status, _ = mail.select(folder)
+        if status != 'OK':
+            logger.error(f"Failed to select {folder}")
+            return []
+        
+        uidvalidity = self._select_response(mail, 'UIDVALIDITY')
+        uidnext = self._select_response(mail, 'UIDNEXT')
+        modseq = self._select_response(mail, 'HIGHESTMODSEQ')
+        
+        state = sync_state.get(folder)
+        if state is None or state['uidvalidity'] != uidvalidity:
+            # First sync, or the server renumbered the folder
+            state = {'uidvalidity': uidvalidity, 'last_uid': 0, 'highestmodseq': None}
+            sync_state[folder] = state
         
+        last_uid = state['last_uid']
+        if uidnext is not None:
+            unchanged = uidnext <= last_uid + 1
+        else:
+            # Without UIDNEXT, an unchanged HIGHESTMODSEQ is the only hint
+            unchanged = modseq is not None and modseq == state['highestmodseq']
+        if last_uid and unchanged:
+            state['highestmodseq'] = modseq
+            return []
+        
+        status, messages = mail.uid('SEARCH', None, f'UID {last_uid + 1}:*')
+        if status != 'OK':
+            logger.error("Failed to search emails")
+            return []
+        
+        # "n:*" always matches the highest UID, even when it is below n
+        uids = [int(uid) for uid in messages[0].split() if int(uid) > last_uid]
+        if limit:
+            uids = uids[-limit:]
+        
+        emails, fetched_through = self._fetch_uids(mail, uids, self.lazy_bodies,
+                                                   folder, uidvalidity)
+        if fetched_through:
+            state['last_uid'] = fetched_through
+        if fetched_through == (uids[-1] if uids else 0):
+            # Only a complete pass may vouch for the folder's MODSEQ
+            state['highestmodseq'] = modseq
         return emails
     
-    def _parse_email_message(self, msg: email.message.Message) -> Optional[Dict]:
+    @staticmethod
+    def _select_response(mail: imaplib.IMAP4, code: str) -> Optional[int]:
+        """Latest numeric value of an untagged SELECT response code, if sent"""
+        _, data = mail.response(code)
+        if not data or data[-1] is None:
+            return None
+        try:
+            return int(data[-1])
+        except (TypeError, ValueError):
+            return None
+    
+    def _tune_chunk_size(self, fetched: int, response_bytes: int) -> None:
+        """Size the next chunk so its response lands near FETCH_TARGET_BYTES"""
+        if not fetched:
+            return
+        average = max(response_bytes // fetched, 1)
+        self.fetch_chunk_size = max(FETCH_CHUNK_MIN,
+                                    min(FETCH_CHUNK_MAX, FETCH_TARGET_BYTES // average))
+    
+    @staticmethod
+    def _parse_email_message(msg: email.message.Message) -> Optional[Dict]:
         """
         Parse email message into dictionary
         Extracts plain text only, converts HTML/images to text
@@ -178,7 +1018,7 @@ class IMAPTransport:
                     pass
             
             # Extract body (plain text only)
-            body = self._extract_plain_text(msg)
+            body = IMAPTransport._extract_plain_text(msg)
             
             # Extract all headers
             headers = {}
@@ -199,131 +1039,554 @@ class IMAPTransport:
             logger.error(f"Failed to parse email: {e}")
             return None
     
-    def _extract_plain_text(self, msg: email.message.Message) -> str:
+    @staticmethod
+    def _extract_plain_text(msg: email.message.Message) -> str:
         """
         Extract plain text from email
         If HTML, return it as text (not rendered)
         If images, return description as text
+        Decoding stops at MAX_PART_TEXT per part and MAX_BODY_TEXT per message
         """
-        body = ""
-        
-        if msg.is_multipart():
-            for part in msg.walk():
-                content_type = part.get_content_type()
-                content_disposition = str(part.get("Content-Disposition", ""))
-                
-                # Get plain text parts
-                if content_type == "text/plain" and "attachment" not in content_disposition:
-                    try:
-                        payload = part.get_payload(decode=True)
-                        charset = part.get_content_charset() or 'utf-8'
-                        body += payload.decode(charset, errors='ignore')
-                    except (AttributeError, UnicodeDecodeError, LookupError):
-                        pass
-                
-                # Convert HTML to text representation
-                elif content_type == "text/html" and "attachment" not in content_disposition:
-                    try:
-                        payload = part.get_payload(decode=True)
-                        charset = part.get_content_charset() or 'utf-8'
-                        html_content = payload.decode(charset, errors='ignore')
-                        body += f"\n[HTML Content - shown as text]:\n{html_content}\n"
-                    except (AttributeError, UnicodeDecodeError, LookupError):
-                        pass
-                
-                # Note other content types as text
-                elif content_type.startswith("image/"):
-                    filename = part.get_filename() or "unknown"
-                    body += f"\n[Image: {filename} - {content_type}]\n"
-                
-                elif "attachment" in content_disposition:
-                    filename = part.get_filename() or "unknown"
-                    body += f"\n[Attachment: {filename} - {content_type}]\n"
+        body: List[str] = []
+        budget = MAX_BODY_TEXT
+        truncated = False
+        parts = msg.walk() if msg.is_multipart() else [msg]
         
-        else:
-            # Not multipart
-            content_type = msg.get_content_type()
+        for index, part in enumerate(parts):
+            if index >= MAX_MIME_PARTS:
+                truncated = True
+                break
             
-            if content_type == "text/plain":
-                try:
-                    payload = msg.get_payload(decode=True)
-                    charset = msg.get_content_charset() or 'utf-8'
-                    body = payload.decode(charset, errors='ignore')
-                except:
-                    body = str(msg.get_payload())
+            content_type = part.get_content_type()
+            is_attachment = "attachment" in str(part.get("Content-Disposition", ""))
             
-            elif content_type == "text/html":
-                try:
-                    payload = msg.get_payload(decode=True)
-                    charset = msg.get_content_charset() or 'utf-8'
-                    html_content = payload.decode(charset, errors='ignore')
-                    body = f"[HTML Content - shown as text]:\n{html_content}"
-                except:
-                    body = "[HTML Content - could not decode]"
+            # Plain text and HTML (shown as text) parts
+            if content_type in ("text/plain", "text/html") and not is_attachment:
+                if budget <= 0:
+                    truncated = True
+                    continue
+                text, cut = message_part_text(part, min(MAX_PART_TEXT, budget))
+                truncated = truncated or cut
+                budget -= len(text)
+                if content_type == "text/html":
+                    text = f"\n[HTML Content - shown as text]:\n{text}\n"
+                body.append(text)
+            
+            # Note other content types as text
+            elif content_type.startswith("image/"):
+                filename = part.get_filename() or "unknown"
+                body.append(f"\n[Image: {filename} - {content_type}]\n")
+            
+            elif is_attachment:
+                filename = part.get_filename() or "unknown"
+                body.append(f"\n[Attachment: {filename} - {content_type}]\n")
         
-        return body.strip()
+        if truncated:
+            body.append(TRUNCATED_NOTE)
+        return ''.join(body).strip()
     
     def test_connection(self) -> bool:
-        """Test IMAP connection"""
+        """Test IMAP connection; the session is kept in the pool for reuse"""
         try:
-            if self.use_ssl:
-                mail = imaplib.IMAP4_SSL(self.imap_server, self.imap_port, timeout=10)
-            else:
-                mail = imaplib.IMAP4(self.imap_server, self.imap_port, timeout=10)
-            
-            mail.login(self.username, self.password)
-            mail.logout()
+            self.pool.run(lambda mail: None)
             return True
         except Exception as e:
             logger.error(f"IMAP connection test failed: {e}")
             return False
+    
+    def close(self) -> None:
+        """Log out pooled sessions"""
+        self.pool.close_all()
+
+
+def classify_send_error(error: Exception) -> Tuple[bool, str]:
+    """
+    Decide whether a failed send is worth retrying
+    
+    Returns:
+        (permanent, error text); permanent errors carry the server's reply
+    """
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        replies = error.recipients.values()
+        text = "; ".join(f"{addr}: {code} {_reply_text(reply)}"
+                         for addr, (code, reply) in error.recipients.items())
+        return all(code >= 500 for code, _ in replies), text
+    if isinstance(error, smtplib.SMTPResponseException):
+        # SMTPSenderRefused, SMTPDataError, SMTPAuthenticationError and others
+        return error.smtp_code >= 500, f"{error.smtp_code} {_reply_text(error.smtp_error)}"
+    if isinstance(error, DeliveryUncertainError):
+        # Resending could deliver a second copy
+        return True, str(error)
+    return False, str(error)
+
+
+def _reply_text(reply: Any) -> str:
+    if isinstance(reply, bytes):
+        return reply.decode('utf-8', 'replace')
+    return str(reply)
+
+
+class OutboundMailQueue:
+    """
+    Asynchronous outbound mail queue
+    Enqueue returns a job ID at once; a bounded worker pool drains the
+    queue and retries failed sends with exponential backoff. Permanent
+    refusals (5xx replies) fail the job at once with the server's reply
+    """
+    
+    def __init__(self, send: Callable[..., bool], workers: int = 2,
+                 max_attempts: int = 5, base_delay: float = 2.0,
+                 max_delay: float = 300.0, max_jobs: int = 1000):
+        """
+        Args:
+            send: Callable taking the message kwargs; returns True on success
+                and raises (or returns False) on failure
+            workers: Number of worker threads draining the queue
+            max_attempts: Attempts before a job is marked failed
+            base_delay: Delay before the first retry, doubled for each further one
+            max_delay: Upper bound on the retry delay
+            max_jobs: Finished job records kept for status lookups
+        """
+        self._send = send
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_jobs = max_jobs
+        self.jobs: "OrderedDict[str, Dict]" = OrderedDict()  # job_id -> job record
+        self._queue: "queue.Queue[Optional[str]]" = queue.Queue()
+        self._threads: List[threading.Thread] = []
+        self._lock = threading.Lock()
+    
+    def enqueue(self, message: Dict, owner: Optional[str] = None) -> str:
+        """
+        Queue a message for sending
+        
+        Args:
+            message: Keyword arguments for the send callable
+            owner: Optional session ID allowed to look up the job
+        
+        Returns:
+            Job ID
+        """
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self.jobs[job_id] = {
+                'id': job_id,
+                'owner': owner,
+                'status': 'queued',
+                'attempts': 0,
+                'error': None,
+                'created_at': now,
+                'updated_at': now,
+                'next_attempt_at': None,
+                'message': message,
+            }
+            self._prune()
+            self._start_workers()
+        self._queue.put(job_id)
+        return job_id
+    
+    def get_status(self, job_id: str) -> Optional[Dict]:
+        """Get a job's status (without the message itself)"""
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            return {key: value for key, value in job.items() if key != 'message'}
+    
+    def get_stats(self) -> Dict[str, int]:
+        """Count jobs by status"""
+        counts: Dict[str, int] = {}
+        with self._lock:
+            for job in self.jobs.values():
+                counts[job['status']] = counts.get(job['status'], 0) + 1
+        counts['pending'] = self._queue.qsize()
+        return counts
+    
+    def shutdown(self) -> None:
+        """Stop the workers after the jobs already queued"""
+        with self._lock:
+            threads, self._threads = self._threads, []
+        for _ in threads:
+            self._queue.put(None)
+        for thread in threads:
+            thread.join()
+    
+    def _start_workers(self) -> None:
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(target=self._work, name="outbound-mail", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+    
+    def _work(self) -> None:
+        while True:
+            job_id = self._queue.get()
+            if job_id is None:
+                return
+            
+            with self._lock:
+                job = self.jobs.get(job_id)
+                if job is None:
+                    continue
+                job['status'] = 'sending'
+                job['attempts'] += 1
+                job['updated_at'] = time.time()
+                message = job['message']
+            
+            permanent = False
+            try:
+                sent = self._send(**message)
+                error = None if sent else "Send failed"
+            except Exception as e:
+                sent = False
+                permanent, error = classify_send_error(e)
+            
+            with self._lock:
+                job['updated_at'] = time.time()
+                job['error'] = error
+                if sent:
+                    job['status'] = 'sent'
+                    job['message'] = None
+                elif permanent:
+                    job['status'] = 'failed'
+                    job['message'] = None
+                    logger.error(f"Outbound job {job_id} refused: {error}")
+                elif job['attempts'] >= self.max_attempts:
+                    job['status'] = 'failed'
+                    job['message'] = None
+                    logger.error(f"Giving up on outbound job {job_id} after {job['attempts']} attempts")
+                else:
+                    delay = min(self.max_delay, self.base_delay * 2 ** (job['attempts'] - 1))
+                    job['status'] = 'retrying'
+                    job['next_attempt_at'] = job['updated_at'] + delay
+                    timer = threading.Timer(delay, self._queue.put, (job_id,))
+                    timer.daemon = True
+                    timer.start()
+    
+    def _prune(self) -> None:
+        """Drop the oldest finished jobs beyond max_jobs"""
+        excess = len(self.jobs) - self.max_jobs
+        if excess <= 0:
+            return
+        finished = [job_id for job_id, job in self.jobs.items()
+                    if job['status'] in ('sent', 'failed')]
+        for job_id in finished[:excess]:
+            del self.jobs[job_id]
+
+
+class IMAPIdleListener:
+    """
+    Background IMAP IDLE receiver for one account
+    Holds a single persistent session and syncs as soon as the server
+    signals EXISTS, reconnecting with exponential backoff
+    """
+    
+    IDLE_REFRESH = 29 * 60  # RFC 2177: re-issue IDLE before the 30 minute server timeout
+    
+    def __init__(self, transport: IMAPTransport, on_emails: Callable[[List[Dict]], Any],
+                 folder: str = 'INBOX', max_backoff: float = 300.0,
+                 poll_interval: float = 60.0, inbox: Optional[str] = None):
+        """
+        Args:
+            transport: Account to listen on
+            on_emails: Called with each non-empty batch of new emails
+            folder: Folder to watch
+            max_backoff: Upper bound on the reconnect delay
+            poll_interval: Sync interval for servers without IDLE support
+            inbox: Recipient inbox whose sync cursor the listener advances
+        """
+        self.transport = transport
+        self.on_emails = on_emails
+        self.folder = folder
+        self.inbox = inbox
+        self.max_backoff = max_backoff
+        self.poll_interval = poll_interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._session: Optional[imaplib.IMAP4] = None
+    
+    def start(self) -> None:
+        """Start listening in a background thread"""
+        if self.is_running():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="imap-idle", daemon=True)
+        self._thread.start()
+    
+    def stop(self) -> None:
+        """Stop listening and close the session"""
+        self._stop.set()
+        session = self._session
+        if session is not None:
+            try:
+                # Unblocks a readline waiting on the server
+                session.shutdown()
+            except Exception:
+                pass
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=5)
+    
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+    
+    def _run(self) -> None:
+        backoff = 1.0
+        while not self._stop.is_set():
+            try:
+                self._session = self.transport._connect()
+                self._deliver(self.transport._sync(self._session, self.folder, None, self.inbox))
+                while not self._stop.is_set():
+                    if 'IDLE' in self._session.capabilities:
+                        changed = self._idle(self._session)
+                    else:
+                        changed = not self._stop.wait(self.poll_interval)
+                    backoff = 1.0
+                    if changed:
+                        self._deliver(self.transport._sync(self._session, self.folder, None, self.inbox))
+            except Exception as e:
+                if not self._stop.is_set():
+                    logger.warning(f"IMAP IDLE session for {self.folder} failed: {e}")
+            finally:
+                self._close_session()
+            
+            if self._stop.wait(backoff):
+                break
+            backoff = min(backoff * 2, self.max_backoff)
+    
+    def _idle(self, session: imaplib.IMAP4) -> bool:
+        """
+        Run one IDLE command
+        Returns True when the server reported new messages
+        """
+        # imaplib has no IDLE support before Python 3.14
+        tag = session._new_tag()
+        session.send(tag + b' IDLE\r\n')
+        if not session.readline().startswith(b'+'):
+            raise imaplib.IMAP4.error("Server rejected IDLE")
+        
+        got_exists = False
+        # Wait with select rather than a socket timeout: a timed out read
+        # poisons imaplib's buffered reader for the rest of the session
+        deadline = time.monotonic() + self.IDLE_REFRESH
+        while not self._stop.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not self._readable(session, remaining):
+                break
+            line = session.readline()
+            if not line:
+                raise imaplib.IMAP4.abort("Connection closed during IDLE")
+            if EXISTS_PATTERN.match(line):
+                got_exists = True
+                break
+        
+        session.send(b'DONE\r\n')
+        while True:
+            line = session.readline()
+            if not line:
+                raise imaplib.IMAP4.abort("Connection closed ending IDLE")
+            if line.startswith(tag):
+                break
+        return got_exists
+    
+    def _readable(self, session: imaplib.IMAP4, timeout: float) -> bool:
+        """Wait up to timeout for a response line, counting already buffered data"""
+        sock = session.sock
+        sock.setblocking(False)
+        try:
+            if session.file.peek(1):
+                return True
+        except (BlockingIOError, ssl.SSLWantReadError):
+            pass
+        finally:
+            sock.settimeout(self.transport.timeout)
+        return bool(select.select([sock], [], [], timeout)[0])
+    
+    def _deliver(self, emails: List[Dict]) -> None:
+        if emails:
+            try:
+                self.on_emails(emails)
+            except Exception as e:
+                logger.error(f"Failed to deliver pushed emails: {e}")
+    
+    def _close_session(self) -> None:
+        session, self._session = self._session, None
+        if session is not None:
+            try:
+                session.logout()
+            except Exception:
+                pass
+
+
+def parse_email_message(msg: email.message.Message) -> Optional[Dict]:
+    """Parse a message from any source (IMAP, mbox, SMTP) into an email dict"""
+    return IMAPTransport._parse_email_message(msg)
+
+
+DEFAULT_ACCOUNT = 'default'
 
 
 class EmailTransportManager:
     """
-    Manage SMTP and IMAP transports
+    Manage SMTP and IMAP transports for any number of accounts
     Provides unified interface for sending/receiving emails
+    The smtp_transport/imap_transport attributes refer to the default account
     """
     
-    def __init__(self):
-        self.smtp_transport: Optional[SMTPTransport] = None
-        self.imap_transport: Optional[IMAPTransport] = None
+    def __init__(self, max_active_connections: int = 16, max_concurrent_syncs: int = 8):
+        """
+        Args:
+            max_active_connections: Global cap on sessions in use across all accounts
+            max_concurrent_syncs: Accounts synced in parallel by sync_all
+        """
+        self.accounts: Dict[str, Dict[str, Any]] = {}  # name -> {'smtp': ..., 'imap': ...}
+        self.active_slots = threading.BoundedSemaphore(max_active_connections)
+        self.max_concurrent_syncs = max_concurrent_syncs
+        self.outbound = OutboundMailQueue(self._deliver)
+        self.idle_listener: Optional[IMAPIdleListener] = None
+    
+    @property
+    def smtp_transport(self) -> Optional[SMTPTransport]:
+        return self.get_transport('smtp')
+    
+    @smtp_transport.setter
+    def smtp_transport(self, transport: Optional[SMTPTransport]) -> None:
+        self.accounts.setdefault(DEFAULT_ACCOUNT, {})['smtp'] = transport
+    
+    @property
+    def imap_transport(self) -> Optional[IMAPTransport]:
+        return self.get_transport('imap')
+    
+    @imap_transport.setter
+    def imap_transport(self, transport: Optional[IMAPTransport]) -> None:
+        self.accounts.setdefault(DEFAULT_ACCOUNT, {})['imap'] = transport
+    
+    def get_transport(self, kind: str, account: str = DEFAULT_ACCOUNT) -> Any:
+        """Get an account's 'smtp' or 'imap' transport"""
+        return self.accounts.get(account, {}).get(kind)
+    
+    def list_accounts(self) -> List[str]:
+        """Names of configured accounts"""
+        return list(self.accounts)
     
     def configure_smtp(self, smtp_server: str, smtp_port: int, username: str, 
-                      password: str, use_tls: bool = True) -> bool:
+                      password: str, use_tls: bool = True,
+                      account: str = DEFAULT_ACCOUNT) -> bool:
         """Configure SMTP transport"""
         try:
-            self.smtp_transport = SMTPTransport(
-                smtp_server, smtp_port, username, password, use_tls
+            previous = self.get_transport('smtp', account)
+            if previous:
+                previous.close()
+            transport = SMTPTransport(
+                smtp_server, smtp_port, username, password, use_tls,
+                active_slots=self.active_slots,
+                breaker=self._reuse_breaker(previous, smtp_server, smtp_port)
             )
-            return self.smtp_transport.test_connection()
+            self.accounts.setdefault(account, {})['smtp'] = transport
+            health_monitor.register(f"{account}:smtp", transport.pool.probe, transport.breaker)
+            tor_pool.keep_warm('smtp', smtp_server, smtp_port)
+            return transport.test_connection()
         except Exception as e:
             logger.error(f"Failed to configure SMTP: {e}")
             return False
     
     def configure_imap(self, imap_server: str, imap_port: int, username: str, 
-                      password: str, use_ssl: bool = True) -> bool:
+                      password: str, use_ssl: bool = True,
+                      account: str = DEFAULT_ACCOUNT) -> bool:
         """Configure IMAP transport"""
         try:
-            self.imap_transport = IMAPTransport(
-                imap_server, imap_port, username, password, use_ssl
+            previous = self.get_transport('imap', account)
+            if previous:
+                if self.idle_listener and self.idle_listener.transport is previous:
+                    self.stop_push()
+                previous.close()
+            transport = IMAPTransport(
+                imap_server, imap_port, username, password, use_ssl,
+                active_slots=self.active_slots,
+                breaker=self._reuse_breaker(previous, imap_server, imap_port)
             )
-            return self.imap_transport.test_connection()
+            self.accounts.setdefault(account, {})['imap'] = transport
+            health_monitor.register(f"{account}:imap", transport.pool.probe, transport.breaker)
+            tor_pool.keep_warm('imap', imap_server, imap_port)
+            return transport.test_connection()
         except Exception as e:
             logger.error(f"Failed to configure IMAP: {e}")
             return False
     
+    @staticmethod
+    def _reuse_breaker(previous: Any, server: str, port: int) -> Optional[CircuitBreaker]:
+        """Keep circuit state when an account is reconfigured for the same server"""
+        if previous is None:
+            return None
+        endpoint = (getattr(previous, 'smtp_server', None) or getattr(previous, 'imap_server', None),
+                    getattr(previous, 'smtp_port', None) or getattr(previous, 'imap_port', None))
+        if endpoint == (server, port) and isinstance(previous.breaker, CircuitBreaker):
+            return previous.breaker
+        return None
+    
+    def remove_account(self, account: str) -> bool:
+        """Close and forget an account's transports"""
+        transports = self.accounts.pop(account, None)
+        if transports is None:
+            return False
+        for kind, transport in transports.items():
+            health_monitor.unregister(f"{account}:{kind}")
+            if transport is None:
+                continue
+            if self.idle_listener and self.idle_listener.transport is transport:
+                self.stop_push()
+            transport.close()
+        return True
+    
     def send_email(self, from_addr: str, to_addr: str, subject: str, 
-                   body: str, headers: Optional[Dict] = None) -> bool:
+                   body: str, headers: Optional[Dict] = None,
+                   account: str = DEFAULT_ACCOUNT) -> bool:
         """Send email via configured SMTP"""
-        if not self.smtp_transport:
+        transport = self.get_transport('smtp', account)
+        if not transport:
             logger.error("SMTP not configured")
             return False
         
-        return self.smtp_transport.send_email(
+        return transport.send_email(
             from_addr, to_addr, subject, body, headers
         )
     
+    def _deliver(self, from_addr: str, to_addr: str, subject: str,
+                 body: str, headers: Optional[Dict] = None,
+                 account: str = DEFAULT_ACCOUNT) -> bool:
+        """Outbound queue sender; raises so the queue can tell refusals from outages"""
+        transport = self.get_transport('smtp', account)
+        if not transport:
+            raise ConnectionError(f"SMTP not configured for account {account}")
+        transport.deliver(from_addr, to_addr, subject, body, headers)
+        return True
+    
+    def queue_email(self, from_addr: str, to_addr: str, subject: str,
+                    body: str, headers: Optional[Dict] = None,
+                    owner: Optional[str] = None,
+                    account: str = DEFAULT_ACCOUNT) -> Optional[str]:
+        """
+        Queue email for asynchronous sending via configured SMTP
+        Returns job ID, or None if SMTP is not configured
+        """
+        if not self.get_transport('smtp', account):
+            logger.error("SMTP not configured")
+            return None
+        
+        return self.outbound.enqueue({
+            'from_addr': from_addr,
+            'to_addr': to_addr,
+            'subject': subject,
+            'body': body,
+            'headers': headers,
+            'account': account,
+        }, owner=owner)
+    
+    def get_send_status(self, job_id: str) -> Optional[Dict]:
+        """Get status of a queued send"""
+        return self.outbound.get_status(job_id)
+    
     def receive_emails(self, folder: str = 'INBOX', limit: Optional[int] = None, 
                       unread_only: bool = False) -> List[Dict]:
         """Receive emails via configured IMAP"""
@@ -333,6 +1596,98 @@ class EmailTransportManager:
         
         return self.imap_transport.fetch_emails(folder, limit, unread_only)
     
+    def get_pool_stats(self) -> Dict[str, Dict]:
+        """Get connection pool statistics for configured transports"""
+        stats = {}
+        for account, transports in self.accounts.items():
+            for kind, transport in transports.items():
+                if transport is None:
+                    continue
+                # Default account keeps the plain 'smtp'/'imap' keys
+                key = kind if account == DEFAULT_ACCOUNT else f"{account}:{kind}"
+                stats[key] = transport.pool.get_stats()
+        return stats
+    
+    def sync_emails(self, folder: str = 'INBOX', limit: Optional[int] = None,
+                    account: str = DEFAULT_ACCOUNT, inbox: Optional[str] = None) -> List[Dict]:
+        """Fetch only emails the given inbox has not synced yet via configured IMAP"""
+        transport = self.get_transport('imap', account)
+        if not transport:
+            logger.error("IMAP not configured")
+            return []
+        
+        emails = transport.sync_folder(folder, limit, inbox)
+        for email_dict in emails:
+            if 'imap_ref' in email_dict:
+                email_dict['imap_ref']['account'] = account
+        return emails
+    
+    def sync_all(self, folder: str = 'INBOX', limit: Optional[int] = None,
+                 inbox: Optional[str] = None) -> Dict[str, List[Dict]]:
+        """
+        Sync every IMAP account concurrently
+        Accounts run in parallel up to max_concurrent_syncs; sessions in use are
+        bounded per account by its pool and globally by max_active_connections
+        
+        Args:
+            inbox: Recipient inbox the results go to; only mail it has not
+                synced yet is returned
+        
+        Returns:
+            Dict of account name -> new emails
+        """
+        names = [name for name, transports in self.accounts.items() if transports.get('imap')]
+        if not names:
+            logger.error("IMAP not configured")
+            return {}
+        
+        workers = min(len(names), self.max_concurrent_syncs)
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="imap-sync") as executor:
+            futures = {name: executor.submit(self.sync_emails, folder, limit, name, inbox)
+                       for name in names}
+        
+        results = {}
+        for name, future in futures.items():
+            try:
+                results[name] = future.result()
+            except Exception as e:
+                logger.error(f"Failed to sync account {name}: {e}")
+                results[name] = []
+        return results
+    
+    def load_body(self, email_dict: Dict) -> Optional[str]:
+        """Fetch the body of a header-only synced email, if it is still pending"""
+        if not email_dict.get('body_pending'):
+            return email_dict.get('body')
+        imap_ref = email_dict['imap_ref']
+        transport = self.get_transport('imap', imap_ref.get('account', DEFAULT_ACCOUNT))
+        if not transport:
+            logger.error("IMAP not configured")
+            return None
+        return transport.fetch_body(imap_ref)
+    
+    def start_push(self, on_emails: Callable[[List[Dict]], Any],
+                   folder: str = 'INBOX', inbox: Optional[str] = None) -> bool:
+        """Start an IMAP IDLE listener delivering new emails for inbox to on_emails"""
+        if not self.imap_transport:
+            logger.error("IMAP not configured")
+            return False
+        
+        self.stop_push()
+        self.idle_listener = IMAPIdleListener(self.imap_transport, on_emails, folder, inbox=inbox)
+        self.idle_listener.start()
+        return True
+    
+    def stop_push(self) -> None:
+        """Stop the IMAP IDLE listener if one is running"""
+        if self.idle_listener:
+            self.idle_listener.stop()
+            self.idle_listener = None
+    
+    def get_health(self) -> Dict[str, Dict]:
+        """Cached endpoint health and circuit state, without contacting any server"""
+        return health_monitor.get_health()
+    
     def is_configured(self) -> Dict[str, bool]:
         """Check configuration status"""
         return {
@@ -341,5 +1696,8 @@ class EmailTransportManager:
         }
 
 
+# Global background keepalive for connection pools
+pool_reaper = PoolReaper()
+
 # Global transport manager
 transport_manager = EmailTransportManager()
@@ -16,13 +16,14 @@ from stem.control import Controller
 from stem import SocketError
 from app_factory import create_app
 from utils import id_generator
+from smtp_ingress import smtp_ingress
 
 # Configure logging
 log = logging.getLogger('werkzeug')
 log.setLevel(logging.ERROR)
 
 
-def setup_tor_configuration():
+def setup_tor_configuration(ports=None):
     """Setup Tor hidden service configuration"""
     try:
         with Controller.from_port(port=9051) as controller:
@@ -31,7 +32,7 @@ def setup_tor_configuration():
             # Create ephemeral hidden service
             print('[*] Creating ephemeral hidden service, this may take a minute or two')
             result = controller.create_ephemeral_hidden_service(
-                {80: 5000}, await_publication=True
+                ports or {80: 5000}, await_publication=True
             )
             
             if result.service_id:
@@ -51,6 +52,18 @@ def setup_tor_configuration():
         return "localhost", None
 
 
+def start_mail_ingress():
+    """Start the burner SMTP listener if OPSECHAT_SMTP_INGRESS is set; returns its port"""
+    try:
+        port = smtp_ingress.start_if_enabled()
+    except OSError as e:
+        print(f"[!] Could not start SMTP ingress: {e}")
+        return None
+    if port:
+        print(f"[*] Accepting burner mail on {smtp_ingress.host}:{port}")
+    return port
+
+
 def main():
     """Main application entry point"""
     # Create Flask application using factory pattern
@@ -58,6 +71,7 @@ def main():
     
     # Generate random path for security
     path = id_generator(size=32)
+    ingress_port = start_mail_ingress()
     
     # Check for test mode
     if len(sys.argv) > 1 and sys.argv[1] == "test":
@@ -70,7 +84,11 @@ def main():
         return
     
     # Production mode with Tor
-    hostname, service_id = setup_tor_configuration()
+    ports = {80: 5000}
+    if ingress_port:
+        # Burner mail reaches the ingress listener through the same onion
+        ports[25] = ingress_port
+    hostname, service_id = setup_tor_configuration(ports)
     
     # Configure application
     app.config['path'] = path
@@ -83,6 +101,7 @@ def main():
     try:
         app.run(host='0.0.0.0', port=5000, debug=False, threaded=True)
     finally:
+        smtp_ingress.stop()
         if service_id:
             print(" * Shutting down our hidden service")
             try:
@@ -0,0 +1,426 @@
+"""
+Local SMTP ingress for opsechat burner addresses
+Accepts inbound mail over an embedded asyncio SMTP listener and delivers it
+straight into the owning user's inbox
+"""
+import os
+import sys
+import time
+import asyncio
+import logging
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from email.parser import BytesFeedParser
+from email.policy import compat32
+from typing import Dict, List, Optional, Tuple
+
+from email_system import EmailStorage, BurnerEmailManager, email_storage, burner_manager
+from email_transport import parse_email_message
+
+logger = logging.getLogger(__name__)
+
+MAX_LINE_LENGTH = 1000 * 8  # RFC 5321 limit is 1000; leave room for long headers
+MAX_MESSAGE_SIZE = 10 * 1024 * 1024
+MAX_RECIPIENTS = 100
+MAX_SESSIONS = 1000
+SESSION_TIMEOUT = 300  # Seconds to wait for the next command
+DELIVERY_WORKERS = 4  # Threads parsing and storing accepted messages off the event loop
+
+
+class SMTPIngressServer:
+    """
+    Minimal asyncio SMTP server delivering to burner inboxes
+    Recipients are resolved at RCPT time, so unknown or expired burners are
+    rejected before any message data is transferred
+    """
+    
+    def __init__(self, storage: EmailStorage, burners: BurnerEmailManager,
+                 host: str = '127.0.0.1', port: int = 2525, hostname: str = 'opsechat.local',
+                 max_message_size: int = MAX_MESSAGE_SIZE,
+                 max_sessions: int = MAX_SESSIONS, enabled: bool = True):
+        """
+        Args:
+            storage: Inbox storage that accepted messages are added to
+            burners: Burner manager used to resolve recipients
+            host: Address to listen on
+            port: Port to listen on (0 picks a free port)
+            hostname: Name announced in the greeting
+            max_message_size: Messages larger than this are rejected
+            max_sessions: Concurrent sessions before new ones get 421
+            enabled: Whether start_if_enabled should start listening
+        """
+        self.storage = storage
+        self.burners = burners
+        self.host = host
+        self.port = port
+        self.hostname = hostname
+        self.max_message_size = max_message_size
+        self.max_sessions = max_sessions
+        self.enabled = enabled
+        self.active_sessions = 0
+        self.stats = {
+            'sessions': 0,
+            'sessions_refused': 0,
+            'messages_accepted': 0,
+            'messages_rejected': 0,
+            'deliveries': 0,
+            'recipients_rejected': 0,
+            'bytes_received': 0,
+        }
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._server = None
+        self._thread: Optional[threading.Thread] = None
+        # Parsing and storing compress up to max_message_size under a per-user lock
+        self._delivery_pool = ThreadPoolExecutor(max_workers=DELIVERY_WORKERS,
+                                                 thread_name_prefix="smtp-deliver")
+    
+    def start_if_enabled(self) -> Optional[int]:
+        """Start listening if ingress is enabled; returns the bound port or None"""
+        if not self.enabled:
+            return None
+        return self.start()
+    
+    def start(self) -> int:
+        """Start listening on a background thread; returns the bound port"""
+        if self.is_running():
+            return self.port
+        
+        ready = threading.Event()
+        errors: List[BaseException] = []
+        
+        def run():
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+            try:
+                self._server = self._loop.run_until_complete(
+                    asyncio.start_server(self._handle, self.host, self.port,
+                                         limit=MAX_LINE_LENGTH)
+                )
+                self.port = self._server.sockets[0].getsockname()[1]
+            except BaseException as e:
+                errors.append(e)
+                ready.set()
+                self._loop.close()
+                return
+            ready.set()
+            try:
+                self._loop.run_forever()
+            finally:
+                self._server.close()
+                self._loop.run_until_complete(self._server.wait_closed())
+                self._loop.close()
+        
+        self._thread = threading.Thread(target=run, daemon=True, name="smtp-ingress")
+        self._thread.start()
+        ready.wait()
+        if errors:
+            self._thread = None
+            raise errors[0]
+        
+        logger.info(f"SMTP ingress listening on {self.host}:{self.port}")
+        return self.port
+    
+    def stop(self) -> None:
+        """Stop listening and wait for the server thread to exit"""
+        if not self.is_running():
+            return
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
+        self._thread = None
+    
+    def is_running(self) -> bool:
+        return bool(self._thread and self._thread.is_alive())
+    
+    def get_stats(self) -> Dict[str, int]:
+        """Get ingress counters"""
+        stats = dict(self.stats)
+        stats['active_sessions'] = self.active_sessions
+        return stats
+    
+    def resolve_recipient(self, address: str) -> Optional[str]:
+        """Map a recipient address to the user owning that burner"""
+        return (self.burners.get_user_for_burner(address)
+                or self.burners.get_user_for_burner(address.lower()))
+    
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Run one SMTP session"""
+        if self.active_sessions >= self.max_sessions:
+            self.stats['sessions_refused'] += 1
+            writer.write(b"421 Too many connections, try again later\r\n")
+            await self._close(writer)
+            return
+        
+        self.active_sessions += 1
+        self.stats['sessions'] += 1
+        try:
+            await self._session(reader, writer)
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except ValueError:
+            writer.write(b"500 Line too long\r\n")
+        except Exception:
+            logger.exception("SMTP ingress session failed")
+        finally:
+            self.active_sessions -= 1
+            await self._close(writer)
+    
+    async def _session(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        sender = None
+        recipients: Dict[str, str] = {}  # address -> user_id
+        
+        def reply(line: str) -> None:
+            writer.write(line.encode() + b"\r\n")
+        
+        reply(f"220 {self.hostname} ESMTP ready")
+        await writer.drain()
+        
+        while True:
+            line = await asyncio.wait_for(reader.readline(), SESSION_TIMEOUT)
+            if not line:
+                return
+            command, _, argument = line.decode('utf-8', 'replace').strip().partition(' ')
+            command = command.upper()
+            
+            if command == 'EHLO':
+                sender, recipients = None, {}
+                reply(f"250-{self.hostname}")
+                reply(f"250-SIZE {self.max_message_size}")
+                reply("250-8BITMIME")
+                reply("250 PIPELINING")
+            elif command == 'HELO':
+                sender, recipients = None, {}
+                reply(f"250 {self.hostname}")
+            elif command == 'MAIL':
+                address, params = _parse_path(argument, 'FROM:')
+                size = params.get('SIZE', '0')
+                if address is None:
+                    reply("501 Syntax: MAIL FROM:<address>")
+                elif size.isdigit() and int(size) > self.max_message_size:
+                    reply("552 Message size exceeds fixed maximum message size")
+                else:
+                    sender, recipients = address, {}
+                    reply("250 OK")
+            elif command == 'RCPT':
+                address, _ = _parse_path(argument, 'TO:')
+                if sender is None:
+                    reply("503 Need MAIL before RCPT")
+                elif not address:
+                    reply("501 Syntax: RCPT TO:<address>")
+                elif len(recipients) >= MAX_RECIPIENTS:
+                    reply("452 Too many recipients")
+                else:
+                    user_id = self.resolve_recipient(address)
+                    if user_id is None:
+                        self.stats['recipients_rejected'] += 1
+                        reply("550 No such mailbox")
+                    else:
+                        recipients[address] = user_id
+                        reply("250 OK")
+            elif command == 'DATA':
+                if not recipients:
+                    reply("503 Need RCPT before DATA")
+                else:
+                    reply("354 End data with <CR><LF>.<CR><LF>")
+                    await writer.drain()
+                    reply(await self._receive(reader, recipients))
+                    sender, recipients = None, {}
+            elif command == 'RSET':
+                sender, recipients = None, {}
+                reply("250 OK")
+            elif command == 'NOOP':
+                reply("250 OK")
+            elif command == 'QUIT':
+                reply("221 Bye")
+                await writer.drain()
+                return
+            else:
+                reply("502 Command not implemented")
+            
+            await writer.drain()
+    
+    async def _receive(self, reader: asyncio.StreamReader, recipients: Dict[str, str]) -> str:
+        """Stream message data into a parser and deliver it; returns the reply line"""
+        parser = BytesFeedParser(policy=compat32)
+        size = 0
+        
+        while True:
+            line = await asyncio.wait_for(reader.readline(), SESSION_TIMEOUT)
+            if not line:
+                raise asyncio.IncompleteReadError(b'', None)
+            if line in (b".\r\n", b".\n"):
+                break
+            if line.startswith(b"."):
+                line = line[1:]
+            size += len(line)
+            if size <= self.max_message_size:
+                parser.feed(line)
+        
+        self.stats['bytes_received'] += size
+        message = parser.close()
+        if size > self.max_message_size:
+            self.stats['messages_rejected'] += 1
+            return "552 Message size exceeds fixed maximum message size"
+        
+        delivered = await asyncio.get_running_loop().run_in_executor(
+            self._delivery_pool, self._deliver, message, recipients)
+        if delivered is None:
+            self.stats['messages_rejected'] += 1
+            return "554 Transaction failed"
+        
+        self.stats['messages_accepted'] += 1
+        self.stats['deliveries'] += delivered
+        return "250 OK"
+    
+    def _deliver(self, message, recipients: Dict[str, str]) -> Optional[int]:
+        """
+        Add one copy per owning user; runs on the delivery pool
+        
+        Returns:
+            Number of inboxes updated, or None if the message could not be parsed
+        """
+        email_dict = parse_email_message(message)
+        if not email_dict:
+            return None
+        
+        delivered = 0
+        users = {}
+        for address, user_id in recipients.items():
+            users.setdefault(user_id, address)
+        
+        for user_id, address in users.items():
+            copy = dict(email_dict)
+            copy['delivered_to'] = address
+            if self.storage.add_email(user_id, copy):
+                delivered += 1
+        return delivered
+    
+    @staticmethod
+    async def _close(writer: asyncio.StreamWriter) -> None:
+        try:
+            await writer.drain()
+            writer.close()
+            await writer.wait_closed()
+        except (ConnectionError, OSError):
+            pass
+
+
+def _parse_path(argument: str, prefix: str) -> Tuple[Optional[str], Dict[str, str]]:
+    """Parse 'FROM:<addr> PARAM=value' into the address and ESMTP parameters"""
+    if not argument.upper().startswith(prefix):
+        return None, {}
+    path, _, rest = argument[len(prefix):].strip().partition(' ')
+    if not (path.startswith('<') and path.endswith('>')):
+        return None, {}
+    
+    params = {}
+    for param in rest.split():
+        key, _, value = param.partition('=')
+        params[key.upper()] = value
+    return path[1:-1], params
+
+
+async def _load_client(host: str, port: int, sender: str, recipients: List[str],
+                       count: int, body: bytes, results: Dict[str, int]) -> None:
+    """Send count messages over one SMTP session"""
+    reader, writer = await asyncio.open_connection(host, port)
+    
+    async def command(line: Optional[bytes], expected: bytes) -> bool:
+        if line is not None:
+            writer.write(line + b"\r\n")
+            await writer.drain()
+        response = await reader.readline()
+        while response[3:4] == b'-':
+            response = await reader.readline()
+        return response.startswith(expected)
+    
+    try:
+        await command(None, b'220')
+        await command(b"EHLO loadgen", b'250')
+        for i in range(count):
+            recipient = recipients[i % len(recipients)]
+            ok = (await command(f"MAIL FROM:<{sender}>".encode(), b'250')
+                  and await command(f"RCPT TO:<{recipient}>".encode(), b'250')
+                  and await command(b"DATA", b'354'))
+            if ok:
+                message = (f"From: {sender}\r\nTo: {recipient}\r\n"
+                           f"Subject: load {i}\r\n\r\n").encode() + body
+                ok = await command(message + b"\r\n.", b'250')
+            else:
+                await command(b"RSET", b'250')
+            results['sent' if ok else 'failed'] += 1
+        await command(b"QUIT", b'221')
+    finally:
+        writer.close()
+
+
+def run_load(host: str, port: int, recipients: List[str], messages: int = 1000,
+             concurrency: int = 100, size: int = 1024) -> Dict[str, float]:
+    """
+    Load generator: send messages over concurrent SMTP sessions
+    
+    Returns:
+        Dict with sent, failed, seconds and msgs_per_sec
+    """
+    results = {'sent': 0, 'failed': 0}
+    body = b'x' * size
+    per_session = [messages // concurrency + (1 if i < messages % concurrency else 0)
+                   for i in range(concurrency)]
+    
+    async def run():
+        await asyncio.gather(*(
+            _load_client(host, port, 'loadgen@example.com', recipients, count, body, results)
+            for count in per_session if count
+        ), return_exceptions=True)
+    
+    start = time.perf_counter()
+    asyncio.run(run())
+    seconds = time.perf_counter() - start
+    
+    results['failed'] += messages - results['sent'] - results['failed']
+    return {
+        'sent': results['sent'],
+        'failed': results['failed'],
+        'seconds': round(seconds, 3),
+        'msgs_per_sec': round(results['sent'] / seconds, 1) if seconds else 0.0,
+    }
+
+
+def main() -> int:
+    """Benchmark the ingress server in-process against fresh burner addresses"""
+    parser = argparse.ArgumentParser(description="SMTP ingress load generator")
+    parser.add_argument('--messages', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=200)
+    parser.add_argument('--size', type=int, default=1024, help="Body size in bytes")
+    parser.add_argument('--burners', type=int, default=50)
+    args = parser.parse_args()
+    
+    storage = EmailStorage()
+    burners = BurnerEmailManager()
+    recipients = [burners.generate_burner_email(f"user{i}") for i in range(args.burners)]
+    
+    server = SMTPIngressServer(storage, burners, port=0)
+    port = server.start()
+    try:
+        result = run_load('127.0.0.1', port, recipients, args.messages,
+                          args.concurrency, args.size)
+    finally:
+        server.stop()
+    
+    print(f"Sent {result['sent']} messages ({result['failed']} failed) "
+          f"in {result['seconds']}s: {result['msgs_per_sec']} msgs/sec")
+    print(f"Server stats: {server.get_stats()}")
+    return 0 if result['failed'] == 0 else 1
+
+
+# Global ingress server (off unless OPSECHAT_SMTP_INGRESS=true)
+smtp_ingress = SMTPIngressServer(
+    email_storage, burner_manager,
+    host=os.environ.get('OPSECHAT_SMTP_INGRESS_HOST', '127.0.0.1'),
+    port=int(os.environ.get('OPSECHAT_SMTP_INGRESS_PORT', '2525')),
+    enabled=os.environ.get('OPSECHAT_SMTP_INGRESS', 'false').lower() == 'true',
+)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,140 @@
+"""
+Tests for circuit breakers and endpoint health monitoring
+"""
+import time
+import pytest
+from unittest.mock import Mock, patch
+import requests
+from circuit_breaker import (
+    CircuitBreaker, CircuitOpenError, HealthMonitor, CLOSED, OPEN, HALF_OPEN
+)
+from domain_manager import PorkbunAPIClient
+from email_transport import ConnectionPool
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+    
+    def __call__(self):
+        return self.now
+
+
+class TestCircuitBreaker:
+    """Test closed/open/half-open transitions"""
+    
+    def test_opens_after_threshold(self):
+        breaker = CircuitBreaker("smtp", failure_threshold=2, clock=FakeClock())
+        failing = Mock(side_effect=ConnectionError("refused"))
+        
+        for _ in range(2):
+            with pytest.raises(ConnectionError):
+                breaker.call(failing)
+        
+        assert breaker.state == OPEN
+        with pytest.raises(CircuitOpenError):
+            breaker.call(failing)
+        assert failing.call_count == 2
+    
+    def test_half_open_trial(self):
+        clock = FakeClock()
+        breaker = CircuitBreaker("imap", failure_threshold=1, reset_timeout=10, clock=clock)
+        breaker.record_failure("down")
+        
+        clock.now = 10
+        assert breaker.allow() is True
+        assert breaker.state == HALF_OPEN
+        # Only one trial at a time
+        assert breaker.allow() is False
+        
+        breaker.record_success()
+        assert breaker.state == CLOSED
+    
+    def test_failed_trial_reopens(self):
+        clock = FakeClock()
+        breaker = CircuitBreaker("imap", failure_threshold=1, reset_timeout=10, clock=clock)
+        breaker.record_failure("down")
+        clock.now = 10
+        
+        with pytest.raises(OSError):
+            breaker.call(Mock(side_effect=OSError("timeout")))
+        
+        assert breaker.state == OPEN
+        assert breaker.retry_after() == 10
+    
+    def test_ignored_errors_do_not_count(self):
+        breaker = CircuitBreaker("smtp", failure_threshold=1)
+        
+        with pytest.raises(ValueError):
+            breaker.call(Mock(side_effect=ValueError), failure_types=(OSError,))
+        with pytest.raises(TimeoutError):
+            breaker.call(Mock(side_effect=TimeoutError), failure_types=(OSError,),
+                         ignore_types=(TimeoutError,))
+        
+        assert breaker.state == CLOSED
+    
+    def test_pool_fails_fast_when_server_down(self):
+        breaker = CircuitBreaker("smtp", failure_threshold=2)
+        connect = Mock(side_effect=ConnectionRefusedError("refused"))
+        pool = ConnectionPool(connect, Mock(), Mock(), breaker=breaker)
+        
+        for _ in range(2):
+            with pytest.raises(ConnectionRefusedError):
+                pool.run(lambda s: None)
+        
+        start = time.perf_counter()
+        with pytest.raises(CircuitOpenError):
+            pool.run(lambda s: None)
+        assert time.perf_counter() - start < 0.01
+        assert connect.call_count == 2
+
+
+class TestHealthMonitor:
+    """Test cached health and background probes"""
+    
+    def test_check_caches_result_and_closes_breaker(self):
+        monitor = HealthMonitor()
+        breaker = CircuitBreaker("smtp", failure_threshold=1)
+        breaker.record_failure("down")
+        with patch.object(monitor, 'start'):
+            monitor.register("default:smtp", lambda: True, breaker)
+        
+        assert monitor.get_health()["default:smtp"]["healthy"] is None
+        monitor.check("default:smtp")
+        
+        health = monitor.get_health()["default:smtp"]
+        assert health["healthy"] is True
+        assert health["circuit"]["state"] == CLOSED
+    
+    def test_background_probe_records_failure(self):
+        monitor = HealthMonitor(tick=0.01)
+        breaker = CircuitBreaker("imap", failure_threshold=1, reset_timeout=60)
+        monitor.register("default:imap", Mock(side_effect=OSError("unreachable")), breaker)
+        try:
+            deadline = time.time() + 2
+            while monitor.get_health()["default:imap"]["healthy"] is None and time.time() < deadline:
+                time.sleep(0.01)
+        finally:
+            monitor.stop()
+        
+        health = monitor.get_health()["default:imap"]
+        assert health["healthy"] is False
+        assert health["error"] == "unreachable"
+        assert breaker.state == OPEN
+
+
+class TestRegistrarBreaker:
+    """Test registrar calls fail fast while the API is unreachable"""
+    
+    @patch('domain_manager.requests.Session')
+    def test_search_fails_fast(self, mock_session_class):
+        mock_session = Mock()
+        mock_session.post.side_effect = requests.ConnectionError("unreachable")
+        mock_session_class.return_value = mock_session
+        
+        client = PorkbunAPIClient("key", "secret")
+        for _ in range(4):
+            assert client.search_domain("test.xyz")["available"] is False
+        
+        assert mock_session.post.call_count == 3
+        assert client.breaker.state == OPEN
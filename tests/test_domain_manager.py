@@ -1,10 +1,12 @@
 """
 Tests for domain management module
 """
+import threading
+import time
 import pytest
 from unittest.mock import Mock, patch
 from domain_manager import (
-    DomainAPIClient, PorkbunAPIClient, DomainRotationManager
+    DomainAPIClient, PorkbunAPIClient, DomainRotationManager, TTLCache
 )
 
 
@@ -76,6 +78,61 @@ class TestPorkbunAPIClient:
         assert result["registration"] == "9.99"
 
 
+class TestRegistrarCache:
+    """Test caching of registrar pricing and availability"""
+    
+    def test_ttl_cache_expiry_and_bounds(self):
+        now = [0.0]
+        cache = TTLCache(max_entries=2, clock=lambda: now[0])
+        cache.set("a", 1, ttl=10)
+        cache.set("b", 2, ttl=100)
+        
+        assert cache.get("a") == 1
+        cache.set("c", 3, ttl=100)  # Evicts b, the least recently used
+        assert cache.get("b") is None
+        
+        now[0] = 50
+        assert cache.get("a") is None
+        assert cache.get("c") == 3
+        assert cache.get_stats() == {'entries': 1, 'hits': 2, 'misses': 2}
+    
+    @patch('domain_manager.requests.Session')
+    def test_availability_cached(self, mock_session_class):
+        mock_session = mock_session_class.return_value
+        mock_session.post.return_value.json.side_effect = [
+            {"status": "SUCCESS", "isAvailable": False},
+            {"status": "ERROR", "message": "rate limited"},
+            {"status": "ERROR", "message": "rate limited"},
+        ]
+        client = PorkbunAPIClient("test_key", "test_secret")
+        
+        assert client.search_domain("Taken.xyz")["available"] is False
+        assert client.search_domain("taken.xyz")["available"] is False
+        # Errors are not cached
+        client.search_domain("other.xyz")
+        client.search_domain("other.xyz")
+        
+        assert mock_session.post.call_count == 3
+        assert client.get_cache_stats()["availability"]["hits"] == 1
+    
+    @patch('domain_manager.requests.Session')
+    def test_seed_pricing(self, mock_session_class):
+        mock_session = mock_session_class.return_value
+        mock_session.post.return_value.json.return_value = {
+            "status": "SUCCESS",
+            "pricing": {
+                "xyz": {"registration": "1.50", "renewal": "11.00", "transfer": "11.00"},
+                "club": {"registration": "2.10", "renewal": "14.00", "transfer": "14.00"},
+            }
+        }
+        client = PorkbunAPIClient("test_key", "test_secret")
+        
+        assert client.seed_pricing() == 2
+        assert client.get_pricing("club")["registration"] == "2.10"
+        assert client.get_pricing("xyz")["renewal"] == "11.00"
+        assert mock_session.post.call_count == 1
+
+
 class TestDomainRotationManager:
     """Test domain rotation manager"""
     
@@ -113,6 +170,53 @@ class TestDomainRotationManager:
         assert result["domain"].endswith((".xyz", ".club", ".online", ".site", ".website"))
         assert result["price"] <= 5.0
     
+    def test_find_cheap_available_domain_concurrent(self):
+        """Test candidates are checked in parallel and the rest cancelled"""
+        workers = 4
+        # Only passable if all workers are searching at the same time
+        barrier = threading.Barrier(workers)
+        released = threading.Event()
+        calls = []
+        lock = threading.Lock()
+        
+        def search(domain):
+            with lock:
+                calls.append(domain)
+                first_wave = len(calls) <= workers
+            if first_wave:
+                barrier.wait(timeout=5)
+                return {"available": True, "domain": domain, "price": "$1.50"}
+            # Later checks hold their worker until the result is back
+            released.wait(timeout=5)
+            return {"available": False}
+        
+        mock_client = Mock(spec=DomainAPIClient)
+        mock_client.search_domain.side_effect = search
+        
+        manager = DomainRotationManager(mock_client, search_workers=workers)
+        result = manager.find_cheap_available_domain(max_price=5.0, max_attempts=20)
+        released.set()
+        manager._search_pool.shutdown(wait=True)
+        
+        assert result["price"] == 1.5
+        assert not barrier.broken
+        assert len(calls) <= 2 * workers
+    
+    def test_find_cheap_available_domain_none_acceptable(self):
+        """Test every candidate is tried when none is cheap enough"""
+        mock_client = Mock(spec=DomainAPIClient)
+        mock_client.search_domain.side_effect = [
+            {"available": True, "price": "12.00"},
+            {"available": True, "price": None},
+            {"available": False},
+            RuntimeError("boom"),
+        ]
+        
+        manager = DomainRotationManager(mock_client)
+        
+        assert manager.find_cheap_available_domain(max_price=5.0, max_attempts=4) is None
+        assert mock_client.search_domain.call_count == 4
+    
     def test_purchase_domain_if_budget_allows_success(self):
         """Test domain purchase within budget"""
         mock_client = Mock(spec=DomainAPIClient)
@@ -174,3 +278,129 @@ class TestDomainRotationManager:
         
         assert new_domain is not None
         assert manager.active_domain == new_domain
+
+
+class TestDomainReserve:
+    """Test the pre-purchased domain reserve"""
+    
+    def _client(self, price=2.0):
+        mock_client = Mock(spec=DomainAPIClient)
+        mock_client.search_domain.side_effect = lambda domain: {
+            "available": True, "domain": domain, "price": price}
+        mock_client.purchase_domain.side_effect = lambda domain, years=1: {
+            "success": True, "domain": domain}
+        return mock_client
+    
+    def test_replenish_within_budget(self):
+        """Test the reserve stops filling when the budget runs out"""
+        manager = DomainRotationManager(self._client(), monthly_budget=5.0)
+        manager.reserve_size = 3
+        
+        assert manager.replenish_reserve() == 2
+        assert len(manager.reserve) == 2
+        assert manager.current_spending == 4.0
+        assert manager.get_budget_status()["domains_reserved"] == 2
+    
+    def test_rotation_swaps_reserved_domain(self):
+        """Test rotation uses the reserve without calling the registrar"""
+        mock_client = self._client()
+        manager = DomainRotationManager(mock_client, monthly_budget=50.0)
+        manager.reserve_size = 2
+        manager.replenish_reserve()
+        reserved = manager.reserve[0]["domain"]
+        mock_client.search_domain.reset_mock()
+        
+        assert manager.rotate_domain() == reserved
+        assert manager.active_domain == reserved
+        assert len(manager.reserve) == 1
+        mock_client.search_domain.assert_not_called()
+    
+    def test_background_replenisher(self):
+        """Test the replenisher tops up after rotations drain the reserve"""
+        manager = DomainRotationManager(self._client(), monthly_budget=50.0)
+        manager.configure_reserve(2, low_watermark=1)
+        try:
+            deadline = time.monotonic() + 2
+            while len(manager.reserve) < 2 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            assert len(manager.reserve) == 2
+            
+            manager.rotate_domain()
+            manager.rotate_domain()
+            deadline = time.monotonic() + 2
+            while len(manager.reserve) < 2 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            assert len(manager.reserve) == 2
+            assert len(manager.owned_domains) == 4
+        finally:
+            manager.stop_replenisher()
+
+
+class TestRotationJobs:
+    """Test background domain rotation jobs"""
+    
+    def _wait(self, manager, job_id):
+        deadline = time.monotonic() + 2
+        while time.monotonic() < deadline:
+            job = manager.get_rotation_status(job_id)
+            if job['status'] in ('done', 'failed', 'cancelled'):
+                return job
+            time.sleep(0.01)
+        raise AssertionError("rotation job did not finish")
+    
+    def _client(self, search_delay=0.0):
+        mock_client = Mock(spec=DomainAPIClient)
+        
+        def search(domain):
+            time.sleep(search_delay)
+            return {"available": True, "domain": domain, "price": 2.0}
+        
+        mock_client.search_domain.side_effect = search
+        mock_client.purchase_domain.return_value = {"success": True}
+        return mock_client
+    
+    def test_rotation_job_completes(self):
+        """Test a submitted rotation runs in the background"""
+        manager = DomainRotationManager(self._client(search_delay=0.1))
+        
+        job = manager.submit_rotation()
+        assert job['status'] in ('queued', 'running')
+        
+        job = self._wait(manager, job['id'])
+        assert job['status'] == 'done'
+        assert job['domain'] == manager.active_domain
+    
+    def test_concurrent_requests_share_job(self):
+        """Test rotate requests while one is pending are deduplicated"""
+        manager = DomainRotationManager(self._client(search_delay=0.2))
+        
+        first = manager.submit_rotation()
+        second = manager.submit_rotation()
+        assert second['id'] == first['id']
+        
+        self._wait(manager, first['id'])
+        assert manager.submit_rotation()['id'] != first['id']
+    
+    def test_cancel_before_purchase(self):
+        """Test a cancelled running rotation buys nothing"""
+        mock_client = self._client(search_delay=0.2)
+        manager = DomainRotationManager(mock_client)
+        
+        job = manager.submit_rotation()
+        time.sleep(0.05)
+        assert manager.cancel_rotation(job['id'])['status'] in ('cancelling', 'cancelled')
+        
+        job = self._wait(manager, job['id'])
+        assert job['status'] == 'cancelled'
+        mock_client.purchase_domain.assert_not_called()
+        assert manager.cancel_rotation("missing") is None
+    
+    def test_failed_rotation(self):
+        """Test a rotation that finds nothing is reported as failed"""
+        mock_client = Mock(spec=DomainAPIClient)
+        mock_client.search_domain.return_value = {"available": False}
+        manager = DomainRotationManager(mock_client)
+        
+        job = self._wait(manager, manager.submit_rotation()['id'])
+        assert job['status'] == 'failed'
+        assert job['error']
@@ -0,0 +1,119 @@
+"""
+Tests for mbox import/export
+"""
+import io
+from unittest.mock import Mock
+from email_system import EmailStorage
+from email_mbox import export_mbox, import_mbox, iter_mbox_messages
+
+
+SAMPLE_MBOX = b"""From sender@test.com Mon Jan  1 00:00:00 2024
+From: sender@test.com
+To: user@test.com
+Subject: First
+Message-ID: <1@test.com>
+Date: Mon, 01 Jan 2024 00:00:00 +0000
+
+Hello there
+>From the quoted line
+
+From other@test.com Mon Jan  1 00:00:00 2024
+From: other@test.com
+To: user@test.com
+Subject: Re: First
+Message-ID: <2@test.com>
+In-Reply-To: <1@test.com>
+
+Reply body
+"""
+
+
+class TestMboxImport:
+    """Test streaming mbox import"""
+    
+    def test_import_messages(self):
+        storage = EmailStorage()
+        result = import_mbox(storage, "user1", io.BytesIO(SAMPLE_MBOX), batch_size=1)
+        
+        assert result == {"imported": 2, "skipped": 0}
+        emails = storage.get_emails("user1")
+        assert [e['subject'] for e in emails] == ["First", "Re: First"]
+        assert emails[0]['body'] == "Hello there\nFrom the quoted line"
+        assert storage.get_threads("user1")[0]['message_count'] == 2
+    
+    def test_oversized_message_skipped(self):
+        messages = list(iter_mbox_messages(io.BytesIO(SAMPLE_MBOX), max_message_size=140))
+        
+        assert messages[0] is None
+        assert messages[1]['Subject'] == "Re: First"
+    
+    def test_newline_free_input_is_read_in_bounded_chunks(self):
+        class RecordingStream(io.BytesIO):
+            largest = 0
+            
+            def readline(self, size=-1):
+                line = super().readline(size)
+                RecordingStream.largest = max(RecordingStream.largest, len(line))
+                return line
+        
+        stream = RecordingStream(b"From x@test.com Mon Jan  1 00:00:00 2024\n" + b"A" * 100000)
+        
+        assert list(iter_mbox_messages(stream, max_message_size=1000)) == [None]
+        assert RecordingStream.largest <= 1001
+
+
+class TestMboxExport:
+    """Test streaming mbox export"""
+    
+    def test_export_round_trip(self):
+        storage = EmailStorage()
+        storage.add_email("user1", {
+            'from': 'a@test.com',
+            'to': 'b@test.com',
+            'subject': 'Round trip',
+            'body': 'Line one\nFrom the start of a line',
+            'headers': {'Message-ID': '<rt@test.com>', 'Content-Type': 'multipart/mixed'},
+        })
+        
+        chunks = list(export_mbox(storage, "user1"))
+        assert len(chunks) == 1
+        assert b"\n>From the start" in chunks[0]
+        assert b"multipart/mixed" not in chunks[0]
+        
+        imported = EmailStorage()
+        import_mbox(imported, "user2", io.BytesIO(b''.join(chunks)))
+        email = imported.get_emails("user2")[0]
+        assert email['subject'] == 'Round trip'
+        assert email['body'] == 'Line one\nFrom the start of a line'
+        assert email['headers']['Message-ID'] == '<rt@test.com>'
+    
+    def _pending_email(self, storage):
+        storage.add_email("user1", {
+            'from': 'a@test.com',
+            'to': 'b@test.com',
+            'subject': 'Unopened',
+            'body': '[text/plain part not loaded]',
+            'body_pending': True,
+            'imap_ref': {'folder': 'INBOX', 'uid': 7, 'uidvalidity': 1, 'parts': None},
+        })
+    
+    def test_export_loads_pending_body(self):
+        storage = EmailStorage()
+        self._pending_email(storage)
+        load_body = Mock(return_value="The real body")
+        
+        exported = b''.join(export_mbox(storage, "user1", load_body))
+        
+        assert b"The real body" in exported
+        assert b"not loaded" not in exported
+        assert b"X-Opsechat-Body-Missing" not in exported
+        assert storage.get_emails("user1")[0]['body_pending'] is False
+    
+    def test_export_flags_unloadable_body(self):
+        storage = EmailStorage()
+        self._pending_email(storage)
+        
+        exported = b''.join(export_mbox(storage, "user1", Mock(side_effect=ConnectionError("down"))))
+        
+        assert b"X-Opsechat-Body-Missing: yes" in exported
+        assert storage.get_emails("user1")[0]['body_pending'] is True
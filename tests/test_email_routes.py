@@ -0,0 +1,76 @@
+"""
+Tests for the email Flask routes
+"""
+import os
+import pytest
+from flask import Flask
+from email_routes import register_email_routes, MAX_BULK_IDS
+from email_system import email_storage
+
+TEMPLATES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "templates")
+
+
+@pytest.fixture
+def client():
+    app = Flask(__name__, template_folder=TEMPLATES)
+    app.secret_key = "test"
+    app.config.update(path="p", hostname="test.onion")
+    register_email_routes(app, lambda: "bulk-user", lambda: "#fff")
+    with app.test_client() as client:
+        with client.session_transaction() as session:
+            session["_id"] = "bulk-user"
+        yield client
+    email_storage.emails.pop("bulk-user", None)
+
+
+class TestBulkRoute:
+    """Test the /email/bulk endpoint"""
+    
+    def _add(self, count):
+        for n in range(count):
+            email_storage.add_email("bulk-user", {'subject': f"Message {n}", 'body': "Body"})
+        return [email['id'] for email in email_storage.get_emails("bulk-user")]
+    
+    def test_requires_session(self):
+        app = Flask(__name__, template_folder=TEMPLATES)
+        app.secret_key = "test"
+        app.config.update(path="p", hostname="test.onion")
+        register_email_routes(app, lambda: "x", lambda: "#fff")
+        
+        response = app.test_client().post("/p/email/bulk", json={"ids": [], "action": "delete"})
+        assert response.status_code == 401
+    
+    def test_rejects_bad_requests(self, client):
+        ids = self._add(1)
+        
+        assert client.post("/p/email/bulk", json={"ids": ids, "action": "explode"}).status_code == 400
+        assert client.post("/p/email/bulk", json={"ids": "1", "action": "delete"}).status_code == 400
+        too_many = [str(n) for n in range(MAX_BULK_IDS + 1)]
+        assert client.post("/p/email/bulk", json={"ids": too_many, "action": "delete"}).status_code == 400
+        for folder in ({"nested": True}, "", "x" * 65, "bad\nname"):
+            response = client.post("/p/email/bulk", json={"ids": ids, "action": "move", "folder": folder})
+            assert response.status_code == 400
+        assert 'folder' not in email_storage.get_emails("bulk-user")[0]
+    
+    def test_applies_actions(self, client):
+        ids = self._add(3)
+        
+        response = client.post("/p/email/bulk", json={"ids": ids[:2] + ["missing"], "action": "mark_read"})
+        assert response.get_json()["applied"] == 2
+        assert response.get_json()["results"]["missing"] is False
+        
+        ids_at_limit = ids[2:] + [str(n) for n in range(MAX_BULK_IDS - 1)]
+        response = client.post("/p/email/bulk", json={"ids": ids_at_limit, "action": "delete"})
+        assert response.get_json()["applied"] == 1
+        assert len(email_storage.get_emails("bulk-user")) == 2
+    
+    def test_move_changes_folder_listing(self, client):
+        ids = self._add(2)
+        
+        response = client.post("/p/email/bulk", json={"ids": ids[:1], "action": "move", "folder": "Archive"})
+        assert response.get_json()["applied"] == 1
+        
+        inbox = client.get("/p/email").get_data(as_text=True)
+        archive = client.get("/p/email?folder=Archive").get_data(as_text=True)
+        assert "Message 1" in inbox and "Message 0" not in inbox
+        assert "Archive (1 messages)" in archive and "Message 0" in archive
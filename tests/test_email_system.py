@@ -1,10 +1,18 @@
 """
 Tests for the email system module
 """
+import base64
 import datetime
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import Mock
 import pytest
+import json
 from email_system import (
-    EmailStorage, EmailValidator, EmailComposer, BurnerEmailManager
+    EmailStorage, EmailValidator, EmailComposer, BurnerEmailManager, BurnerAddressPool,
+    BodyCompressor, CompressedBody, ThreadIndex, CountingBloomFilter,
+    MAX_THREAD_DEPTH
 )
 
 
@@ -83,6 +91,222 @@ class TestEmailStorage:
         retrieved = storage.get_email("user1", email_id)
         assert retrieved['subject'] == 'Updated'
         assert retrieved['body'] == 'New body'
+    
+    def test_bulk_delete(self):
+        storage = EmailStorage()
+        for i in range(5):
+            storage.add_email("user1", {'subject': f"Spam {i}", 'body': 'Body'})
+        ids = [email['id'] for email in storage.emails["user1"]]
+        
+        results = storage.bulk_update("user1", ids[:3] + ["missing"], "delete")
+        
+        assert results == {ids[0]: True, ids[1]: True, ids[2]: True, "missing": False}
+        assert [email['id'] for email in storage.emails["user1"]] == ids[3:]
+        assert len(storage.threads["user1"].by_email_id) == 2
+    
+    def test_bulk_mark_read_and_move(self):
+        storage = EmailStorage()
+        for i in range(3):
+            storage.add_email("user1", {'subject': f"Msg {i}", 'body': 'Body'})
+        ids = [email['id'] for email in storage.emails["user1"]]
+        
+        storage.bulk_update("user1", ids[:2], "mark_read")
+        storage.bulk_update("user1", ids[1:], "move", folder="Phishing")
+        
+        emails = storage.emails["user1"]
+        assert [email.get('read', False) for email in emails] == [True, True, False]
+        assert [email.get('folder') for email in emails] == [None, "Phishing", "Phishing"]
+    
+    def test_bulk_invalid_action(self):
+        storage = EmailStorage()
+        with pytest.raises(ValueError):
+            storage.bulk_update("user1", [], "explode")
+        with pytest.raises(ValueError):
+            storage.bulk_update("user1", [], "move")
+    
+    def test_large_body_stored_compressed(self):
+        """Test that large bodies are compressed and read back transparently"""
+        storage = EmailStorage(BodyCompressor(threshold=256))
+        body = "<html><body>" + "<p>Hello phishing training</p>" * 200 + "</body></html>"
+        storage.add_email("user1", {'from': 'a@test.com', 'subject': 'Big', 'body': body})
+        
+        stored = storage.emails["user1"][0]
+        assert isinstance(dict.__getitem__(stored, 'body'), CompressedBody)
+        assert stored['body'] == body
+        assert stored.get('body') == body
+        assert json.loads(json.dumps(stored, default=str))['body'] == body
+        
+        stats = storage.get_compression_stats()
+        assert stats['compressed_bodies'] == 1
+        assert stats['compression_ratio'] > 3
+    
+    def test_small_body_not_compressed(self):
+        storage = EmailStorage(BodyCompressor(threshold=256))
+        storage.add_email("user1", {'from': 'a@test.com', 'subject': 'Small', 'body': 'short'})
+        
+        assert dict.__getitem__(storage.emails["user1"][0], 'body') == 'short'
+        assert storage.get_compression_stats()['compressed_bodies'] == 0
+    
+    def test_decompressed_body_cache(self):
+        """Test that repeated views hit the LRU instead of decompressing"""
+        storage = EmailStorage(BodyCompressor(threshold=64, cache_size=1))
+        storage.add_email("user1", {'body': "a" * 1000})
+        storage.add_email("user1", {'body': "b" * 1000})
+        first, second = storage.emails["user1"]
+        
+        assert first['body'] == "a" * 1000
+        assert first['body'] == "a" * 1000
+        assert second['body'] == "b" * 1000
+        
+        stats = storage.get_compression_stats()
+        assert stats['cache_hits'] == 1
+        assert stats['decompressions'] == 2
+        assert stats['cached_bodies'] == 1
+    
+    def test_delete_releases_compressed_body(self):
+        storage = EmailStorage(BodyCompressor(threshold=64))
+        storage.add_email("user1", {'body': "x" * 1000})
+        
+        storage.delete_email("user1", storage.emails["user1"][0]['id'])
+        
+        stats = storage.get_compression_stats()
+        assert stats['compressed_bodies'] == 0
+        assert stats['stored_bytes'] == 0
+
+
+def _threaded_email(message_id, subject, in_reply_to=None, references=None):
+    headers = {'Message-ID': message_id}
+    if in_reply_to:
+        headers['In-Reply-To'] = in_reply_to
+    if references:
+        headers['References'] = references
+    return {'from': 'a@test.com', 'subject': subject, 'body': 'Body', 'headers': headers}
+
+
+class TestThreadIndex:
+    """Test conversation threading"""
+    
+    def test_reply_chain_forms_one_thread(self):
+        storage = EmailStorage()
+        storage.add_email("user1", _threaded_email("<1@x>", "Hello"))
+        storage.add_email("user1", _threaded_email("<2@x>", "Re: Hello", "<1@x>", "<1@x>"))
+        storage.add_email("user1", _threaded_email("<3@x>", "Re: Hello", "<2@x>", "<1@x> <2@x>"))
+        
+        threads = storage.get_threads("user1")
+        
+        assert len(threads) == 1
+        assert threads[0]['thread_id'] == "<1@x>"
+        assert threads[0]['message_count'] == 3
+        root = threads[0]['messages'][0]
+        assert root['message_id'] == "<1@x>"
+        assert root['replies'][0]['replies'][0]['message_id'] == "<3@x>"
+    
+    def test_duplicate_message_id_survives_delete(self):
+        storage = EmailStorage()
+        storage.add_email("user1", _threaded_email("<1@x>", "Hello"))
+        storage.add_email("user1", _threaded_email("<2@x>", "Hello again"))
+        first, second = storage.get_emails("user1")
+        # A raw edit can give a stored email a Message-ID that is already taken
+        storage.update_email("user1", second['id'], _threaded_email("<1@x>", "Hello again"))
+        second = storage.get_emails("user1")[1]
+        
+        thread = storage.get_threads("user1")[0]
+        assert thread['message_count'] == 2
+        assert thread['messages'][0]['id'] == first['id']
+        assert thread['messages'][0]['replies'][0]['message_id'] == "<1@x>"
+        
+        assert storage.delete_email("user1", first['id'])
+        threads = storage.get_threads("user1")
+        assert [m['id'] for m in threads[0]['messages']] == [second['id']]
+        assert storage.delete_email("user1", second['id'])
+        assert storage.get_threads("user1") == []
+    
+    def test_deep_reply_chain(self):
+        """Test a chain deeper than the recursion limit is flattened, not fatal"""
+        storage = EmailStorage()
+        storage.add_email("user1", _threaded_email("<0@x>", "Hello"))
+        for n in range(1, 1200):
+            storage.add_email("user1", _threaded_email(f"<{n}@x>", "Re: Hello", f"<{n - 1}@x>"))
+        
+        threads = storage.get_threads("user1")
+        
+        assert len(threads) == 1
+        assert threads[0]['message_count'] == 1200
+        json.dumps(threads)
+        node, depth = threads[0]['messages'][0], 1
+        while len(node['replies']) == 1:
+            node, depth = node['replies'][0], depth + 1
+        assert depth == MAX_THREAD_DEPTH - 1
+        assert [m['message_id'] for m in node['replies'][:2]] == ["<99@x>", "<100@x>"]
+    
+    def test_reply_before_parent_is_rethreaded(self):
+        """Test that a parent arriving after its reply becomes the thread root"""
+        storage = EmailStorage()
+        storage.add_email("user1", _threaded_email("<2@x>", "Re: Hello", "<1@x>"))
+        storage.add_email("user1", _threaded_email("<1@x>", "Hello"))
+        
+        threads = storage.get_threads("user1")
+        
+        assert len(threads) == 1
+        assert threads[0]['messages'][0]['message_id'] == "<1@x>"
+        assert threads[0]['messages'][0]['replies'][0]['message_id'] == "<2@x>"
+    
+    def test_missing_parent_is_promoted(self):
+        storage = EmailStorage()
+        storage.add_email("user1", _threaded_email("<2@x>", "Re: Gone", "<1@x>"))
+        
+        threads = storage.get_threads("user1")
+        
+        assert threads[0]['thread_id'] == "<1@x>"
+        assert threads[0]['messages'][0]['message_id'] == "<2@x>"
+    
+    def test_threads_ordered_by_latest_activity(self):
+        storage = EmailStorage()
+        storage.add_email("user1", _threaded_email("<a@x>", "A"))
+        storage.add_email("user1", _threaded_email("<b@x>", "B"))
+        storage.add_email("user1", _threaded_email("<a2@x>", "Re: A", "<a@x>"))
+        
+        threads = storage.get_threads("user1")
+        
+        assert [t['thread_id'] for t in threads] == ["<a@x>", "<b@x>"]
+    
+    def test_delete_removes_from_thread(self):
+        storage = EmailStorage()
+        storage.add_email("user1", _threaded_email("<1@x>", "Hello"))
+        storage.add_email("user1", _threaded_email("<2@x>", "Re: Hello", "<1@x>"))
+        reply_id = storage.emails["user1"][1]['id']
+        
+        storage.delete_email("user1", reply_id)
+        
+        threads = storage.get_threads("user1")
+        assert threads[0]['message_count'] == 1
+        assert "<2@x>" not in storage.threads["user1"].containers
+    
+    def test_duplicate_message_id_skipped(self):
+        storage = EmailStorage()
+        assert storage.add_email("user1", _threaded_email("<1@x>", "Hello")) is True
+        assert storage.add_email("user1", _threaded_email("<1@x>", "Hello")) is False
+        
+        added = storage.add_emails("user1", [_threaded_email("<1@x>", "Hello"),
+                                             _threaded_email("<2@x>", "Other")])
+        
+        assert added == 1
+        assert len(storage.emails["user1"]) == 2
+    
+    def test_email_without_message_id(self):
+        index = ThreadIndex()
+        index.add({'id': 'abc', 'subject': 'No headers'})
+        
+        threads = index.get_threads()
+        assert threads[0]['thread_id'] == "<abc@opsechat.local>"
+    
+    def test_reference_loop_ignored(self):
+        storage = EmailStorage()
+        storage.add_email("user1", _threaded_email("<1@x>", "A", "<2@x>"))
+        storage.add_email("user1", _threaded_email("<2@x>", "B", "<1@x>"))
+        
+        threads = storage.get_threads("user1")
+        assert sum(t['message_count'] for t in threads) == 2
 
 
 class TestEmailValidator:
@@ -276,3 +500,264 @@ class TestBurnerEmailManager:
         
         assert len(burners) == 1
         assert burners[0]['email'] == active_email
+
+
+class TestBurnerBatch:
+    """Test batch generation and the compact burner listing"""
+    
+    def test_generate_batch_across_domains(self):
+        manager = BurnerEmailManager()
+        manager.set_custom_domain("fresh.example")
+        burners = manager.generate_burner_batch("user1", [
+            (None, 24), ("opsecmail.onion", 1), ("fresh.example", 48)])
+        
+        assert [b['email'].split('@')[1] for b in burners] == [
+            "fresh.example", "opsecmail.onion", "fresh.example"]
+        assert burners[2]['expires'] - burners[1]['expires'] in range(47 * 3600, 47 * 3600 + 2)
+        assert len(manager.user_burners["user1"]) == 3
+        assert all(manager.get_user_for_burner(b['email']) == "user1" for b in burners)
+        assert manager.burner_domains() == ["fresh.example", "opsecmail.onion"]
+    
+    def test_batch_rejects_bad_specs(self):
+        manager = BurnerEmailManager()
+        with pytest.raises(ValueError):
+            manager.generate_burner_batch("user1", [(None, 24)] * 101)
+        with pytest.raises(ValueError):
+            manager.generate_burner_batch("user1", [(None, 24), (None, 0)])
+        assert "user1" not in manager.user_burners
+    
+    def test_compact_listing(self):
+        manager = BurnerEmailManager()
+        active, expired = manager.generate_burner_batch("user1", [(None, 24), (None, 24)])
+        manager.burner_addresses[expired['email']]['expires'] = int(time.time()) - 1
+        
+        assert manager.list_user_burners("user1") == [active]
+        assert manager.list_user_burners("nobody") == []
+    
+    def test_compact_listing_stateless(self):
+        manager = BurnerEmailManager(secret_key=b"k" * 32)
+        kept, revoked = manager.generate_burner_batch("user1", [(None, 2), (None, 2)])
+        manager.expire_burner(revoked['email'])
+        
+        assert manager.list_user_burners("user1") == [kept]
+
+
+class TestBurnerAddressPool:
+    """Test pre-generated burner addresses"""
+    
+    def test_rotation_pops_pregenerated_address(self):
+        manager = BurnerEmailManager()
+        pool = manager.address_pool
+        pool.min_size = 4
+        pool.prepare("fresh.test")
+        pool.stop()
+        pool.refill()
+        ready = list(pool._domains["fresh.test"]['ready'])
+        
+        email = manager.generate_burner_email("user1", domain="fresh.test")
+        
+        assert email == f"{ready[0]}@fresh.test"
+        assert pool.get_stats()["fresh.test"]['hits'] == 1
+    
+    def test_skips_addresses_taken_since_generation(self):
+        taken = set()
+        pool = BurnerAddressPool(lambda email: email in taken, min_size=2)
+        pool._domain("d.test")
+        pool.refill()
+        first, second = pool._domains["d.test"]['ready']
+        taken.add(f"{first}@d.test")
+        
+        assert pool.take("d.test") == second
+        pool.stop()
+    
+    def test_target_follows_demand(self):
+        pool = BurnerAddressPool(lambda email: False, min_size=4, max_size=100, horizon=10)
+        pool.refill()
+        pool._domain("busy.test")
+        pool.refill()
+        state = pool._domains["busy.test"]
+        
+        state['takes'] = 50
+        state['measured_at'] -= 1.0
+        pool.refill()
+        
+        assert state['target'] > 4
+        assert len(state['ready']) == state['target']
+        
+        # A miss after the pool was primed doubles the target
+        state['ready'].clear()
+        state['queued'].clear()
+        target = state['target']
+        assert pool.take("busy.test")
+        assert state['target'] == min(100, target * 2)
+        pool.stop()
+
+
+class TestBurnerAddressFilter:
+    """Test the Bloom filter in front of burner lookups"""
+    
+    def test_filter_tracks_addresses(self):
+        manager = BurnerEmailManager()
+        email = manager.generate_burner_email("user1")
+        
+        assert email in manager.address_filter
+        assert "junk@opsecmail.onion" not in manager.address_filter
+        
+        manager.expire_burner(email)
+        assert email not in manager.address_filter
+        assert len(manager.address_filter) == 0
+    
+    def test_unknown_recipient_skips_dict(self):
+        manager = BurnerEmailManager()
+        manager.generate_burner_email("user1")
+        manager.burner_addresses = Mock(wraps=manager.burner_addresses)
+        
+        assert manager.get_user_for_burner("spam@opsecmail.onion") is None
+        manager.burner_addresses.get.assert_not_called()
+    
+    def test_counting_filter_error_rate(self):
+        bloom = CountingBloomFilter(capacity=1000, error_rate=0.01)
+        for n in range(1000):
+            bloom.add(f"user{n}@burner.test")
+        
+        assert all(f"user{n}@burner.test" in bloom for n in range(1000))
+        false_positives = sum(f"other{n}@burner.test" in bloom for n in range(10000))
+        assert false_positives < 300
+        
+        for n in range(1000):
+            bloom.remove(f"user{n}@burner.test")
+        assert not any(bloom.counters)
+    
+    def test_filter_grows_past_capacity(self):
+        manager = BurnerEmailManager()
+        manager.address_filter = CountingBloomFilter(capacity=4)
+        emails = [manager.generate_burner_email("user1") for _ in range(10)]
+        
+        assert manager.address_filter.capacity >= 8
+        assert all(manager.get_user_for_burner(email) == "user1" for email in emails)
+
+
+class TestStatelessBurners:
+    """Test HMAC-derived burner addresses"""
+    
+    def test_routes_without_stored_state(self):
+        manager = BurnerEmailManager(secret_key=b"k" * 32)
+        email = manager.generate_burner_email("user1", domain="burner.test")
+        
+        assert manager.burner_addresses == {}
+        assert len(email.partition('@')[0]) <= 64
+        # Any instance sharing the key routes it
+        other = BurnerEmailManager(secret_key=b"k" * 32)
+        assert other.get_user_for_burner(email) == "user1"
+        assert other.get_user_for_burner(email.upper()) == "user1"
+    
+    def test_rejects_forged_and_foreign_addresses(self):
+        manager = BurnerEmailManager(secret_key=b"k" * 32)
+        email = manager.generate_burner_email("user1")
+        local, _, domain = email.partition('@')
+        tampered = local[:-1] + ('a' if local[-1] != 'a' else 'b')
+        
+        assert manager.get_user_for_burner(f"{tampered}@{domain}") is None
+        assert manager.get_user_for_burner("not-base32!@x.test") is None
+        # The MAC covers the domain, so the local part is not valid elsewhere
+        assert manager.get_user_for_burner(f"{local}@other.test") is None
+        assert BurnerEmailManager(secret_key=b"x" * 32).get_user_for_burner(email) is None
+    
+    def test_expiry_is_encoded(self):
+        manager = BurnerEmailManager(secret_key=b"k" * 32)
+        expired = manager.generate_burner_email("user1", hours_valid=-1)
+        active = manager.generate_burner_email("user1", hours_valid=2)
+        
+        assert manager.get_user_for_burner(expired) is None
+        burners = manager.get_user_burners("user1")
+        assert [b['email'] for b in burners] == [active]
+        assert 7100 < burners[0]['time_remaining_seconds'] <= 7200
+        assert manager.user_burners["user1"] == [active]
+    
+    def test_addresses_do_not_reveal_owner(self):
+        manager = BurnerEmailManager(secret_key=b"k" * 32)
+        first = manager.generate_burner_email("user1", domain="burner.test")
+        second = manager.generate_burner_email("user1", domain="burner.test")
+        
+        locals_ = [email.partition('@')[0] for email in (first, second)]
+        for local in locals_:
+            raw = base64.b32decode(local.upper() + '=' * (-len(local) % 8))
+            assert b"user1" not in raw
+        # No run long enough to carry an encoded field is shared between them
+        runs = {locals_[0][i:i + 8] for i in range(len(locals_[0]) - 7)}
+        assert not any(locals_[1][i:i + 8] in runs for i in range(len(locals_[1]) - 7))
+        assert manager.get_user_for_burner(first) == manager.get_user_for_burner(second) == "user1"
+    
+    def test_revocation_denylist(self):
+        manager = BurnerEmailManager()
+        manager.enable_stateless()
+        email = manager.generate_burner_email("user1")
+        
+        assert manager.expire_burner(email) is True
+        assert manager.get_user_for_burner(email) is None
+        assert manager.get_user_burners("user1") == []
+        assert len(manager.revoked) == 1
+        
+        # Entries leave the denylist once the address would have expired anyway
+        manager.revoked[email.partition('@')[0]] = time.time() - 1
+        manager.cleanup_expired()
+        assert manager.revoked == {}
+
+
+class TestConcurrentAccess:
+    """Stress the shared storage singletons from many request threads"""
+    
+    USERS = 8
+    THREADS = 16
+    ROUNDS = 200
+    
+    def test_parallel_add_delete(self):
+        storage = EmailStorage()
+        barrier = threading.Barrier(self.THREADS)
+        
+        def worker(n):
+            user_id = f"user{n % self.USERS}"
+            barrier.wait()
+            kept = 0
+            for i in range(self.ROUNDS):
+                storage.add_email(user_id, {'subject': f"{n}-{i}", 'body': 'Body'})
+                if i % 2:
+                    victim = storage.get_emails(user_id)[-1]
+                    if storage.delete_email(user_id, victim['id']):
+                        kept -= 1
+                kept += 1
+                storage.get_threads(user_id)
+            return kept
+        
+        with ThreadPoolExecutor(max_workers=self.THREADS) as pool:
+            kept = sum(pool.map(worker, range(self.THREADS)))
+        
+        total = sum(len(emails) for emails in storage.emails.values())
+        assert total == kept
+        for user_id, emails in storage.emails.items():
+            assert len(storage.threads[user_id].by_email_id) == len(emails)
+            assert len({email['id'] for email in emails}) == len(emails)
+    
+    def test_parallel_burner_churn(self):
+        manager = BurnerEmailManager()
+        barrier = threading.Barrier(self.THREADS)
+        
+        def worker(n):
+            user_id = f"user{n % self.USERS}"
+            barrier.wait()
+            for i in range(self.ROUNDS):
+                email = manager.generate_burner_email(user_id)
+                if i % 3 == 0:
+                    manager.burner_addresses[email]['expires_at'] = datetime.datetime.now()
+                elif i % 3 == 1:
+                    manager.expire_burner(email)
+                for burner in manager.get_user_burners(user_id):
+                    assert manager.get_user_for_burner(burner['email']) in (user_id, None)
+        
+        with ThreadPoolExecutor(max_workers=self.THREADS) as pool:
+            list(pool.map(worker, range(self.THREADS)))
+        
+        manager.cleanup_expired()
+        listed = sum(len(emails) for emails in manager.user_burners.values())
+        assert listed == len(manager.burner_addresses)
+        assert listed == self.THREADS * (self.ROUNDS // 3)
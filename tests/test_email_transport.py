@@ -1,13 +1,70 @@
 """
 Tests for email transport module (SMTP/IMAP)
 """
+import base64
+import email
+import imaplib
+import smtplib
+import socket
+import threading
+import time
 import pytest
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
 from unittest.mock import Mock, patch, MagicMock
+from circuit_breaker import HealthMonitor
 from email_transport import (
-    SMTPTransport, IMAPTransport, EmailTransportManager
+    SMTPTransport, IMAPTransport, EmailTransportManager, ConnectionPool,
+    OutboundMailQueue, IMAPIdleListener, uid_sequence_set, iter_fetch_response,
+    parse_imap_list, flatten_bodystructure, DecodeCache, decode_part,
+    classify_send_error, DeliveryUncertainError
 )
 
 
+MIXED_BODYSTRUCTURE = (
+    b'(("text" "plain" ("charset" "utf-8") NIL NIL "quoted-printable" 12 1 NIL NIL NIL)'
+    b'("text" "html" ("charset" "utf-8") NIL NIL "base64" 40 1 NIL NIL NIL)'
+    b'("application" "pdf" ("name" "report.pdf") NIL NIL "base64" 9000000 NIL '
+    b'("attachment" ("filename" "report.pdf")) NIL) "mixed" ("boundary" "b1") NIL NIL)'
+)
+
+
+def _raw_message(n, size=0):
+    return (f"From: sender{n}@test.com\r\nSubject: Message {n}\r\n\r\n"
+            f"Body {n}{'x' * size}").encode()
+
+
+def _fake_imap(uids, size=0):
+    """Mock IMAP session answering UID SEARCH and UID FETCH"""
+    mail = Mock()
+    fetches = []
+    
+    def uid(command, *args):
+        if command == 'SEARCH':
+            found = uids
+            if args[1].startswith('UID '):
+                low = int(args[1][4:].split(':')[0])
+                found = [u for u in uids if u >= low] or uids[-1:]
+            return 'OK', [b' '.join(str(u).encode() for u in found)]
+        fetches.append(args[0])
+        data = []
+        for part in args[0].split(','):
+            start, _, end = part.partition(':')
+            for n in range(int(start), int(end or start) + 1):
+                if n in uids:
+                    data.append((f"{n} (UID {n} RFC822 {{100}}".encode(), _raw_message(n, size)))
+                    data.append(b')')
+        return 'OK', data
+    
+    mail.uid.side_effect = uid
+    mail.select.return_value = ('OK', [str(len(uids)).encode()])
+    mail.response.side_effect = lambda code: (code, {
+        'UIDVALIDITY': [b'7'],
+        'UIDNEXT': [str(max(uids, default=0) + 1).encode()],
+    }.get(code, [None]))
+    return mail, fetches
+
+
 class TestSMTPTransport:
     """Test SMTP email sending"""
     
@@ -35,7 +92,66 @@ class TestSMTPTransport:
         mock_server.starttls.assert_called_once()
         mock_server.login.assert_called_once_with("test@test.com", "password")
         mock_server.send_message.assert_called_once()
-        mock_server.quit.assert_called_once()
+        # Session stays pooled for the next message
+        mock_server.quit.assert_not_called()
+    
+    @patch('email_transport.smtplib.SMTP')
+    def test_send_email_reuses_session(self, mock_smtp):
+        """Test that consecutive sends share one authenticated session"""
+        mock_server = Mock()
+        mock_smtp.return_value = mock_server
+        
+        transport = SMTPTransport(
+            "smtp.test.com", 587, "test@test.com", "password", True
+        )
+        
+        assert transport.test_connection() is True
+        for _ in range(3):
+            assert transport.send_email("from@test.com", "to@test.com", "S", "B") is True
+        
+        mock_smtp.assert_called_once()
+        mock_server.login.assert_called_once()
+        assert mock_server.send_message.call_count == 3
+        assert transport.pool.get_stats()['reused'] == 3
+    
+    @patch('email_transport.smtplib.SMTP')
+    def test_send_email_reconnects_dropped_session(self, mock_smtp):
+        """Test that a session dropped by the server is replaced and the send retried"""
+        stale = Mock()
+        stale.send_message.side_effect = smtplib.SMTPServerDisconnected("gone")
+        fresh = Mock()
+        mock_smtp.side_effect = [stale, fresh]
+        
+        transport = SMTPTransport(
+            "smtp.test.com", 587, "test@test.com", "password", True
+        )
+        
+        result = transport.send_email("from@test.com", "to@test.com", "S", "B")
+        
+        assert result is True
+        fresh.login.assert_called_once()
+        fresh.send_message.assert_called_once()
+        assert transport.pool.get_stats()['retries'] == 1
+    
+    @patch('email_transport.smtplib.SMTP')
+    def test_send_email_not_retried_after_data(self, mock_smtp):
+        """Test that a drop after DATA began is not resent on a new session"""
+        server = Mock()
+        
+        def send_message(msg):
+            server.data(msg.as_string())
+            raise smtplib.SMTPServerDisconnected("gone")
+        
+        server.send_message.side_effect = send_message
+        mock_smtp.return_value = server
+        
+        transport = SMTPTransport(
+            "smtp.test.com", 587, "test@test.com", "password", True
+        )
+        
+        assert transport.send_email("from@test.com", "to@test.com", "S", "B") is False
+        mock_smtp.assert_called_once()
+        assert transport.pool.get_stats()['retries'] == 0
     
     @patch('email_transport.smtplib.SMTP')
     def test_send_email_failure(self, mock_smtp):
@@ -71,6 +187,9 @@ class TestSMTPTransport:
         result = transport.test_connection()
         assert result is True
         mock_server.login.assert_called_once()
+        assert transport.pool.get_stats()['idle'] == 1
+        
+        transport.close()
         mock_server.quit.assert_called_once()
 
 
@@ -106,6 +225,206 @@ class TestIMAPTransport:
         assert "[HTML Content - shown as text]" in body
         assert "<html>" in body
     
+    @patch('email_transport.MAX_PART_TEXT', 100)
+    @patch('email_transport.MAX_BODY_TEXT', 250)
+    def test_extract_plain_text_caps_parts_and_total(self):
+        """Oversized and excess parts are truncated rather than decoded in full"""
+        msg = MIMEMultipart()
+        for i in range(10):
+            msg.attach(MIMEText(str(i) * 1000, 'plain', 'utf-8'))
+        msg.attach(MIMEText("late", 'plain'))
+        
+        body = IMAPTransport._extract_plain_text(email.message_from_bytes(msg.as_bytes()))
+        
+        assert body.startswith("0" * 100 + "1" * 100 + "2" * 50)
+        assert "3" not in body
+        assert "late" not in body
+        assert body.endswith("[Message truncated]")
+    
+    def test_extract_plain_text_cp1252_8bit(self):
+        raw = (b"Content-Type: text/plain; charset=cp1252\r\n"
+               b"Content-Transfer-Encoding: 8bit\r\n\r\ncaf\xe9")
+        assert IMAPTransport._extract_plain_text(email.message_from_bytes(raw)) == "caf\u00e9"
+    
+    def test_decode_cache_reuses_large_parts(self):
+        cache = DecodeCache(min_size=10)
+        payload = base64.encodebytes(b"quoted reply " * 100)
+        
+        first = cache.decode(payload, 'base64', 'utf-8', 1000)
+        second = cache.decode(payload, 'base64', 'utf-8', 1000)
+        
+        assert first == second == ("quoted reply " * 100)[:1000]
+        assert cache.get_stats()['hits'] == 1
+        assert cache.get_stats()['misses'] == 1
+    
+    def test_decode_part_truncated_base64(self):
+        payload = base64.encodebytes(b"a" * 10000)
+        assert decode_part(payload, 'base64', 'utf-8', limit=100) == "a" * 100
+    
+    @patch('email_transport.imaplib.IMAP4_SSL')
+    def test_fetch_emails_batched(self, mock_imap):
+        """Test that messages are fetched in chunked UID sequence sets"""
+        mail, fetches = _fake_imap(list(range(1, 121)))
+        mock_imap.return_value = mail
+        
+        transport = IMAPTransport("imap.test.com", 993, "test@test.com", "password")
+        emails = transport.fetch_emails()
+        
+        assert len(emails) == 120
+        assert emails[0]['subject'] == "Message 1"
+        assert emails[-1]['imap_uid'] == 120
+        assert fetches[0] == "1:50"
+        assert len(fetches) < 5
+        mail.fetch.assert_not_called()
+    
+    @patch('email_transport.imaplib.IMAP4_SSL')
+    def test_fetch_chunk_size_adapts(self, mock_imap):
+        """Test that large messages shrink the next chunk"""
+        mail, fetches = _fake_imap(list(range(1, 41)), size=400 * 1024)
+        mock_imap.return_value = mail
+        
+        transport = IMAPTransport("imap.test.com", 993, "test@test.com", "password")
+        transport.fetch_chunk_size = 20
+        transport.fetch_emails()
+        
+        assert fetches[0] == "1:20"
+        assert fetches[1] == "21:30"
+        assert transport.fetch_chunk_size == 10
+    
+    @patch('email_transport.imaplib.IMAP4_SSL')
+    def test_sync_folder_fetches_only_new(self, mock_imap):
+        """Test incremental sync against the last seen UID"""
+        uids = [1, 2, 3]
+        mail, fetches = _fake_imap(uids)
+        mock_imap.return_value = mail
+        transport = IMAPTransport("imap.test.com", 993, "test@test.com", "password")
+        
+        assert len(transport.sync_folder()) == 3
+        assert transport.sync_state['INBOX']['last_uid'] == 3
+        
+        # Unchanged mailbox: UIDNEXT shows nothing new, no SEARCH or FETCH
+        calls = mail.uid.call_count
+        assert transport.sync_folder() == []
+        assert mail.uid.call_count == calls
+        
+        uids.extend([4, 5])
+        emails = transport.sync_folder()
+        assert [e['imap_uid'] for e in emails] == [4, 5]
+        assert fetches[-1] == "4:5"
+    
+    @patch('email_transport.imaplib.IMAP4_SSL')
+    def test_sync_folder_cursor_per_inbox(self, mock_imap):
+        """Test that two sessions sharing an account each receive new mail"""
+        uids = [1, 2]
+        mail, _ = _fake_imap(uids)
+        mock_imap.return_value = mail
+        transport = IMAPTransport("imap.test.com", 993, "test@test.com", "password")
+        
+        assert len(transport.sync_folder(inbox="session-a")) == 2
+        uids.append(3)
+        assert [e['imap_uid'] for e in transport.sync_folder(inbox="session-a")] == [3]
+        
+        assert [e['imap_uid'] for e in transport.sync_folder(inbox="session-b")] == [1, 2, 3]
+        assert transport.sync_folder(inbox="session-b") == []
+        assert transport.sync_state == {}
+    
+    @patch('email_transport.imaplib.IMAP4_SSL')
+    def test_sync_folder_failed_fetch_is_retried(self, mock_imap):
+        """Test a failed FETCH does not let MODSEQ mark the folder as synced"""
+        uids = [1, 2, 3]
+        mail, fetches = _fake_imap(uids)
+        modseq = [b'5']
+        responses = mail.response.side_effect
+        mail.response.side_effect = lambda code: (
+            (code, modseq) if code == 'HIGHESTMODSEQ' else responses(code))
+        mock_imap.return_value = mail
+        transport = IMAPTransport("imap.test.com", 993, "test@test.com", "password")
+        transport.sync_folder()
+        
+        uids.append(4)
+        modseq[0] = b'6'
+        fake_uid = mail.uid.side_effect
+        mail.uid.side_effect = lambda *args: (
+            ('NO', [b'busy']) if args[0] == 'FETCH' else fake_uid(*args))
+        assert transport.sync_folder() == []
+        
+        mail.uid.side_effect = fake_uid
+        emails = transport.sync_folder()
+        assert [e['imap_uid'] for e in emails] == [4]
+        assert transport.sync_state['INBOX']['highestmodseq'] == 6
+    
+    @patch('email_transport.imaplib.IMAP4_SSL')
+    def test_sync_folder_uidvalidity_change_resyncs(self, mock_imap):
+        mail, _ = _fake_imap([1, 2])
+        mock_imap.return_value = mail
+        transport = IMAPTransport("imap.test.com", 993, "test@test.com", "password")
+        transport.sync_state['INBOX'] = {'uidvalidity': 6, 'last_uid': 2, 'highestmodseq': None}
+        
+        assert len(transport.sync_folder()) == 2
+        assert transport.sync_state['INBOX']['uidvalidity'] == 7
+    
+    def test_parse_bodystructure(self):
+        structure, end = parse_imap_list(MIXED_BODYSTRUCTURE + b' BODY[HEADER] {10}')
+        parts = flatten_bodystructure(structure)
+        
+        assert end == len(MIXED_BODYSTRUCTURE)
+        assert [(p['part'], p['type']) for p in parts] == [
+            ('1', 'text/plain'), ('2', 'text/html'), ('3', 'application/pdf')]
+        assert parts[0]['encoding'] == 'quoted-printable'
+        assert parts[2]['disposition'] == 'attachment'
+        assert parts[2]['filename'] == 'report.pdf'
+    
+    def test_parse_single_part_bodystructure(self):
+        structure, _ = parse_imap_list(b'("TEXT" "PLAIN" NIL NIL NIL "7BIT" 5 1 NIL NIL NIL)')
+        parts = flatten_bodystructure(structure)
+        
+        assert parts == [{'part': '1', 'type': 'text/plain', 'charset': 'utf-8',
+                          'encoding': '7bit', 'size': 5, 'filename': None, 'disposition': ''}]
+    
+    def test_header_only_sync_then_lazy_body(self):
+        """Test that sync skips bodies and opening fetches only the text parts"""
+        transport = IMAPTransport("imap.test.com", 993, "test@test.com", "password")
+        mail = Mock()
+        mail.select.return_value = ('OK', [b'1'])
+        mail.response.side_effect = lambda code: (code, {'UIDVALIDITY': [b'7']}.get(code, [None]))
+        header = b"From: a@test.com\r\nSubject: Report\r\nMessage-ID: <r@test.com>\r\n\r\n"
+        
+        def uid(command, *args):
+            if command == 'SEARCH':
+                return 'OK', [b'9']
+            if 'HEADER' in args[1]:
+                return 'OK', [(b'1 (UID 9 BODYSTRUCTURE ' + MIXED_BODYSTRUCTURE +
+                               b' BODY[HEADER] {%d}' % len(header), header), b')']
+            return 'OK', [(b'1 (UID 9 BODY[1] {14}', b'Hello =C3=A9t=\r\ne'),
+                          (b' BODY[2] {40}', b'PGI+SGk8L2I+'), b')']
+        mail.uid.side_effect = uid
+        transport.pool.acquire = Mock(return_value=mail)
+        transport.pool.release = Mock()
+        
+        emails = transport.sync_folder()
+        
+        assert emails[0]['subject'] == "Report"
+        assert emails[0]['body_pending'] is True
+        assert emails[0]['body'] == "[Attachment: report.pdf - application/pdf]"
+        assert emails[0]['imap_ref']['uidvalidity'] == 7
+        
+        body = transport.fetch_body(emails[0]['imap_ref'])
+        
+        assert mail.uid.call_args[0][2] == ("(UID BODY.PEEK[1]<0.3145728> "
+                                             "BODY.PEEK[2]<0.1434900>)")
+        assert body.startswith("Hello \u00e9te")
+        assert "[HTML Content - shown as text]:\n<b>Hi</b>" in body
+        assert body.endswith("[Attachment: report.pdf - application/pdf]")
+    
+    def test_uid_sequence_set(self):
+        assert uid_sequence_set([1, 2, 3, 5, 7, 8]) == "1:3,5,7:8"
+        assert uid_sequence_set([4]) == "4"
+        assert uid_sequence_set([]) == ""
+    
+    def test_iter_fetch_response_uid_after_literal(self):
+        data = [(b'1 (RFC822 {5}', b'hello'), b' UID 42)']
+        assert list(iter_fetch_response(data)) == [(42, b'hello', b'1 (RFC822 {5}')]
+    
     @patch('email_transport.imaplib.IMAP4_SSL')
     def test_test_connection_success(self, mock_imap):
         """Test IMAP connection test success"""
@@ -117,9 +436,296 @@ class TestIMAPTransport:
         result = transport.test_connection()
         assert result is True
         mock_mail.login.assert_called_once()
+        assert transport.pool.get_stats()['idle'] == 1
+        
+        transport.close()
         mock_mail.logout.assert_called_once()
 
 
+class TestConnectionPool:
+    """Test pooled session reuse"""
+    
+    def _pool(self, **kwargs):
+        sessions = []
+        
+        def connect():
+            session = Mock()
+            sessions.append(session)
+            return session
+        
+        pool = ConnectionPool(connect, lambda s: s.noop(), lambda s: s.close(), **kwargs)
+        return pool, sessions
+    
+    def test_idle_session_reused(self):
+        pool, sessions = self._pool()
+        
+        pool.run(lambda s: None)
+        pool.run(lambda s: None)
+        
+        assert len(sessions) == 1
+        assert pool.get_stats()['opened'] == 1
+    
+    def test_keepalive_failure_reconnects(self):
+        pool, sessions = self._pool(keepalive_interval=0)
+        pool.run(lambda s: None)
+        sessions[0].noop.side_effect = ConnectionError("dead")
+        
+        pool.run(lambda s: None)
+        
+        assert len(sessions) == 2
+        sessions[0].close.assert_called_once()
+        assert pool.get_stats()['keepalive_failures'] == 1
+    
+    def test_idle_timeout_closes_session(self):
+        pool, sessions = self._pool(idle_timeout=0)
+        pool.run(lambda s: None)
+        
+        pool.run(lambda s: None)
+        
+        assert len(sessions) == 2
+        sessions[0].noop.assert_not_called()
+    
+    def test_reaper_closes_and_probes_idle_sessions(self):
+        pool, sessions = self._pool(idle_timeout=300, keepalive_interval=0)
+        first, second, third = pool.acquire(), pool.acquire(), pool.acquire()
+        for session in (first, second, third):
+            pool.release(session)
+        second.noop.side_effect = ConnectionError("dead")
+        # first has been idle past the timeout
+        pool._idle[0] = (first, pool._idle[0][1] - 301, pool._idle[0][2])
+        
+        pool.maintain()
+        
+        first.close.assert_called_once()
+        first.noop.assert_not_called()
+        second.close.assert_called_once()
+        third.noop.assert_called_once()
+        stats = pool.get_stats()
+        assert (stats['idle'], stats['reaped'], stats['keepalive_failures']) == (1, 1, 1)
+    
+    def test_probe_does_not_keep_idle_session_alive(self):
+        pool, sessions = self._pool(idle_timeout=0.2, keepalive_interval=300)
+        pool.run(lambda s: None)
+        monitor = HealthMonitor(interval=0.01, tick=0.01)
+        monitor.register("pool", pool.probe)
+        try:
+            deadline = time.monotonic() + 2
+            while sessions[0].noop.call_count < 2 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            # The reaper runs alongside the monitor's probes
+            while pool.get_stats()['reaped'] == 0 and time.monotonic() < deadline:
+                pool.maintain()
+                time.sleep(0.01)
+        finally:
+            monitor.stop()
+        
+        assert sessions[0].noop.call_count >= 2
+        sessions[0].close.assert_called_once()
+        assert pool.get_stats()['reaped'] == 1
+    
+    def test_probe_without_idle_session_does_not_pool_it(self):
+        pool, sessions = self._pool()
+        
+        assert pool.probe() is True
+        
+        sessions[0].noop.assert_called_once()
+        sessions[0].close.assert_called_once()
+        assert pool.get_stats()['idle'] == 0
+    
+    def test_pool_is_bounded(self):
+        pool, _ = self._pool(max_size=1, acquire_timeout=0.01)
+        session = pool.acquire()
+        
+        with pytest.raises(TimeoutError):
+            pool.acquire()
+        
+        pool.release(session)
+        assert pool.acquire() is session
+    
+    def test_operation_error_discards_session(self):
+        pool, sessions = self._pool()
+        
+        with pytest.raises(ValueError):
+            pool.run(Mock(side_effect=ValueError("bad")))
+        
+        sessions[0].close.assert_called_once()
+        assert pool.get_stats()['idle'] == 0
+
+
+class TestOutboundMailQueue:
+    """Test asynchronous outbound sending"""
+    
+    def _wait(self, outbound, job_id, status):
+        for _ in range(200):
+            if outbound.get_status(job_id)['status'] == status:
+                return
+            threading.Event().wait(0.01)
+        raise AssertionError(f"job never reached {status}: {outbound.get_status(job_id)}")
+    
+    def test_enqueue_and_send(self):
+        send = Mock(return_value=True)
+        outbound = OutboundMailQueue(send, workers=2)
+        
+        job_id = outbound.enqueue({'to_addr': 'to@test.com'}, owner="user1")
+        self._wait(outbound, job_id, 'sent')
+        
+        send.assert_called_once_with(to_addr='to@test.com')
+        status = outbound.get_status(job_id)
+        assert status['attempts'] == 1
+        assert status['owner'] == "user1"
+        assert 'message' not in status
+        outbound.shutdown()
+    
+    def test_retry_with_backoff(self):
+        send = Mock(side_effect=[False, Exception("relay down"), True])
+        outbound = OutboundMailQueue(send, workers=1, base_delay=0.01)
+        
+        job_id = outbound.enqueue({'to_addr': 'to@test.com'})
+        self._wait(outbound, job_id, 'sent')
+        
+        assert send.call_count == 3
+        assert outbound.get_status(job_id)['attempts'] == 3
+        outbound.shutdown()
+    
+    def test_gives_up_after_max_attempts(self):
+        send = Mock(return_value=False)
+        outbound = OutboundMailQueue(send, workers=1, max_attempts=2, base_delay=0.01)
+        
+        job_id = outbound.enqueue({'to_addr': 'to@test.com'})
+        self._wait(outbound, job_id, 'failed')
+        
+        assert send.call_count == 2
+        assert outbound.get_status(job_id)['error'] == "Send failed"
+        outbound.shutdown()
+    
+    def test_permanent_refusal_not_retried(self):
+        send = Mock(side_effect=smtplib.SMTPRecipientsRefused(
+            {'to@test.com': (550, b'5.1.1 No such user')}))
+        outbound = OutboundMailQueue(send, workers=1, base_delay=0.01)
+        
+        job_id = outbound.enqueue({'to_addr': 'to@test.com'})
+        self._wait(outbound, job_id, 'failed')
+        
+        assert send.call_count == 1
+        assert outbound.get_status(job_id)['error'] == "to@test.com: 550 5.1.1 No such user"
+        outbound.shutdown()
+    
+    def test_transient_reply_retried(self):
+        send = Mock(side_effect=[smtplib.SMTPSenderRefused(451, b'Try again later', 'a@test.com'),
+                                 smtplib.SMTPServerDisconnected("gone"), True])
+        outbound = OutboundMailQueue(send, workers=1, base_delay=0.01)
+        
+        job_id = outbound.enqueue({'to_addr': 'to@test.com'})
+        self._wait(outbound, job_id, 'sent')
+        
+        assert send.call_count == 3
+        outbound.shutdown()
+    
+    def test_classify_send_error(self):
+        assert classify_send_error(smtplib.SMTPDataError(554, b'Rejected as spam')) == (
+            True, "554 Rejected as spam")
+        assert classify_send_error(DeliveryUncertainError("lost"))[0] is True
+        assert classify_send_error(ConnectionError("refused")) == (False, "refused")
+    
+    def test_unknown_job(self):
+        outbound = OutboundMailQueue(Mock())
+        assert outbound.get_status("missing") is None
+
+
+class TestIMAPIdleListener:
+    """Test IMAP IDLE push delivery"""
+    
+    def _session(self, lines):
+        session = Mock()
+        session.capabilities = ('IMAP4REV1', 'IDLE')
+        session._new_tag.return_value = b'A001'
+        session.readline.side_effect = lines
+        return session
+    
+    def test_idle_reports_exists(self):
+        transport = IMAPTransport("imap.test.com", 993, "test@test.com", "password")
+        listener = IMAPIdleListener(transport, Mock())
+        session = self._session([b'+ idling\r\n', b'* 4 EXISTS\r\n',
+                                 b'* 1 RECENT\r\n', b'A001 OK IDLE terminated\r\n'])
+        
+        assert listener._idle(session) is True
+        session.send.assert_any_call(b'A001 IDLE\r\n')
+        session.send.assert_called_with(b'DONE\r\n')
+    
+    def test_idle_closed_connection_raises(self):
+        transport = IMAPTransport("imap.test.com", 993, "test@test.com", "password")
+        listener = IMAPIdleListener(transport, Mock())
+        session = self._session([b'+ idling\r\n', b''])
+        
+        with pytest.raises(Exception):
+            listener._idle(session)
+    
+    def test_idle_refresh_keeps_session(self):
+        """Test that the refresh timeout re-issues IDLE on the same connection"""
+        server = socket.socket()
+        server.bind(('127.0.0.1', 0))
+        server.listen(1)
+        idles = []
+        
+        def serve():
+            client, _ = server.accept()
+            with client, client.makefile('rb') as lines:
+                client.sendall(b"* OK [CAPABILITY IMAP4rev1 IDLE] ready\r\n")
+                tag = b''
+                for line in lines:
+                    if line.startswith(b'DONE'):
+                        client.sendall(tag + b" OK IDLE terminated\r\n")
+                        continue
+                    tag, _, command = line.strip().partition(b' ')
+                    if command == b'IDLE':
+                        idles.append(tag)
+                        client.sendall(b"+ idling\r\n")
+                    elif command == b'CAPABILITY':
+                        client.sendall(b"* CAPABILITY IMAP4rev1 IDLE\r\n" + tag + b" OK done\r\n")
+                    else:
+                        client.sendall(tag + b" OK done\r\n")
+        threading.Thread(target=serve, daemon=True).start()
+        
+        transport = IMAPTransport("127.0.0.1", server.getsockname()[1], "test@test.com", "password")
+        listener = IMAPIdleListener(transport, Mock())
+        listener.IDLE_REFRESH = 0.2
+        session = imaplib.IMAP4("127.0.0.1", server.getsockname()[1], timeout=5)
+        try:
+            assert listener._idle(session) is False
+            assert listener._idle(session) is False
+            assert len(idles) == 2
+        finally:
+            session.shutdown()
+            server.close()
+    
+    def test_listener_delivers_and_reconnects(self):
+        """Test that new mail is delivered and a dropped session is reopened"""
+        transport = IMAPTransport("imap.test.com", 993, "test@test.com", "password")
+        delivered = []
+        done = threading.Event()
+        
+        def on_emails(emails):
+            delivered.extend(emails)
+            if len(delivered) == 2:
+                done.set()
+        
+        sessions = [
+            self._session([b'+ idling\r\n', b'']),
+            self._session([b'+ idling\r\n'] + [b''] * 5),
+        ]
+        transport._connect = Mock(side_effect=sessions + [Exception("stop")] * 10)
+        transport._sync = Mock(side_effect=[[{'subject': 'first'}], [{'subject': 'second'}]] + [[]] * 10)
+        
+        listener = IMAPIdleListener(transport, on_emails)
+        with patch.object(listener._stop, 'wait', side_effect=lambda t: listener._stop.is_set()):
+            listener.start()
+            assert done.wait(2)
+            listener.stop()
+        
+        assert [e['subject'] for e in delivered] == ['first', 'second']
+        assert transport._connect.call_count >= 2
+
+
 class TestEmailTransportManager:
     """Test transport manager"""
     
@@ -165,3 +771,84 @@ class TestEmailTransportManager:
         manager.smtp_transport = Mock()
         status = manager.is_configured()
         assert status['smtp'] is True
+    
+    def test_queue_email_requires_smtp(self):
+        manager = EmailTransportManager()
+        assert manager.queue_email("a@test.com", "b@test.com", "S", "B") is None
+    
+    def test_queued_refusal_reports_server_reply(self):
+        manager = EmailTransportManager()
+        manager.smtp_transport = Mock()
+        manager.smtp_transport.deliver.side_effect = smtplib.SMTPSenderRefused(
+            553, b'Sender address rejected', 'a@test.com')
+        
+        job_id = manager.queue_email("a@test.com", "b@test.com", "S", "B")
+        for _ in range(200):
+            status = manager.get_send_status(job_id)
+            if status['status'] == 'failed':
+                break
+            threading.Event().wait(0.01)
+        
+        assert status['status'] == 'failed'
+        assert status['attempts'] == 1
+        assert status['error'] == "553 Sender address rejected"
+        manager.outbound.shutdown()
+    
+    def test_sync_all_runs_accounts_concurrently(self):
+        """Accounts sync in parallel and results are tagged with their account"""
+        manager = EmailTransportManager()
+        barrier = threading.Barrier(3, timeout=5)
+        
+        def make_transport(name):
+            transport = Mock()
+            
+            def sync_folder(folder, limit, inbox):
+                barrier.wait()
+                return [{'subject': name, 'imap_ref': {'uid': 1}}]
+            transport.sync_folder.side_effect = sync_folder
+            return transport
+        
+        for name in ('default', 'work', 'alt'):
+            manager.accounts[name] = {'imap': make_transport(name)}
+        
+        results = manager.sync_all()
+        
+        assert set(results) == {'default', 'work', 'alt'}
+        assert results['work'][0]['imap_ref']['account'] == 'work'
+    
+    def test_sync_all_isolates_failures(self):
+        manager = EmailTransportManager()
+        broken = Mock()
+        broken.sync_folder.side_effect = ConnectionError("down")
+        healthy = Mock()
+        healthy.sync_folder.return_value = [{'subject': 'ok'}]
+        manager.accounts = {'broken': {'imap': broken}, 'healthy': {'imap': healthy}}
+        
+        results = manager.sync_all()
+        
+        assert results == {'broken': [], 'healthy': [{'subject': 'ok'}]}
+    
+    def test_global_connection_cap(self):
+        """Pools sharing active_slots never exceed the global limit"""
+        slots = threading.BoundedSemaphore(2)
+        pools = [ConnectionPool(Mock, lambda s: None, lambda s: None, max_size=2,
+                                acquire_timeout=0.1, active_slots=slots)
+                 for _ in range(2)]
+        
+        first = pools[0].acquire()
+        pools[1].acquire()
+        with pytest.raises(TimeoutError):
+            pools[1].acquire()
+        
+        pools[0].release(first)
+        assert pools[1].acquire() is not None
+    
+    def test_remove_account(self):
+        manager = EmailTransportManager()
+        transport = Mock()
+        manager.accounts['work'] = {'imap': transport}
+        
+        assert manager.remove_account('work') is True
+        transport.close.assert_called_once()
+        assert manager.list_accounts() == []
+        assert manager.remove_account('work') is False
@@ -0,0 +1,113 @@
+"""
+Tests for the local SMTP ingress server
+"""
+import smtplib
+import threading
+import pytest
+from email_system import EmailStorage, BurnerEmailManager
+from smtp_ingress import SMTPIngressServer, run_load, _parse_path
+
+
+@pytest.fixture
+def ingress():
+    storage = EmailStorage()
+    burners = BurnerEmailManager()
+    server = SMTPIngressServer(storage, burners, port=0, max_message_size=2048)
+    server.start()
+    yield server
+    server.stop()
+
+
+class TestSMTPIngressServer:
+    """Test inbound delivery to burner inboxes"""
+    
+    def test_delivers_to_burner_owner(self, ingress):
+        address = ingress.burners.generate_burner_email("user1")
+        
+        with smtplib.SMTP('127.0.0.1', ingress.port) as client:
+            client.sendmail("sender@example.com", [address],
+                            f"From: sender@example.com\r\nTo: {address}\r\n"
+                            f"Subject: Hello\r\n\r\n.Dotted line\r\n")
+        
+        emails = ingress.storage.get_emails("user1")
+        assert len(emails) == 1
+        assert emails[0]['subject'] == "Hello"
+        assert emails[0]['delivered_to'] == address
+        assert ".Dotted line" in emails[0]['body']
+    
+    def test_rejects_unknown_recipient_at_rcpt(self, ingress):
+        with smtplib.SMTP('127.0.0.1', ingress.port) as client:
+            client.ehlo()
+            client.mail("sender@example.com")
+            code, _ = client.rcpt("nobody@opsecmail.onion")
+            assert code == 550
+            code, _ = client.docmd("DATA")
+            assert code == 503
+        
+        assert ingress.get_stats()['recipients_rejected'] == 1
+    
+    def test_rejects_expired_burner(self, ingress):
+        address = ingress.burners.generate_burner_email("user1", hours_valid=-1)
+        
+        with smtplib.SMTP('127.0.0.1', ingress.port) as client:
+            with pytest.raises(smtplib.SMTPRecipientsRefused):
+                client.sendmail("sender@example.com", [address], "Subject: x\r\n\r\nx")
+    
+    def test_rejects_oversized_message(self, ingress):
+        address = ingress.burners.generate_burner_email("user1")
+        
+        with smtplib.SMTP('127.0.0.1', ingress.port) as client:
+            # Declared SIZE is refused at MAIL
+            with pytest.raises(smtplib.SMTPSenderRefused):
+                client.sendmail("sender@example.com", [address],
+                                "Subject: big\r\n\r\n" + "x" * 4096)
+            
+            # Undeclared size is refused after DATA
+            client.mail("sender@example.com")
+            client.rcpt(address)
+            code, _ = client.data("Subject: big\r\n\r\n" + "x" * 4096)
+            assert code == 552
+        
+        assert ingress.storage.get_emails("user1") == []
+    
+    def test_concurrent_load(self, ingress):
+        recipients = [ingress.burners.generate_burner_email(f"user{i}") for i in range(5)]
+        
+        result = run_load('127.0.0.1', ingress.port, recipients,
+                          messages=200, concurrency=50, size=100)
+        
+        assert result['sent'] == 200
+        assert result['failed'] == 0
+        assert sum(len(ingress.storage.get_emails(f"user{i}")) for i in range(5)) == 200
+    
+    def test_parse_path(self):
+        assert _parse_path("FROM:<a@b.com> SIZE=100", 'FROM:') == ('a@b.com', {'SIZE': '100'})
+        assert _parse_path("TO:a@b.com", 'TO:') == (None, {})
+    
+    def test_delivery_runs_off_event_loop(self, ingress):
+        address = ingress.burners.generate_burner_email("user1")
+        threads = []
+        add_email = ingress.storage.add_email
+        
+        def recording_add(user_id, email):
+            threads.append(threading.current_thread().name)
+            return add_email(user_id, email)
+        
+        ingress.storage.add_email = recording_add
+        with smtplib.SMTP('127.0.0.1', ingress.port) as client:
+            client.sendmail("sender@example.com", [address], "Subject: x\r\n\r\nx")
+        
+        assert len(threads) == 1
+        assert threads[0].startswith("smtp-deliver")
+    
+    def test_start_if_enabled(self):
+        server = SMTPIngressServer(EmailStorage(), BurnerEmailManager(), port=0, enabled=False)
+        assert server.start_if_enabled() is None
+        assert not server.is_running()
+        
+        server.enabled = True
+        try:
+            assert server.start_if_enabled() == server.port
+            assert server.is_running()
+        finally:
+            server.stop()
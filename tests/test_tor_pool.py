@@ -0,0 +1,193 @@
+"""
+Tests for the Tor SOCKS outbound pool
+"""
+import socket
+import struct
+import threading
+import http.server
+import pytest
+import requests
+from tor_pool import TorConnectionPool, SOCKSError, socks5_connect
+
+
+class FakeSOCKSProxy:
+    """Minimal SOCKS5 proxy relaying to local targets, recording credentials"""
+    
+    def __init__(self, reply=0):
+        self.reply = reply
+        self.requests = []  # (username, password, host, port)
+        self.resolves = []  # (username, password, host)
+        self.server = socket.socket()
+        self.server.bind(('127.0.0.1', 0))
+        self.server.listen(50)
+        self.address = self.server.getsockname()
+        threading.Thread(target=self._accept, daemon=True).start()
+    
+    def _accept(self):
+        while True:
+            try:
+                client, _ = self.server.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._handle, args=(client,), daemon=True).start()
+    
+    def _handle(self, client):
+        with client:
+            _, count = client.recv(2)
+            methods = client.recv(count)
+            username = password = None
+            if 2 in methods:
+                client.sendall(b'\x05\x02')
+                client.recv(1)
+                username = client.recv(client.recv(1)[0]).decode()
+                password = client.recv(client.recv(1)[0]).decode()
+                client.sendall(b'\x01\x00')
+            else:
+                client.sendall(b'\x05\x00')
+            command = client.recv(4)[1]
+            host = client.recv(client.recv(1)[0]).decode()
+            port = struct.unpack('>H', client.recv(2))[0]
+            if command == 0xF0:
+                self.resolves.append((username, password, host))
+                client.sendall(bytes([5, self.reply, 0, 1]) + socket.inet_aton('127.0.0.1') + b'\x00\x00')
+                return
+            self.requests.append((username, password, host, port))
+            client.sendall(bytes([5, self.reply, 0, 1]) + b'\x00' * 6)
+            if self.reply:
+                return
+            with socket.create_connection((host, port)) as upstream:
+                threading.Thread(target=self._pipe, args=(upstream, client), daemon=True).start()
+                self._pipe(client, upstream)
+    
+    @staticmethod
+    def _pipe(source, target):
+        try:
+            while True:
+                data = source.recv(65536)
+                if not data:
+                    break
+                target.sendall(data)
+            target.shutdown(socket.SHUT_WR)
+        except OSError:
+            pass
+    
+    def close(self):
+        self.server.close()
+
+
+@pytest.fixture
+def proxy():
+    fake = FakeSOCKSProxy()
+    yield fake
+    fake.close()
+
+
+@pytest.fixture
+def echo_server():
+    server = socket.socket()
+    server.bind(('127.0.0.1', 0))
+    server.listen(50)
+    
+    def serve():
+        while True:
+            try:
+                client, _ = server.accept()
+            except OSError:
+                return
+            client.sendall(b"hello\n")
+            client.close()
+    threading.Thread(target=serve, daemon=True).start()
+    yield server.getsockname()
+    server.close()
+
+
+class TestTorConnectionPool:
+    """Test SOCKS handshake, isolation and prewarming"""
+    
+    def test_socks5_connect_relays(self, proxy, echo_server):
+        sock = socks5_connect(proxy.address, '127.0.0.1', echo_server[1], 'user', 'pass', timeout=5)
+        with sock:
+            assert sock.recv(6) == b"hello\n"
+        assert proxy.requests == [('user', 'pass', '127.0.0.1', echo_server[1])]
+    
+    def test_socks5_error_reply(self, echo_server):
+        failing = FakeSOCKSProxy(reply=5)
+        try:
+            with pytest.raises(SOCKSError, match="connection refused"):
+                socks5_connect(failing.address, '127.0.0.1', echo_server[1], timeout=5)
+        finally:
+            failing.close()
+    
+    def test_destination_classes_are_isolated(self, proxy, echo_server):
+        pool = TorConnectionPool(*proxy.address)
+        pool.connect('127.0.0.1', echo_server[1], 'smtp', timeout=5).close()
+        pool.connect('127.0.0.1', echo_server[1], 'imap', timeout=5).close()
+        pool.connect('127.0.0.1', echo_server[1], 'smtp', timeout=5).close()
+        
+        credentials = [(user, password) for user, password, _, _ in proxy.requests]
+        assert credentials[0] == credentials[2]
+        assert credentials[0] != credentials[1]
+        
+        pool.new_identity('smtp')
+        pool.connect('127.0.0.1', echo_server[1], 'smtp', timeout=5).close()
+        assert proxy.requests[-1][1] != credentials[0][1]
+        assert pool.get_stats()['smtp']['circuit_build_ms']['samples'] == 2
+    
+    def test_prewarm_builds_circuit_without_contacting_destination(self, proxy, echo_server):
+        pool = TorConnectionPool(*proxy.address)
+        pool.keep_warm('smtp', '127.0.0.1', echo_server[1])
+        
+        assert pool.prewarm() == 1
+        assert pool.prewarm() == 0
+        assert proxy.resolves == [(*pool.credentials('smtp'), '127.0.0.1')]
+        assert proxy.requests == []
+        
+        with pool.connect('127.0.0.1', echo_server[1], 'smtp', timeout=5) as sock:
+            assert sock.recv(6) == b"hello\n"
+        
+        # The real stream rides the circuit the warmup built
+        assert proxy.requests[0][:2] == proxy.resolves[0][:2]
+        stats = pool.get_stats()['smtp']
+        assert stats['streams'] == 1
+        assert stats['warmups'] == 1
+        assert stats['circuit_build_ms']['samples'] == 1
+    
+    def test_idle_class_is_not_warmed(self, proxy, echo_server):
+        pool = TorConnectionPool(*proxy.address, warm_window=0)
+        pool.keep_warm('imap', '127.0.0.1', echo_server[1])
+        
+        assert pool.prewarm() == 0
+        assert proxy.resolves == []
+    
+    def test_warm_class_is_refreshed_onto_new_circuit(self, proxy, echo_server):
+        pool = TorConnectionPool(*proxy.address, refresh_interval=0)
+        pool.keep_warm('registrar', '127.0.0.1', echo_server[1])
+        
+        assert pool.prewarm() == 1
+        assert pool.prewarm() == 1
+        assert proxy.resolves[0][1] != proxy.resolves[1][1]
+        assert pool.credentials('registrar')[1] == proxy.resolves[1][1]
+    
+    def test_http_adapter(self, proxy):
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                self.send_response(200)
+                self.end_headers()
+                self.wfile.write(b'{"status": "SUCCESS"}')
+            
+            def log_message(self, *args):
+                pass
+        
+        httpd = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=httpd.serve_forever, daemon=True).start()
+        try:
+            pool = TorConnectionPool(*proxy.address)
+            session = requests.Session()
+            session.mount("http://", pool.http_adapter('registrar'))
+            
+            response = session.get(f"http://127.0.0.1:{httpd.server_port}/", timeout=5)
+            
+            assert response.json() == {"status": "SUCCESS"}
+            assert proxy.requests[0][0] == "opsechat-registrar"
+        finally:
+            httpd.shutdown()
@@ -0,0 +1,56 @@
+"""
+Tests for the stand-in servers and transport benchmark
+"""
+from transport_benchmark import (
+    StandInIMAPServer, benchmark_message, percentile,
+    run_send_benchmark, run_sync_benchmark
+)
+from email_transport import IMAPTransport
+
+
+class TestTransportBenchmark:
+    """Test transports against the local stand-in servers"""
+    
+    def test_percentile(self):
+        samples = list(range(1, 101))
+        assert percentile(samples, 0.50) == 50
+        assert percentile(samples, 0.99) == 99
+        assert percentile([], 0.5) == 0.0
+    
+    def test_send_reuses_pooled_connections(self):
+        report = run_send_benchmark(messages=30, concurrency=3, pool_size=2)
+        
+        assert report['messages'] == 30
+        assert report['failed'] == 0
+        assert report['connections'] <= 2
+        assert report['p99_ms'] >= report['p50_ms']
+    
+    def test_sync_workloads(self):
+        results = run_sync_benchmark(messages=120, rounds=3, new_per_round=2)
+        
+        assert results['initial_sync']['messages'] == 120
+        assert results['incremental_sync']['messages'] == 6
+        assert results['open_message']['messages'] == 6
+        assert results['open_message']['connections'] == 1
+    
+    def test_imap_standin_serves_lazy_bodies(self):
+        server = StandInIMAPServer()
+        port = server.start()
+        server.append(benchmark_message(1, size=100))
+        transport = IMAPTransport('127.0.0.1', port, 'u', 'p', use_ssl=False)
+        try:
+            emails = transport.sync_folder('INBOX')
+            body = transport.fetch_body(emails[0]['imap_ref'])
+        finally:
+            transport.close()
+            server.stop()
+        
+        assert emails[0]['subject'] == "Benchmark 1"
+        assert emails[0]['body_pending'] is True
+        assert body.startswith("Benchmark message 1")
+    
+    def test_latency_injection(self):
+        report = run_send_benchmark(messages=2, concurrency=1, pool_size=1, latency=0.02)
+        
+        # Four round trips per pooled send
+        assert report['p50_ms'] >= 4 * 20
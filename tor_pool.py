@@ -0,0 +1,425 @@
+"""
+Outbound connections through Tor's SOCKS port for opsechat
+Keeps stream-isolated circuits warm per destination class so SMTP, IMAP and
+registrar traffic do not pay circuit build latency on every connection
+"""
+import os
+import time
+import random
+import socket
+import struct
+import imaplib
+import logging
+import smtplib
+import secrets
+import threading
+from collections import deque
+from functools import partial
+from typing import Dict, List, Optional, Tuple
+
+import urllib3
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.exceptions import NewConnectionError
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+SOCKS_ERRORS = {
+    1: "general SOCKS server failure",
+    2: "connection not allowed by ruleset",
+    3: "network unreachable",
+    4: "host unreachable",
+    5: "connection refused",
+    6: "TTL expired",
+    7: "command not supported",
+    8: "address type not supported",
+}
+BUILD_SAMPLES = 100  # Connect timings kept per destination class
+
+
+class SOCKSError(ConnectionError):
+    """SOCKS proxy refused or failed a request"""
+
+
+def _recv_exact(sock: socket.socket, size: int) -> bytes:
+    data = b''
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise SOCKSError("SOCKS proxy closed the connection")
+        data += chunk
+    return data
+
+
+SOCKS_CONNECT = 0x01
+SOCKS_RESOLVE = 0xF0  # Tor extension: resolve at an exit without opening a stream
+
+
+def _socks5_request(proxy: Tuple[str, int], command: int, host: str, port: int,
+                    username: Optional[str], password: Optional[str],
+                    timeout: Optional[float]) -> Tuple[socket.socket, bytes]:
+    """Run one SOCKS5 request; returns the socket and the raw bound address"""
+    sock = socket.create_connection(proxy, timeout)
+    try:
+        sock.sendall(b'\x05\x01' + (b'\x02' if username else b'\x00'))
+        version, method = _recv_exact(sock, 2)
+        if version != 5 or method == 0xFF:
+            raise SOCKSError("SOCKS proxy refused the authentication method")
+        
+        if method == 2:
+            user = (username or '').encode()
+            secret = (password or '').encode()
+            sock.sendall(bytes([1, len(user)]) + user + bytes([len(secret)]) + secret)
+            if _recv_exact(sock, 2)[1] != 0:
+                raise SOCKSError("SOCKS proxy rejected the credentials")
+        elif method != 0:
+            raise SOCKSError(f"Unsupported SOCKS authentication method {method}")
+        
+        target = host.encode('idna')
+        sock.sendall(bytes([5, command, 0, 3, len(target)]) + target + struct.pack('>H', port))
+        _, reply, _, address_type = _recv_exact(sock, 4)
+        if reply != 0:
+            raise SOCKSError(f"SOCKS request for {host}:{port} failed: "
+                             f"{SOCKS_ERRORS.get(reply, reply)}")
+        
+        if address_type == 1:
+            address = _recv_exact(sock, 4)
+        elif address_type == 4:
+            address = _recv_exact(sock, 16)
+        elif address_type == 3:
+            address = _recv_exact(sock, _recv_exact(sock, 1)[0])
+        else:
+            raise SOCKSError(f"Unknown SOCKS address type {address_type}")
+        _recv_exact(sock, 2)  # Bound port
+        return sock, address
+    except BaseException:
+        sock.close()
+        raise
+
+
+def socks5_connect(proxy: Tuple[str, int], host: str, port: int,
+                   username: Optional[str] = None, password: Optional[str] = None,
+                   timeout: Optional[float] = None) -> socket.socket:
+    """
+    Open a TCP stream to host:port through a SOCKS5 proxy
+    The hostname is sent to the proxy unresolved so DNS happens at the exit;
+    Tor puts streams with different username/password on different circuits
+    """
+    sock, _ = _socks5_request(proxy, SOCKS_CONNECT, host, port, username, password, timeout)
+    sock.settimeout(timeout)
+    return sock
+
+
+def socks5_resolve(proxy: Tuple[str, int], host: str,
+                   username: Optional[str] = None, password: Optional[str] = None,
+                   timeout: Optional[float] = None) -> bytes:
+    """
+    Resolve host at a Tor exit with the given isolation credentials
+    Tor builds (or reuses) the circuit for those credentials, but nothing
+    connects to the host itself; returns the raw resolved address
+    """
+    sock, address = _socks5_request(proxy, SOCKS_RESOLVE, host, 0, username, password, timeout)
+    sock.close()
+    return address
+
+
+class TorConnectionPool:
+    """
+    Stream-isolated outbound connections through Tor
+    Each destination class ('smtp', 'imap', 'registrar') uses its own SOCKS
+    credentials, so Tor builds and reuses a separate circuit for it.
+    
+    While a class has seen recent outbound use, its circuit is kept warm by
+    resolving a registered destination through it at the exit; the
+    destination itself is never contacted until real traffic needs it
+    """
+    
+    def __init__(self, proxy_host: str = '127.0.0.1', proxy_port: int = 9050,
+                 enabled: bool = False, warm_window: float = 900.0,
+                 refresh_interval: float = 300.0, tick: float = 30.0,
+                 connect_timeout: float = 60.0):
+        """
+        Args:
+            proxy_host: Tor SOCKS host
+            proxy_port: Tor SOCKS port (SocksPort in torrc)
+            enabled: Route outbound SMTP/IMAP/registrar traffic through Tor
+            warm_window: Seconds after the last outbound use a class stays warm
+            refresh_interval: Seconds between circuit refreshes of a warm class;
+                below Tor's MaxCircuitDirtiness (600s) so a usable circuit is ready
+            tick: Seconds between warming passes
+            connect_timeout: Timeout for a SOCKS request, circuit build included
+        """
+        self.proxy = (proxy_host, proxy_port)
+        self.enabled = enabled
+        self.warm_window = warm_window
+        self.refresh_interval = refresh_interval
+        self.tick = tick
+        self.connect_timeout = connect_timeout
+        self._destinations: Dict[Tuple[str, int], str] = {}  # (host, port) -> class
+        self._identities: Dict[str, str] = {}  # class -> SOCKS password
+        self._last_used: Dict[str, float] = {}  # class -> monotonic time of last use
+        self._next_warm: Dict[str, float] = {}  # class -> monotonic time of next refresh
+        self._stats: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+    
+    def credentials(self, destination_class: str) -> Tuple[str, str]:
+        """SOCKS username/password isolating a destination class"""
+        with self._lock:
+            password = self._identities.setdefault(destination_class, secrets.token_hex(8))
+        return f"opsechat-{destination_class}", password
+    
+    def new_identity(self, destination_class: str) -> None:
+        """Move a destination class onto fresh circuits"""
+        with self._lock:
+            self._identities[destination_class] = secrets.token_hex(8)
+            self._next_warm.pop(destination_class, None)
+            self._class_stats(destination_class)['fresh'] = True
+    
+    def keep_warm(self, destination_class: str, host: str, port: int) -> None:
+        """
+        Register a destination whose class circuit should be kept warm
+        Configuring an account counts as use, so one warm window follows it
+        """
+        with self._lock:
+            self._destinations[(host, port)] = destination_class
+            self._last_used[destination_class] = time.monotonic()
+        if self.enabled:
+            self.start()
+    
+    def forget(self, host: str, port: int) -> None:
+        """Stop keeping a destination warm"""
+        with self._lock:
+            self._destinations.pop((host, port), None)
+    
+    def connect(self, host: str, port: int, destination_class: str = 'default',
+                timeout: Optional[float] = None) -> socket.socket:
+        """Open a stream to host:port on the destination class's circuit"""
+        with self._lock:
+            self._last_used[destination_class] = time.monotonic()
+        sock = self._open(host, port, destination_class)
+        sock.settimeout(timeout)
+        return sock
+    
+    def _open(self, host: str, port: int, destination_class: str) -> socket.socket:
+        username, password = self.credentials(destination_class)
+        start = time.perf_counter()
+        sock = socks5_connect(self.proxy, host, port, username, password, self.connect_timeout)
+        self._record(destination_class, 'streams', (time.perf_counter() - start) * 1000)
+        return sock
+    
+    def _record(self, destination_class: str, counter: str, elapsed: float) -> None:
+        with self._lock:
+            stats = self._class_stats(destination_class)
+            stats[counter] += 1
+            if counter == 'streams':
+                stats['connect_ms'].append(elapsed)
+            # The first request on an identity waits for Tor to build its circuit
+            if stats['fresh']:
+                stats['build_ms'].append(elapsed)
+                stats['fresh'] = False
+    
+    def _class_stats(self, destination_class: str) -> Dict:
+        return self._stats.setdefault(destination_class, {
+            'streams': 0,
+            'warmups': 0,
+            'connect_ms': deque(maxlen=BUILD_SAMPLES),
+            'build_ms': deque(maxlen=BUILD_SAMPLES),
+            'fresh': True,
+        })
+    
+    def prewarm(self) -> int:
+        """
+        Refresh the circuits of recently used classes that are due
+        A refresh moves the class to new credentials and resolves one of its
+        destinations through them, so the new circuit is built before use
+        
+        Returns:
+            Number of classes warmed
+        """
+        now = time.monotonic()
+        with self._lock:
+            due = {}
+            for (host, _), destination_class in self._destinations.items():
+                if destination_class in due:
+                    continue
+                if now - self._last_used.get(destination_class, float('-inf')) > self.warm_window:
+                    continue
+                if now < self._next_warm.get(destination_class, 0.0):
+                    continue
+                due[destination_class] = host
+        
+        warmed = 0
+        for destination_class, host in due.items():
+            password = secrets.token_hex(8)
+            start = time.perf_counter()
+            try:
+                socks5_resolve(self.proxy, host, f"opsechat-{destination_class}", password,
+                               self.connect_timeout)
+            except OSError as e:
+                logger.warning(f"Warming {destination_class} circuit failed: {e}")
+                continue
+            elapsed = (time.perf_counter() - start) * 1000
+            with self._lock:
+                self._identities[destination_class] = password
+                self._class_stats(destination_class)['fresh'] = True
+                # Jitter so refreshes do not form a recognisable schedule
+                self._next_warm[destination_class] = (
+                    time.monotonic() + self.refresh_interval * random.uniform(0.75, 1.25))
+            self._record(destination_class, 'warmups', elapsed)
+            warmed += 1
+        return warmed
+    
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True, name="tor-prewarm")
+        self._thread.start()
+    
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+    
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self.prewarm()
+            self._stop.wait(self.tick)
+    
+    def get_stats(self) -> Dict[str, Dict]:
+        """Per destination class stream counts and connect/circuit build timings"""
+        with self._lock:
+            snapshot = {name: (stats['streams'], stats['warmups'],
+                               list(stats['connect_ms']), list(stats['build_ms']))
+                        for name, stats in self._stats.items()}
+        
+        result = {}
+        for name, (streams, warmups, connect_ms, build_ms) in snapshot.items():
+            result[name] = {
+                'streams': streams,
+                'warmups': warmups,
+                'connect_ms': _summarize(connect_ms),
+                'circuit_build_ms': _summarize(build_ms),
+            }
+        return result
+    
+    def open_smtp(self, host: str, port: int, timeout: float) -> smtplib.SMTP:
+        return TorSMTP(self, host, port, timeout=timeout)
+    
+    def open_imap(self, host: str, port: int, use_ssl: bool, timeout: float) -> imaplib.IMAP4:
+        if use_ssl:
+            return TorIMAP4_SSL(self, host, port, timeout=timeout)
+        return TorIMAP4(self, host, port, timeout=timeout)
+    
+    def http_adapter(self, destination_class: str = 'registrar') -> HTTPAdapter:
+        """requests transport adapter sending connections through this pool"""
+        return TorHTTPAdapter(self, destination_class)
+
+
+def _summarize(samples: List[float]) -> Dict[str, float]:
+    if not samples:
+        return {'samples': 0}
+    ordered = sorted(samples)
+    return {
+        'samples': len(ordered),
+        'avg': round(sum(ordered) / len(ordered), 1),
+        'p50': round(ordered[len(ordered) // 2], 1),
+        'max': round(ordered[-1], 1),
+    }
+
+
+class TorSMTP(smtplib.SMTP):
+    """smtplib.SMTP whose socket comes from a TorConnectionPool"""
+    
+    def __init__(self, tor: TorConnectionPool, host: str, port: int, **kwargs):
+        self._tor = tor
+        super().__init__(host, port, **kwargs)
+    
+    def _get_socket(self, host, port, timeout):
+        return self._tor.connect(host, port, 'smtp', timeout)
+
+
+class TorIMAP4(imaplib.IMAP4):
+    """imaplib.IMAP4 whose socket comes from a TorConnectionPool"""
+    
+    def __init__(self, tor: TorConnectionPool, host: str, port: int, **kwargs):
+        self._tor = tor
+        super().__init__(host, port, **kwargs)
+    
+    def _create_socket(self, timeout):
+        return self._tor.connect(self.host, self.port, 'imap', timeout)
+
+
+class TorIMAP4_SSL(imaplib.IMAP4_SSL):
+    """imaplib.IMAP4_SSL whose socket comes from a TorConnectionPool"""
+    
+    def __init__(self, tor: TorConnectionPool, host: str, port: int, **kwargs):
+        self._tor = tor
+        super().__init__(host, port, **kwargs)
+    
+    def _create_socket(self, timeout):
+        sock = self._tor.connect(self.host, self.port, 'imap', timeout)
+        return self.ssl_context.wrap_socket(sock, server_hostname=self.host)
+
+
+class _TorConnectionMixin:
+    def __init__(self, *args, tor: TorConnectionPool, destination_class: str, **kwargs):
+        self._tor = tor
+        self._destination_class = destination_class
+        super().__init__(*args, **kwargs)
+    
+    def _new_conn(self) -> socket.socket:
+        timeout = self.timeout if isinstance(self.timeout, (int, float)) else None
+        try:
+            return self._tor.connect(self._dns_host, self.port, self._destination_class, timeout)
+        except OSError as e:
+            raise NewConnectionError(self, f"Failed to connect through Tor: {e}") from e
+
+
+class TorHTTPConnection(_TorConnectionMixin, HTTPConnection):
+    pass
+
+
+class TorHTTPSConnection(_TorConnectionMixin, HTTPSConnection):
+    pass
+
+
+class _TorPoolMixin:
+    def __init__(self, *args, tor: TorConnectionPool, destination_class: str, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.conn_kw.update(tor=tor, destination_class=destination_class)
+
+
+class TorHTTPConnectionPool(_TorPoolMixin, urllib3.HTTPConnectionPool):
+    ConnectionCls = TorHTTPConnection
+
+
+class TorHTTPSConnectionPool(_TorPoolMixin, urllib3.HTTPSConnectionPool):
+    ConnectionCls = TorHTTPSConnection
+
+
+class TorHTTPAdapter(HTTPAdapter):
+    """requests adapter routing HTTP(S) connections through a TorConnectionPool"""
+    
+    def __init__(self, tor: TorConnectionPool, destination_class: str, **kwargs):
+        self._tor = tor
+        self._destination_class = destination_class
+        super().__init__(**kwargs)
+    
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        options = {'tor': self._tor, 'destination_class': self._destination_class}
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': partial(TorHTTPConnectionPool, **options),
+            'https': partial(TorHTTPSConnectionPool, **options),
+        }
+
+
+# Global Tor outbound pool (off unless OPSECHAT_TOR_OUTBOUND=true)
+tor_pool = TorConnectionPool(
+    proxy_port=int(os.environ.get('OPSECHAT_TOR_SOCKS_PORT', '9050')),
+    enabled=os.environ.get('OPSECHAT_TOR_OUTBOUND', 'false').lower() == 'true',
+)
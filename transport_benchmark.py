@@ -0,0 +1,353 @@
+"""
+Offline benchmark for the SMTP/IMAP transports
+Runs local stand-in SMTP and IMAP servers with injected latency (to mimic Tor
+round trips) and drives SMTPTransport/IMAPTransport through send and sync
+workloads, reporting throughput, latency percentiles and connections opened
+"""
+import re
+import sys
+import math
+import time
+import asyncio
+import logging
+import argparse
+import threading
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from email_transport import SMTPTransport, IMAPTransport
+
+logger = logging.getLogger(__name__)
+
+FETCH_ITEM_PATTERN = re.compile(r'BODY\.PEEK\[([^\]]*)\](?:<(\d+)\.(\d+)>)?|[A-Z0-9.]+')
+
+
+def percentile(samples: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of samples"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, math.ceil(fraction * len(ordered)) - 1))
+    return ordered[index]
+
+
+def benchmark_message(n: int, size: int = 2048) -> bytes:
+    """A plain text message of roughly size bytes"""
+    body = (f"Benchmark message {n} " * (size // 20 + 1))[:size]
+    return (f"From: sender{n}@bench.local\r\nTo: user@bench.local\r\n"
+            f"Subject: Benchmark {n}\r\nMessage-ID: <bench-{n}@bench.local>\r\n"
+            f"Content-Type: text/plain; charset=utf-8\r\n\r\n{body}\r\n").encode()
+
+
+class _StandInServer(ABC):
+    """asyncio line server on a background thread with per-reply latency"""
+    
+    def __init__(self, latency: float = 0.0, connect_latency: Optional[float] = None):
+        """
+        Args:
+            latency: Seconds added before each reply (one simulated round trip)
+            connect_latency: Seconds before the greeting (defaults to 3 round trips)
+        """
+        self.latency = latency
+        self.connect_latency = 3 * latency if connect_latency is None else connect_latency
+        self.host = '127.0.0.1'
+        self.port = 0
+        self.connections = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+    
+    def start(self) -> int:
+        ready = threading.Event()
+        
+        def run():
+            self._loop = asyncio.new_event_loop()
+            server = self._loop.run_until_complete(
+                asyncio.start_server(self._handle, self.host, 0))
+            self.port = server.sockets[0].getsockname()[1]
+            ready.set()
+            try:
+                self._loop.run_forever()
+            finally:
+                server.close()
+                self._loop.run_until_complete(server.wait_closed())
+                self._loop.close()
+        
+        self._thread = threading.Thread(target=run, daemon=True, name=type(self).__name__)
+        self._thread.start()
+        ready.wait()
+        return self.port
+    
+    def stop(self) -> None:
+        if self._thread:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(timeout=5)
+            self._thread = None
+    
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.connections += 1
+        try:
+            await asyncio.sleep(self.connect_latency)
+            await self._session(reader, writer)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+    
+    async def _reply(self, writer: asyncio.StreamWriter, data: bytes) -> None:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        writer.write(data)
+        await writer.drain()
+    
+    @abstractmethod
+    async def _session(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Serve one client connection until it quits or disconnects"""
+
+
+class StandInSMTPServer(_StandInServer):
+    """Accepts any AUTH and any recipient, counting delivered messages"""
+    
+    def __init__(self, latency: float = 0.0, connect_latency: Optional[float] = None):
+        super().__init__(latency, connect_latency)
+        self.messages = 0
+    
+    async def _session(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        await self._reply(writer, b"220 standin ESMTP\r\n")
+        while True:
+            line = await reader.readline()
+            if not line:
+                return
+            command = line[:4].upper()
+            if command == b'EHLO':
+                await self._reply(writer, b"250-standin\r\n250-AUTH PLAIN LOGIN\r\n250 8BITMIME\r\n")
+            elif command == b'AUTH':
+                await self._reply(writer, b"235 Authenticated\r\n")
+            elif command == b'DATA':
+                await self._reply(writer, b"354 Go ahead\r\n")
+                while (await reader.readline()) not in (b".\r\n", b".\n", b""):
+                    pass
+                self.messages += 1
+                await self._reply(writer, b"250 Queued\r\n")
+            elif command == b'QUIT':
+                await self._reply(writer, b"221 Bye\r\n")
+                return
+            else:
+                await self._reply(writer, b"250 OK\r\n")
+
+
+class StandInIMAPServer(_StandInServer):
+    """
+    Single-folder IMAP server with the commands IMAPTransport uses
+    Messages are plain text, so part 1 is the whole body
+    """
+    
+    def __init__(self, latency: float = 0.0, connect_latency: Optional[float] = None):
+        super().__init__(latency, connect_latency)
+        self.mailbox: Dict[int, bytes] = {}
+        self.uidvalidity = 1
+        self.next_uid = 1
+        self.fetches = 0
+    
+    def append(self, raw: bytes) -> int:
+        uid = self.next_uid
+        self.mailbox[uid] = raw
+        self.next_uid += 1
+        return uid
+    
+    async def _session(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        await self._reply(writer, b"* OK [CAPABILITY IMAP4rev1 IDLE] standin ready\r\n")
+        while True:
+            line = await reader.readline()
+            if not line:
+                return
+            tag, _, rest = line.decode().strip().partition(' ')
+            command, _, args = rest.partition(' ')
+            command = command.upper()
+            
+            if command == 'UID':
+                command, _, args = args.partition(' ')
+                untagged = self._uid(command.upper(), args)
+            elif command in ('SELECT', 'EXAMINE'):
+                untagged = (f"* {len(self.mailbox)} EXISTS\r\n"
+                            f"* OK [UIDVALIDITY {self.uidvalidity}] UIDs valid\r\n"
+                            f"* OK [UIDNEXT {self.next_uid}] Predicted next UID\r\n").encode()
+            elif command == 'CAPABILITY':
+                untagged = b"* CAPABILITY IMAP4rev1 IDLE\r\n"
+            elif command == 'LOGOUT':
+                await self._reply(writer, f"* BYE\r\n{tag} OK LOGOUT completed\r\n".encode())
+                return
+            else:
+                untagged = b""
+            await self._reply(writer, untagged + f"{tag} OK {command} completed\r\n".encode())
+    
+    def _uid(self, command: str, args: str) -> bytes:
+        if command == 'SEARCH':
+            uids = sorted(self.mailbox)
+            match = re.search(r'UID (\d+):\*', args)
+            if match:
+                low = int(match.group(1))
+                # "n:*" always includes the highest UID
+                uids = [uid for uid in uids if uid >= low] or uids[-1:]
+            return f"* SEARCH {' '.join(map(str, uids))}\r\n".encode()
+        if command == 'FETCH':
+            sequence, _, items = args.partition(' ')
+            return b''.join(self._fetch(uid, items) for uid in self._expand(sequence))
+        return b""
+    
+    def _expand(self, sequence: str) -> List[int]:
+        uids = []
+        for part in sequence.split(','):
+            start, _, end = part.partition(':')
+            low = int(start)
+            high = max(self.mailbox, default=0) if end == '*' else int(end or start)
+            uids.extend(uid for uid in range(low, high + 1) if uid in self.mailbox)
+        return uids
+    
+    def _fetch(self, uid: int, items: str) -> bytes:
+        self.fetches += 1
+        raw = self.mailbox[uid]
+        header, _, body = raw.partition(b"\r\n\r\n")
+        header += b"\r\n\r\n"
+        response = f"* {uid} FETCH (UID {uid}".encode()
+        
+        for match in FETCH_ITEM_PATTERN.finditer(items.strip('()')):
+            section, offset, length = match.group(1), match.group(2), match.group(3)
+            item = match.group(0)
+            if section is None:
+                if item == 'RFC822':
+                    response += b" RFC822 {%d}\r\n%s" % (len(raw), raw)
+                elif item == 'BODYSTRUCTURE':
+                    response += (b' BODYSTRUCTURE ("text" "plain" ("charset" "utf-8") NIL NIL'
+                                 b' "7bit" %d %d NIL NIL NIL)' % (len(body), body.count(b"\n")))
+                elif item == 'RFC822.SIZE':
+                    response += b" RFC822.SIZE %d" % len(raw)
+                continue
+            
+            data = {'': raw, 'HEADER': header, '1': body, 'TEXT': body}.get(section.upper(), b"")
+            label = b"BODY[%s]" % section.encode()
+            if offset is not None:
+                data = data[int(offset):int(offset) + int(length)]
+                label += b"<%s>" % offset.encode()
+            response += b" %s {%d}\r\n%s" % (label, len(data), data)
+        return response + b")\r\n"
+
+
+def _timed(samples: List[float], operation) -> object:
+    start = time.perf_counter()
+    try:
+        return operation()
+    finally:
+        samples.append(time.perf_counter() - start)
+
+
+def _report(count: int, seconds: float, samples: List[float], connections: int) -> Dict[str, float]:
+    return {
+        'messages': count,
+        'seconds': round(seconds, 3),
+        'msgs_per_sec': round(count / seconds, 1) if seconds else 0.0,
+        'p50_ms': round(percentile(samples, 0.50) * 1000, 2),
+        'p99_ms': round(percentile(samples, 0.99) * 1000, 2),
+        'connections': connections,
+    }
+
+
+def run_send_benchmark(messages: int = 200, concurrency: int = 4, pool_size: int = 2,
+                       latency: float = 0.0, size: int = 2048) -> Dict[str, float]:
+    """Send messages through a pooled SMTPTransport from concurrent callers"""
+    server = StandInSMTPServer(latency)
+    port = server.start()
+    transport = SMTPTransport('127.0.0.1', port, 'bench', 'bench', use_tls=False,
+                              pool_size=pool_size)
+    body = "x" * size
+    samples: List[float] = []
+    try:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = list(executor.map(
+                lambda n: _timed(samples, lambda: transport.send_email(
+                    'bench@bench.local', f"user{n}@bench.local", f"Benchmark {n}", body)),
+                range(messages)))
+        seconds = time.perf_counter() - start
+    finally:
+        transport.close()
+        server.stop()
+    
+    report = _report(results.count(True), seconds, samples, server.connections)
+    report['failed'] = results.count(False)
+    return report
+
+
+def run_sync_benchmark(messages: int = 1000, rounds: int = 20, new_per_round: int = 5,
+                       pool_size: int = 2, latency: float = 0.0, size: int = 2048,
+                       lazy_bodies: bool = True) -> Dict[str, Dict[str, float]]:
+    """
+    Initial sync of a full mailbox, then incremental syncs with a few new
+    messages per round, then opening (lazy body fetch) the new messages
+    """
+    server = StandInIMAPServer(latency)
+    port = server.start()
+    for n in range(messages):
+        server.append(benchmark_message(n, size))
+    transport = IMAPTransport('127.0.0.1', port, 'bench', 'bench', use_ssl=False,
+                              pool_size=pool_size, lazy_bodies=lazy_bodies)
+    results = {}
+    try:
+        samples: List[float] = []
+        start = time.perf_counter()
+        emails = _timed(samples, lambda: transport.sync_folder('INBOX'))
+        results['initial_sync'] = _report(len(emails), time.perf_counter() - start,
+                                          samples, server.connections)
+        
+        samples = []
+        synced: List[Dict] = []
+        start = time.perf_counter()
+        for round_number in range(rounds):
+            for n in range(new_per_round):
+                server.append(benchmark_message(messages + round_number * new_per_round + n, size))
+            synced.extend(_timed(samples, lambda: transport.sync_folder('INBOX')))
+        results['incremental_sync'] = _report(len(synced), time.perf_counter() - start,
+                                              samples, server.connections)
+        
+        if lazy_bodies:
+            samples = []
+            start = time.perf_counter()
+            bodies = [_timed(samples, lambda: transport.fetch_body(email['imap_ref']))
+                      for email in synced]
+            results['open_message'] = _report(sum(1 for body in bodies if body),
+                                              time.perf_counter() - start,
+                                              samples, server.connections)
+    finally:
+        transport.close()
+        server.stop()
+    return results
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Offline SMTP/IMAP transport benchmark")
+    parser.add_argument('--latency', type=float, default=0.05,
+                        help="Seconds per simulated round trip (Tor is typically 0.3-1.0)")
+    parser.add_argument('--messages', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--pool-size', type=int, default=2)
+    parser.add_argument('--size', type=int, default=2048, help="Message body size in bytes")
+    parser.add_argument('--full-bodies', action='store_true',
+                        help="Sync full messages instead of headers only")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+    
+    send = run_send_benchmark(args.messages, args.concurrency, args.pool_size,
+                              args.latency, args.size)
+    sync = run_sync_benchmark(args.messages, pool_size=args.pool_size, latency=args.latency,
+                              size=args.size, lazy_bodies=not args.full_bodies)
+    
+    print(f"Simulated RTT {args.latency * 1000:.0f} ms, pool size {args.pool_size}")
+    for name, report in [('send', send)] + list(sync.items()):
+        print(f"{name:17} {report['messages']:6} msgs  {report['msgs_per_sec']:9.1f} msgs/sec  "
+              f"p50 {report['p50_ms']:8.2f} ms  p99 {report['p99_ms']:8.2f} ms  "
+              f"connections {report['connections']}")
+    return 0 if not send['failed'] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())